@@ -0,0 +1,73 @@
+"""
+Load generator for BatchingServer on SimpleNN: closed loop clients sending single sample requests,
+each request run by itself vs merged into micro batches.
+
+usage: python -m benchmarks.bench_batching_server
+"""
+import asyncio
+import concurrent.futures
+import time
+
+import torch
+
+from benchmarks.bench_numpy_runtime_latency import RecordingRuntime, compile_simple_nn
+from plai.serving.batching_server import BatchingServer
+
+
+def percentile(values, quantile: float) -> float:
+    values = sorted(values)
+    return values[min(int(quantile * len(values)), len(values) - 1)]
+
+
+async def run_clients(infer, client_count: int, request_count: int, sample_inputs):
+    """
+    :return: (seconds, end to end latencies of all requests)
+    """
+    latencies = []
+
+    async def client():
+        for _ in range(request_count):
+            start_time = time.perf_counter()
+            await infer(*sample_inputs())
+            latencies.append(time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(client_count)])
+    return time.perf_counter() - start_time, latencies
+
+
+def report(name: str, seconds: float, latencies):
+    print(f'{name:>10}: {len(latencies) / seconds:9.1f} requests/s, '
+          f'latency p50 {percentile(latencies, 0.5) * 1e3:.3f} ms p99 {percentile(latencies, 0.99) * 1e3:.3f} ms')
+
+
+async def main(client_count: int = 64, request_count: int = 100, max_batch_size: int = 32):
+    numpy_runtime = RecordingRuntime()
+    compile_simple_nn(numpy_runtime)
+    graph, input_tensors = numpy_runtime.last_graph, numpy_runtime.last_input_tensors
+    [data_index] = numpy_runtime.last_data_indices
+
+    def forward(*tensors):
+        return numpy_runtime(graph, tensors)
+
+    def sample_inputs():
+        tensors = list(input_tensors)
+        tensors[data_index] = torch.randn(input_tensors[data_index].shape)
+        return tensors
+
+    executor = concurrent.futures.ThreadPoolExecutor(1)
+    loop = asyncio.get_running_loop()
+
+    async def infer_unbatched(*tensors):
+        return await loop.run_in_executor(executor, forward, *tensors)
+
+    report('unbatched', *await run_clients(infer_unbatched, client_count, request_count, sample_inputs))
+
+    async with BatchingServer(forward, [data_index], max_batch_size=max_batch_size, executor=executor) as server:
+        report('batched', *await run_clients(server.infer, client_count, request_count, sample_inputs))
+        print(f'    server: {server.metrics}')
+    executor.shutdown()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
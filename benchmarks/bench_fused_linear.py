@@ -0,0 +1,50 @@
+"""
+Time per call of a linear layer relu(bias + 0.5 * (x @ w)): the MatMul, Mul, Add and Relu kernels
+against one FusedLinear kernel with its epilogue in place.
+
+usage: python -m benchmarks.bench_fused_linear
+"""
+import timeit
+
+import torch
+
+from plai.core.core_dialect import Placeholder
+from plai.core.graph import Graph
+from plai.core.type_notation import TensorType, DType
+from plai.dialect import plai_dialect
+from plai.pipelines.fuse_linear import FuseLinearPass
+from plai.runtime.plai_numpy_runtime import PlaiNumpyRuntime
+
+
+def build_linear_graph(rows: int, size: int) -> Graph:
+    graph = Graph('linear')
+    x = Placeholder(TensorType([rows, size], DType.float32))
+    weight = Placeholder(TensorType([size, size], DType.float32))
+    bias = Placeholder(TensorType([size], DType.float32))
+    for arg in [x, weight, bias]:
+        graph.add_argument(arg)
+    alpha = graph.add_node(plai_dialect.Constant(0.5))
+    product = graph.add_node(plai_dialect.Mul(alpha, graph.add_node(plai_dialect.MatMul(x, weight))))
+    graph.add_output(graph.add_node(plai_dialect.Relu(graph.add_node(plai_dialect.Add(bias, product)))))
+    return graph
+
+
+def main(number: int = 50):
+    numpy_runtime = PlaiNumpyRuntime()
+    for rows, size in [(64, 256), (1024, 256), (4096, 512)]:
+        input_tensors = [torch.randn(rows, size), torch.randn(size, size), torch.randn(size)]
+        graph = build_linear_graph(rows, size)
+        fused_graph = build_linear_graph(rows, size)
+        FuseLinearPass()(fused_graph)
+        results = []
+        for runtime_graph in [graph, fused_graph]:
+            numpy_runtime(runtime_graph, input_tensors)
+            seconds = min(timeit.repeat(lambda: numpy_runtime(runtime_graph, input_tensors), number=number,
+                                        repeat=3)) / number
+            results.append(seconds)
+        print(f'{rows:>5}x{size:<4}: unfused {results[0] * 1e6:8.1f} us, fused {results[1] * 1e6:8.1f} us, '
+              f'speedup {results[0] / results[1]:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
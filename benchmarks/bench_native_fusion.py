@@ -0,0 +1,62 @@
+"""
+Time per call of fused elementwise patterns: unfused numpy kernels, the FusedElementwise numpy kernel
+and the C loop of NativeRuntime.
+
+usage: python -m benchmarks.bench_native_fusion
+"""
+import timeit
+
+import torch
+
+from plai.core.core_dialect import Placeholder
+from plai.core.graph import Graph
+from plai.core.type_notation import TensorType, DType
+from plai.dialect import plai_dialect
+from plai.pipelines.fuse_elementwise import FuseElementwisePass
+from plai.runtime.native_runtime import NativeRuntime
+from plai.runtime.plai_numpy_runtime import PlaiNumpyRuntime
+
+
+def build_pattern_graph(pattern: str, rows: int, cols: int) -> Graph:
+    graph = Graph(pattern)
+    x = Placeholder(TensorType([rows, cols], DType.float32))
+    y = Placeholder(TensorType([rows, cols], DType.float32))
+    bias = Placeholder(TensorType([cols], DType.float32))
+    for arg in [x, y, bias]:
+        graph.add_argument(arg)
+    if pattern == 'bias_relu':
+        result = plai_dialect.Relu(graph.add_node(plai_dialect.Add(x, bias)))
+    elif pattern == 'scale_bias':
+        alpha = graph.add_node(plai_dialect.Constant(0.5))
+        result = plai_dialect.Add(bias, graph.add_node(plai_dialect.Mul(alpha, x)))
+    elif pattern == 'scale_bias_relu':
+        alpha = graph.add_node(plai_dialect.Constant(0.5))
+        scaled = graph.add_node(plai_dialect.Mul(alpha, x))
+        result = plai_dialect.Relu(graph.add_node(plai_dialect.Add(bias, scaled)))
+    else:
+        result = plai_dialect.Add(graph.add_node(plai_dialect.Mul(x, y)), bias)
+    graph.add_output(graph.add_node(result))
+    return graph
+
+
+def main(rows: int = 256, cols: int = 1024, number: int = 200):
+    input_tensors = [torch.randn(rows, cols), torch.randn(rows, cols), torch.randn(cols)]
+    numpy_runtime = PlaiNumpyRuntime()
+    native_runtime = NativeRuntime()
+    for pattern in ['bias_relu', 'scale_bias', 'scale_bias_relu', 'mul_add']:
+        graph = build_pattern_graph(pattern, rows, cols)
+        fused_graph = build_pattern_graph(pattern, rows, cols)
+        FuseElementwisePass()(fused_graph)
+        results = []
+        for runtime, runtime_graph in [(numpy_runtime, graph), (numpy_runtime, fused_graph),
+                                       (native_runtime, fused_graph)]:
+            runtime(runtime_graph, input_tensors)
+            seconds = min(timeit.repeat(lambda: runtime(runtime_graph, input_tensors), number=number,
+                                        repeat=3)) / number
+            results.append(seconds)
+        print(f'{pattern:>16}: unfused {results[0] * 1e6:8.1f} us, fused numpy {results[1] * 1e6:8.1f} us, '
+              f'native {results[2] * 1e6:8.1f} us, speedup {results[0] / results[2]:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
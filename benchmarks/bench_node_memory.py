@@ -0,0 +1,116 @@
+"""
+Memory used per node when building a graph, against the layout nodes had before they used __slots__.
+
+usage: python -m benchmarks.bench_node_memory
+"""
+import tracemalloc
+
+from plai.core.core_dialect import Placeholder
+from plai.core.graph import Graph
+from plai.core.type_notation import UnknownType
+from plai.dialect import plai_dialect
+
+
+class BaselineLocation:
+    """
+    NamedLocation before the compact layout: an instance __dict__, one object per node.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class BaselineUnknownType:
+    """
+    UnknownType before the compact layout: an instance __dict__, one object per node.
+    """
+
+    def __init__(self):
+        self.name = '?'
+
+
+class BaselineNode:
+    """
+    Node before the compact layout: an instance __dict__, a list of operands, its own attrs dict,
+    users set and UnknownType.
+    """
+
+    def __init__(self, operands: list, attrs: dict, loc: BaselineLocation = None):
+        self.operands = [None] * len(operands)
+        self.attrs = attrs
+        self.loc = loc
+        self.dead = False
+        self.users = set()
+        self._type_notation = BaselineUnknownType()
+        self.prev_node = None
+        self.next_node = None
+        for idx, operand in enumerate(operands):
+            self.operands[idx] = operand
+            operand.users.add(self)
+
+
+def build_baseline_mlp_nodes(layer_count: int) -> list:
+    nodes = []
+
+    def add_node(operands: list, attrs: dict, name: str, is_placeholder: bool = False) -> BaselineNode:
+        node = BaselineNode(operands, attrs, BaselineLocation(name))
+        if is_placeholder:
+            node.placeholder_type = BaselineUnknownType()
+        if nodes:
+            nodes[-1].next_node = node
+            node.prev_node = nodes[-1]
+        nodes.append(node)
+        return node
+
+    x = add_node([], {}, 'x', is_placeholder=True)
+    for idx in range(layer_count):
+        weight = add_node([], {}, f'weight_{idx}', is_placeholder=True)
+        bias = add_node([], {}, f'bias_{idx}', is_placeholder=True)
+        weight_t = add_node([weight], {'permutation': [1, 0]}, f't_{idx}')
+        mm = add_node([x, weight_t], {}, f'mm_{idx}')
+        add = add_node([mm, bias], {}, f'add_{idx}')
+        x = add_node([add], {}, f'relu_{idx}')
+    add_node([x], {}, 'output')
+    return nodes
+
+
+def build_mlp_graph(layer_count: int) -> Graph:
+    graph = Graph('mlp')
+    x = Placeholder(UnknownType(), graph.get_named_location('x'))
+    graph.add_argument(x)
+    for idx in range(layer_count):
+        weight = Placeholder(UnknownType(), graph.get_named_location(f'weight_{idx}'))
+        bias = Placeholder(UnknownType(), graph.get_named_location(f'bias_{idx}'))
+        graph.add_argument(weight)
+        graph.add_argument(bias)
+        weight_t = graph.add_node(plai_dialect.Transpose(weight, loc=graph.get_named_location(f't_{idx}')))
+        mm = graph.add_node(plai_dialect.MatMul(x, weight_t, loc=graph.get_named_location(f'mm_{idx}')))
+        add = graph.add_node(plai_dialect.Add(mm, bias, loc=graph.get_named_location(f'add_{idx}')))
+        x = graph.add_node(plai_dialect.Relu(add, loc=graph.get_named_location(f'relu_{idx}')))
+    graph.add_output(x)
+    return graph
+
+
+def measure_bytes_per_node(build, layer_count: int) -> float:
+    """
+    :param build: layer_count -> a graph or a list of nodes.
+    """
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    graph = build(layer_count)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    node_count = len(graph) + len(graph.arguments) if isinstance(graph, Graph) else len(graph)
+    return (after - before) / node_count
+
+
+def main():
+    for layer_count in (1000, 10000):
+        baseline_bytes = measure_bytes_per_node(build_baseline_mlp_nodes, layer_count)
+        bytes_per_node = measure_bytes_per_node(build_mlp_graph, layer_count)
+        print(f'layers: {layer_count:6d}, bytes per node: before {baseline_bytes:.1f}, after {bytes_per_node:.1f}, '
+              f'saved {1 - bytes_per_node / baseline_bytes:.0%}')
+
+
+if __name__ == '__main__':
+    main()
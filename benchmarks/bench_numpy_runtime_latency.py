@@ -0,0 +1,60 @@
+"""
+Per call latency on SimpleNN of PlaiNumpyRuntime, execution plan vs graph interpreter,
+and of PythonCodegenRuntime.
+
+usage: python -m benchmarks.bench_numpy_runtime_latency
+"""
+import timeit
+
+import torch
+from torch._dynamo.backends.common import aot_autograd
+from torch._functorch._aot_autograd.utils import make_boxed_compiler
+
+from plai.pipelines.convertion_dialect_torch_to_plai import TorchToPlaiPass
+from plai.pipelines.decompose_plai_addmm import DecomposePlaiAddMmPass
+from plai.pl_torch_compiler import plnn_compiler
+from plai.runtime.plai_numpy_runtime import PlaiNumpyRuntime
+from plai.runtime.python_codegen_runtime import PythonCodegenRuntime
+from tests.module_pool.simple_nn import SimpleNN
+
+
+class RecordingRuntime(PlaiNumpyRuntime):
+    def __init__(self):
+        super().__init__()
+        self.last_graph = None
+        self.last_input_tensors = None
+        self.last_data_indices = None
+
+    def run(self, graph, input_tensors):
+        self.last_graph = graph
+        self.last_input_tensors = [v.detach() for v in input_tensors]
+        self.last_data_indices = [idx for idx, v in enumerate(input_tensors) if not isinstance(v, torch.nn.Parameter)]
+        return super().run(graph, input_tensors)
+
+
+def compile_simple_nn(numpy_runtime: PlaiNumpyRuntime, batch_size: int = 1):
+    model = SimpleNN()
+    pipeline = [TorchToPlaiPass(), DecomposePlaiAddMmPass()]
+    custom_compiler = plnn_compiler.CustomCompiler(pipeline=pipeline, runtime=numpy_runtime)
+    aot_backend = aot_autograd(fw_compiler=make_boxed_compiler(custom_compiler), bw_compiler=None)
+    compiled_model = torch.compile(model, backend=aot_backend)
+    with torch.no_grad():
+        compiled_model(torch.randn(batch_size, 10))
+    return compiled_model
+
+
+def main(number: int = 20000):
+    numpy_runtime = RecordingRuntime()
+    compile_simple_nn(numpy_runtime)
+    graph, input_tensors = numpy_runtime.last_graph, numpy_runtime.last_input_tensors
+
+    codegen_runtime = PythonCodegenRuntime()
+    for name, fn in [('interpreted', lambda: numpy_runtime.run_interpreted(graph, input_tensors)),
+                     ('execution plan', lambda: PlaiNumpyRuntime.run(numpy_runtime, graph, input_tensors)),
+                     ('python codegen', lambda: codegen_runtime.run(graph, input_tensors))]:
+        seconds = min(timeit.repeat(fn, number=number, repeat=3))
+        print(f'{name:>16}: {seconds / number * 1e6:.2f} us per call')
+
+
+if __name__ == '__main__':
+    main()
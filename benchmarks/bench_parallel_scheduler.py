@@ -0,0 +1,30 @@
+"""
+Wall clock time of PlaiNumpyRuntime on a multi-branch graph against the number of inter-op workers.
+BLAS threads compete with the workers, compare with OPENBLAS_NUM_THREADS=1 / OMP_NUM_THREADS=1.
+
+usage: python -m benchmarks.bench_parallel_scheduler
+"""
+import timeit
+
+import torch
+
+from plai.runtime.plai_numpy_runtime import PlaiNumpyRuntime
+from tests.module_pool.plai_graphs import build_multi_branch_graph
+
+
+def main(branch_count: int = 8, size: int = 256, number: int = 20):
+    graph = build_multi_branch_graph(branch_count, size)
+    input_tensors = [torch.randn(size, size)] + [torch.randn(size, size) / size for _ in range(branch_count)]
+
+    baseline = None
+    for num_workers in [0, 2, 4, 8]:
+        numpy_runtime = PlaiNumpyRuntime(num_workers=num_workers)
+        numpy_runtime(graph, input_tensors)
+        seconds = min(timeit.repeat(lambda: numpy_runtime(graph, input_tensors), number=number, repeat=3)) / number
+        numpy_runtime.shutdown()
+        baseline = baseline or seconds
+        print(f'workers {num_workers:>2}: {seconds * 1e3:8.3f} ms per call, speedup {baseline / seconds:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,8 @@ class CoreNode(node.Node, ABC):
 
 
 class Placeholder(CoreNode):
+    __slots__ = ('placeholder_type',)
+
     def __init__(self, placeholder_type: TypeNotation, loc: Location = None):
         super().__init__([], {}, loc)
         self.placeholder_type = placeholder_type
@@ -24,9 +26,13 @@ class Output(CoreNode):
     def __init__(self, loc: Location = None):
         super().__init__([], {}, loc)
 
+    @classmethod
+    def has_side_effect(cls) -> bool:
+        return True
+
     def add_argument(self, arg: node.Node):
         idx = len(self.operands)
-        self.operands.append(None)
+        self.operands += (None,)
         self.set_operand(idx, arg)
 
     def inference_type_notation(self):
@@ -1,7 +1,9 @@
+import sys
 from contextlib import contextmanager
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator, Any
 
 from plai.core.core_dialect import Placeholder, Output
+from plai.core.location import NamedLocation
 from plai.core.node import Node
 
 
@@ -9,12 +11,23 @@ class Graph:
     def __init__(self, name=''):
         self.name = name
         self.arguments: List[Placeholder] = []
+        self.argument_index_dict: Dict[Placeholder, int] = {}
         self.outputs = Output()
-        self.nodes: List[Node] = [self.outputs]
-        self.insert_point_index: int | None = 0
+        # nodes are kept in an intrusive doubly linked list, see Node.prev_node/Node.next_node.
+        self.first_node: Node | None = None
+        self.last_node: Node | None = None
+        self.node_count = 0
+        # new nodes are inserted before insert_point, None means append to the end.
+        self.insert_point: Node | None = None
         self.lock_structure = False
         self.listeners: List[Graph.Listener] = []
         self.add_listener(Graph.UpdateInsertPointListener())
+        self.location_table: Dict[str, NamedLocation] = {}
+        # results of analyses attached to this graph, shown in the dump.
+        self.metadata: Dict[str, Any] = {}
+
+        self.link_node(self.outputs, None)
+        self.insert_point = self.outputs
 
     class Listener:
         def after_add_node(self, graph: 'Graph', node: Node):
@@ -23,19 +36,14 @@ class Graph:
         def before_remove_node(self, graph: 'Graph', node: Node):
             pass
 
-        def before_remove_dead_node(self, graph: 'Graph'):
-            pass
-
         def before_node_operand_change(self, graph: 'Graph', node: Node, old_operand: Node, new_operand: Node):
             pass
 
     class UpdateInsertPointListener(Listener):
-        def after_add_node(self, graph: 'Graph', node: Node):
-            graph.insert_point_index += 1
+        def before_remove_node(self, graph: 'Graph', node: Node):
+            if graph.insert_point is node:
+                graph.insert_point = node.next_node
 
-        def before_remove_dead_node(self, graph: 'Graph'):
-            graph.insert_point_index = None
-            
     def add_listener(self, listener):
         self.listeners.append(listener)
 
@@ -48,13 +56,43 @@ class Graph:
         yield
         self.lock_structure = False
 
+    def __iter__(self) -> Iterator[Node]:
+        """
+        Iterate over live nodes in order.
+        The iteration stays valid while nodes are added or removed:
+        removed nodes keep their next_node, so the walk continues from where they were,
+        and nodes inserted after the current node are visited.
+        """
+        node = self.first_node
+        while node is not None:
+            if not node.dead:
+                yield node
+            node = node.next_node
+
+    def __len__(self):
+        return self.node_count
+
+    @property
+    def nodes(self) -> List[Node]:
+        return list(self)
+
     def walk(self, cb):
-        with self.lock_structure_context():
-            for node in self.nodes:
-                cb(node)
+        for node in self:
+            cb(node)
+
+    def get_named_location(self, name: str) -> NamedLocation:
+        """
+        Locations with the same name share one interned NamedLocation.
+        """
+        location = self.location_table.get(name)
+        if location is None:
+            location = NamedLocation(sys.intern(name))
+            self.location_table[location.name] = location
+        return location
 
     def add_argument(self, node: Placeholder):
         assert not self.lock_structure, 'Cannot modify graph structure in locked graph.'
+        self.argument_index_dict[node] = len(self.arguments)
         self.arguments.append(node)
 
     def add_output(self, node: Node):
@@ -63,20 +101,58 @@ class Graph:
 
     def set_insert_point_after(self, node: Node = None):
         if node is None:
-            self.insert_point_index = len(self.nodes)
+            self.insert_point = None
         else:
-            self.insert_point_index = self.nodes.index(node) + 1
+            self.insert_point = node.next_node
 
     def set_insert_point_before(self, node: Node = None):
         if node is None:
-            self.insert_point_index = 0
+            self.insert_point = self.first_node
+        else:
+            self.insert_point = node
+
+    def restore_insert_point(self, insert_point: Node | None):
+        """
+        Set an insert point saved before nodes were removed,
+        a removed one is replaced by the next live node, where new nodes would have gone.
+        """
+        while insert_point is not None and insert_point.dead:
+            insert_point = insert_point.next_node
+        self.insert_point = insert_point
+
+    def link_node(self, node: Node, before: Node | None):
+        assert node.prev_node is None and node.next_node is None and node is not self.first_node, \
+            'Node is already in a graph.'
+        prev_node = self.last_node if before is None else before.prev_node
+        node.prev_node = prev_node
+        node.next_node = before
+        if prev_node is None:
+            self.first_node = node
+        else:
+            prev_node.next_node = node
+        if before is None:
+            self.last_node = node
         else:
-            self.insert_point_index = self.nodes.index(node)
+            before.prev_node = node
+        self.node_count += 1
+
+    def unlink_node(self, node: Node):
+        prev_node, next_node = node.prev_node, node.next_node
+        if prev_node is None:
+            self.first_node = next_node
+        else:
+            prev_node.next_node = next_node
+        if next_node is None:
+            self.last_node = prev_node
+        else:
+            next_node.prev_node = prev_node
+        # keep node.next_node, so iterators standing on this node can move on.
+        node.prev_node = None
+        self.node_count -= 1
 
     def add_node(self, node: Node):
         assert not self.lock_structure, 'Cannot modify graph structure in locked graph.'
-        assert self.insert_point_index is not None, 'Insert point is not set.'
-        self.nodes.insert(self.insert_point_index, node)
+        self.link_node(node, self.insert_point)
 
         for listener in self.listeners:
             listener.after_add_node(self, node)
@@ -88,43 +164,76 @@ class Graph:
         node.remove()
         for listener in self.listeners:
             listener.before_remove_node(self, node)
-
-    def do_remove_dead_node(self):
-        assert not self.lock_structure, 'Cannot modify graph structure in locked graph.'
-        for listener in self.listeners:
-            listener.before_remove_dead_node(self)
-        self.nodes = [node for node in self.nodes if not node.dead]
+        self.unlink_node(node)
+
+    def erase_node(self, node: Node):
+        """
+        Remove an unused node and drop its operands, so nothing it computed from is kept alive through it.
+        """
+        assert node.get_use_count() == 0, 'Cannot erase a node which is still used.'
+        self.remove_node(node)
+        node.operands = ()
+
+    def update_type_notation(self):
+        """
+        Infer types of all nodes, in graph order so every operand is inferred before its users.
+        """
+        for node in self:
+            Node.get_type_notation(node)
 
     def replace_all_uses_with(self, old_node: Node, new_node: Node):
         assert not self.lock_structure, 'Cannot modify graph structure in locked graph.'
-        old_users = old_node.users.copy()  # need to copy because users will be modified in the loop
-        for user in old_users:
+        for user, idx in list(old_node.uses):  # need to copy because uses will be modified in the loop
             for listener in self.listeners:
                 listener.before_node_operand_change(self, user, old_node, new_node)
 
-            user.replace_operand(old_node, new_node)
+            user.set_operand(idx, new_node)
 
-        for idx, output in enumerate(self.arguments):
-            if output == old_node:
+        if isinstance(old_node, Placeholder):
+            idx = self.argument_index_dict.pop(old_node, None)
+            if idx is not None:
                 assert isinstance(new_node, Placeholder)
                 self.arguments[idx] = new_node
-
-        for idx, output in enumerate(self.outputs.operands):
-            if output == old_node:
-                self.outputs.set_operand(idx, new_node)
+                self.argument_index_dict[new_node] = idx
+
+    def clone(self, node_mapping_dict: Dict[Node, Node] = None) -> 'Graph':
+        """
+        Copy the nodes into a new graph, passes may then modify either of them without affecting the other.
+        Attrs are copied shallowly, analysis results in metadata are not copied.
+
+        :param node_mapping_dict: filled with node -> cloned node when given.
+        """
+        if node_mapping_dict is None:
+            node_mapping_dict = {}
+        graph = Graph(self.name)
+        graph.location_table = dict(self.location_table)
+        for arg in self.arguments:
+            node_mapping_dict[arg] = arg.clone([])
+            graph.add_argument(node_mapping_dict[arg])
+        for node in self:
+            if node is self.outputs:
+                continue
+            operands = [None if operand is None else node_mapping_dict[operand] for operand in node.operands]
+            node_mapping_dict[node] = graph.add_node(node.clone(operands))
+        for output in self.outputs.operands:
+            graph.add_output(None if output is None else node_mapping_dict[output])
+        node_mapping_dict[self.outputs] = graph.outputs
+        return graph
 
     def __str__(self):
         node_name_dict: Dict[Optional[Node], str] = {None: 'None'}
         node_name_dict = node_name_dict | {node: f'arg{idx}' for idx, node in enumerate(self.arguments)}
-        node_name_dict = node_name_dict | {node: f'v{idx}' for idx, node in enumerate(self.nodes)}
+        node_name_dict = node_name_dict | {node: f'v{idx}' for idx, node in enumerate(self)}
 
         result = f'Graph {self.name}({", ".join(node_name_dict[i] for i in self.arguments)}): \n'
-        for idx, node in enumerate(self.nodes):
+        for idx, node in enumerate(self):
             name = node_name_dict[node]
             if node != self.outputs:
                 result += f'  {idx}: {name} = {node.to_string(node_name_dict)}\n'
             else:
                 result += f'  {idx}: {node.to_string(node_name_dict)}\n'
+        for key, value in self.metadata.items():
+            result += f'  # {key}: {value}\n'
 
         return result
 
@@ -1,13 +1,17 @@
 class Location:
-    pass
+    __slots__ = ()
 
 
 class DummyLocation(Location):
+    __slots__ = ()
+
     def __str__(self):
         return "DummyLocation"
 
 
 class NamedLocation(Location):
+    __slots__ = ('name',)
+
     def __init__(self, name: str):
         self.name = name
 
@@ -16,6 +20,8 @@ class NamedLocation(Location):
 
 
 class LocationFileLine(Location):
+    __slots__ = ('file', 'line')
+
     def __init__(self, file: str, line: int):
         self.file = file
         self.line = line
@@ -1,29 +1,57 @@
+import copy
 import re
-from abc import ABC, abstractmethod
-from typing import List, Dict, Union
+from abc import ABCMeta, abstractmethod
+from types import MappingProxyType
+from typing import List, Dict, Union, Tuple
 
 from plai.core.location import Location
 from plai.core.type_notation import TypeNotation, UnknownType, NoneType
 
+# shared by all nodes without attrs/uses, replaced on the first set_attr/add_use, EMPTY_ATTRS itself is read-only.
+EMPTY_ATTRS = MappingProxyType({})
+EMPTY_USES = MappingProxyType({})
+UNKNOWN_TYPE = UnknownType()
+
+
+class NodeMeta(ABCMeta):
+    def __new__(mcs, name, bases, namespace, **kwargs):
+        # node classes never get a __dict__, subclasses with extra fields declare their own __slots__.
+        namespace.setdefault('__slots__', ())
+        return super().__new__(mcs, name, bases, namespace, **kwargs)
+
+
+class Node(metaclass=NodeMeta):
+    __slots__ = ('operands', 'attrs', 'loc', 'dead', 'uses', '_type_notation', 'prev_node', 'next_node')
 
-class Node(ABC):
     def __init__(self, operands: List['Node'], attrs: dict, loc: Location = None):
-        self.operands: List[Union['Node', None]] = [None] * len(operands)
-        self.attrs = attrs
+        self.operands: Tuple[Union['Node', None], ...] = tuple(operands)
+        self.attrs = attrs if attrs else EMPTY_ATTRS
         self.loc = loc
         self.dead = False
-        self.users = set()
-        self._type_notation: TypeNotation = UnknownType()
-
-        for idx, operand in enumerate(operands):
-            self.set_operand(idx, operand)
+        # ordered use-list, keys are (user, operand index), values are unused.
+        self.uses: Dict[Tuple['Node', int], None] = EMPTY_USES
+        self._type_notation: TypeNotation = UNKNOWN_TYPE
+        # intrusive links, maintained by the owning Graph.
+        self.prev_node: Union['Node', None] = None
+        self.next_node: Union['Node', None] = None
 
+        for idx, operand in enumerate(self.operands):
+            if operand is not None:
+                operand.add_use(self, idx)
 
     @classmethod
     @abstractmethod
     def get_namespace(cls):
         pass
 
+    @classmethod
+    def has_side_effect(cls) -> bool:
+        """
+        :return: False when a node only computes its result from its operands and attrs,
+                 so equal nodes may be merged and unused ones removed.
+        """
+        return False
+
     @classmethod
     def get_cls_name(cls):
         camel_case = cls.__name__
@@ -45,33 +73,72 @@ class Node(ABC):
         assert op_name not in Node.subclass_dict
         Node.subclass_dict[op_name] = cls
 
-    def add_user(self, user):
-        self.users.add(user)
+    def set_attr(self, name: str, value):
+        if self.attrs is EMPTY_ATTRS:
+            self.attrs = {}
+        self.attrs[name] = value
+
+    def add_use(self, user: 'Node', idx: int):
+        if self.uses is EMPTY_USES:
+            self.uses = {}
+        self.uses[(user, idx)] = None
 
-    def remove_user(self, user):
-        if user in self.users:
-            self.users.remove(user)
+    def remove_use(self, user: 'Node', idx: int):
+        self.uses.pop((user, idx), None)
+
+    @property
+    def users(self) -> List['Node']:
+        """
+        Distinct users in use order.
+        """
+        return list(dict.fromkeys(user for user, _ in self.uses))
+
+    def get_use_count(self) -> int:
+        return len(self.uses)
+
+    def has_single_use(self) -> bool:
+        return len(self.uses) == 1
 
     def set_operand(self, idx: int, new_operand: 'Node'):
         old_operand = self.operands[idx]
         if old_operand is not None:
-            old_operand.remove_user(self)
-        self.operands[idx] = new_operand
+            old_operand.remove_use(self, idx)
+        self.operands = self.operands[:idx] + (new_operand,) + self.operands[idx + 1:]
         if new_operand is not None:
-            new_operand.add_user(self)
+            new_operand.add_use(self, idx)
 
-        self._type_notation = UnknownType()
+        if not isinstance(self._type_notation, UnknownType):
+            # keep the inferred types downstream when the operand type does not change.
+            old_type = old_operand._type_notation if old_operand is not None else NoneType()
+            if isinstance(old_type, UnknownType) or old_type != Node.get_type_notation(new_operand):
+                self.invalidate_type_notation()
 
     def replace_operand(self, old_operand: 'Node', new_operand: 'Node'):
         for idx, operand in enumerate(self.operands):
             if operand == old_operand:
                 self.set_operand(idx, new_operand)
 
+    def clone(self, operands: List['Node']) -> 'Node':
+        """
+        :return: a node of the same class, attrs, location and type over operands, outside any graph.
+        """
+        new_node = copy.copy(self)
+        new_node.operands = tuple(operands)
+        new_node.attrs = dict(self.attrs) if self.attrs else EMPTY_ATTRS
+        new_node.dead = False
+        new_node.uses = EMPTY_USES
+        new_node.prev_node = None
+        new_node.next_node = None
+        for idx, operand in enumerate(new_node.operands):
+            if operand is not None:
+                operand.add_use(new_node, idx)
+        return new_node
+
     def remove(self):
         self.dead = True
-        for operand in self.operands:
+        for idx, operand in enumerate(self.operands):
             if operand is not None:
-                operand.remove_user(self)
+                operand.remove_use(self, idx)
 
     @staticmethod
     def get_node_class(op_name: str):
@@ -86,16 +153,54 @@ class Node(ABC):
     def get_type_notation(node) -> TypeNotation:
         if isinstance(node, Node):
             if isinstance(node._type_notation, UnknownType):
-                for operand in node.operands:
-                    Node.get_type_notation(operand)
-
-                node._type_notation = node.inference_type_notation()
+                Node.inference_type_notation_iterative(node)
             return node._type_notation
         elif node is None:
             return NoneType()
         else:
             raise TypeError(f'Unsupported type: {type(node)}')
 
+    @staticmethod
+    def inference_type_notation_iterative(node: 'Node'):
+        """
+        Infer the types of node and its unknown operands in post order, with an explicit stack.
+        A node with a known type always has operands with known types,
+        so the walk stops at known nodes.
+        """
+        stack = [(node, False)]
+        visited = set()
+        while stack:
+            cur, operands_done = stack.pop()
+            if not isinstance(cur._type_notation, UnknownType):
+                continue
+            if operands_done:
+                cur._type_notation = cur.inference_type_notation()
+            elif cur not in visited:
+                visited.add(cur)
+                stack.append((cur, True))
+                for operand in reversed(cur.operands):
+                    if operand is not None and isinstance(operand._type_notation, UnknownType):
+                        stack.append((operand, False))
+
+    def set_type_notation(self, type_notation: TypeNotation):
+        if self._type_notation is type_notation:
+            return
+        self.invalidate_type_notation()
+        self._type_notation = type_notation
+
+    def invalidate_type_notation(self):
+        """
+        Reset the type of this node and of every user depending on it.
+        Users with unknown types are skipped, their users are unknown already.
+        """
+        worklist = [self]
+        while worklist:
+            node = worklist.pop()
+            if node is not self and isinstance(node._type_notation, UnknownType):
+                continue
+            node._type_notation = UNKNOWN_TYPE
+            worklist.extend(user for user, _ in node.uses)
+
     def to_string(self, node_name_dict: Dict['Node', str]):
         return f'{self.get_op_name()}({", ".join(node_name_dict[i] for i in self.operands)}) ' \
                f'{self.attrs if self.attrs else ""}'
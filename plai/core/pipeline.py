@@ -46,10 +46,15 @@ class UntilStablePass(Pass):
 
 
 class Pipeline(Pass):
-    def __init__(self, name: str = None, passes: typing.Sequence[Pass] = None, metadata: dict = None):
+    def __init__(self, name: str = None, passes: typing.Sequence[Pass] = None, metadata: dict = None,
+                 cleanup: Pass = None):
+        """
+        :param cleanup: run after each pass which changed the graph, such as DeadCodeEliminationPass.
+        """
         super().__init__(name or f'pipeline')
         self.passes = list(passes) or []
         self.metadata = metadata or {}
+        self.cleanup = cleanup
 
     def __call__(self, graph) -> bool:
         changed = False
@@ -58,6 +63,8 @@ class Pipeline(Pass):
             # print(graph)
 
             step_changed = cur_pass(graph)
+            if step_changed and self.cleanup is not None:
+                self.cleanup(graph)
             changed = changed or step_changed
         return changed
 
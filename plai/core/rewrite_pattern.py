@@ -1,22 +1,13 @@
+import collections
 import inspect
 import typing
 from abc import ABC, abstractmethod
 
+from plai.core.core_dialect import Placeholder
 from plai.core.graph import Graph, listener_context
 from plai.core.node import Node
 
 
-class TraceChangedListener(Graph.Listener):
-    def __init__(self):
-        self.changed_nodes = []
-
-    def after_add_node(self, graph: Graph, node: Node):
-        self.changed_nodes.append(node)
-
-    def before_node_operand_change(self, graph: Graph, node: Node, old_operand: Node, new_operand: Node):
-        self.changed_nodes.append(node)
-
-
 class RewritePattern(ABC):
     @staticmethod
     @abstractmethod
@@ -75,29 +66,98 @@ class RewritePatternList(RewritePattern):
         return []
 
 
+class RewriteStatistics:
+    def __init__(self):
+        self.visited_count = 0
+        self.rewrite_count = 0
+        self.added_count = 0
+        self.removed_count = 0
+        self.converged = True
+
+    @property
+    def changed(self) -> bool:
+        return self.rewrite_count > 0
+
+    def __repr__(self):
+        return f'RewriteStatistics(visited={self.visited_count}, rewrites={self.rewrite_count}, ' \
+               f'added={self.added_count}, removed={self.removed_count}, converged={self.converged})'
+
+
+class GreedyRewriteDriver(Graph.Listener):
+    """
+    Apply a pattern until no more node matches.
+    Nodes are queued once, removed nodes are dropped from the worklist,
+    and only the nodes around a change are queued again.
+    """
+
+    def __init__(self, graph: Graph, pattern: RewritePattern, max_rewrite_count: int = None):
+        self.graph = graph
+        self.pattern = pattern
+        self.max_rewrite_count = max_rewrite_count
+        self.worklist: typing.Deque[Node] = collections.deque()
+        self.in_worklist: typing.Set[Node] = set()
+        self.statistics = RewriteStatistics()
+
+    def push(self, node: Node):
+        if node is None or node.dead or isinstance(node, Placeholder) or node in self.in_worklist:
+            return
+        self.in_worklist.add(node)
+        self.worklist.append(node)
+
+    def pop(self) -> Node | None:
+        while self.worklist:
+            node = self.worklist.popleft()
+            if node in self.in_worklist:
+                self.in_worklist.remove(node)
+                return node
+        return None
+
+    def after_add_node(self, graph: Graph, node: Node):
+        self.statistics.added_count += 1
+        self.push(node)
+
+    def before_remove_node(self, graph: Graph, node: Node):
+        self.statistics.removed_count += 1
+        self.in_worklist.discard(node)
+        for operand in node.operands:
+            self.push(operand)
+
+    def before_node_operand_change(self, graph: Graph, node: Node, old_operand: Node, new_operand: Node):
+        self.push(node)
+        self.push(old_operand)
+
+    def run(self) -> RewriteStatistics:
+        for node in self.graph:
+            self.push(node)
+
+        with listener_context(self.graph, self):
+            while (node := self.pop()) is not None:
+                self.statistics.visited_count += 1
+                self.graph.set_insert_point_after(node)
+                if self.pattern.match_and_replace(self.graph, node):
+                    self.statistics.rewrite_count += 1
+                    # only a rewrite over the budget proves the run did not converge,
+                    # a worklist left without matches once the budget is used up has converged.
+                    if self.max_rewrite_count is not None and self.statistics.rewrite_count > self.max_rewrite_count:
+                        self.statistics.converged = False
+                        break
+                    self.push(node)
+
+        return self.statistics
+
+
+def rewrite_pattern_greedy(graph: Graph, pattern: RewritePattern, max_rewrite_count: int = None) -> RewriteStatistics:
+    """
+    :param graph:
+    :param pattern:
+    :param max_rewrite_count: rewrite budget, None for unlimited.
+                              The run stops at the first rewrite over the budget and is not converged then.
+    :return: statistics of this run.
+    """
+    return GreedyRewriteDriver(graph, pattern, max_rewrite_count).run()
+
+
 def rewrite_pattern_recursive(graph: Graph, pattern: RewritePattern, max_replace_count_factor: int = 10) -> bool:
-    changed = False
-    processed_replace_count = 0
-    todo_node_list = []
-    graph.walk(todo_node_list.append)
-
-    max_replace_count = len(todo_node_list) * max_replace_count_factor
-
-    while todo_node_list:
-        assert processed_replace_count < max_replace_count, 'Infinite loop detected.'
-        next_todo_node_list = []
-        with listener_context(graph, TraceChangedListener()) as trace_changed:
-            for node in todo_node_list:
-                if node.dead:
-                    continue
-                graph.set_insert_point_after(node)
-                if pattern.match_and_replace(graph, node):
-                    next_todo_node_list.append(node)
-                    changed = True
-                    processed_replace_count += 1
-
-        graph.do_remove_dead_node()
-        next_todo_node_list.extend(trace_changed.changed_nodes)
-        todo_node_list = next_todo_node_list
-
-    return changed
+    statistics = rewrite_pattern_greedy(graph, pattern, len(graph) * max_replace_count_factor)
+    assert statistics.converged, 'Infinite loop detected.'
+    return statistics.changed
@@ -8,6 +8,12 @@ class Runtime:
     def __call__(self, graph: Graph, input_tensors) -> Graph:
         return self.run(graph, input_tensors)
 
+    def prepare(self, graph: Graph):
+        """
+        Called once per compiled graph before the first run, for ahead of time work.
+        """
+        pass
+
     @abstractmethod
     def run(self, graph: Graph, input_tensors) -> Graph:
         pass
@@ -1,48 +1,125 @@
+import enum
+import threading
 import typing
+import weakref
+
+
+class DType(enum.Enum):
+    unknown = '?'
+    bool = 'bool'
+    int8 = 'int8'
+    uint8 = 'uint8'
+    int16 = 'int16'
+    int32 = 'int32'
+    int64 = 'int64'
+    float16 = 'float16'
+    bfloat16 = 'bfloat16'
+    float32 = 'float32'
+    float64 = 'float64'
+    str = 'str'
+
+    def __str__(self):
+        return self.value
 
 
 class TypeNotation:
-    def __init__(self, name: str = '?'):
-        self.name = name
+    """
+    Types are immutable and interned: equal types are the same object,
+    so `==` and `hash` are identity based and types can be used as dict keys.
+    """
+    __slots__ = ('name', 'key', '__weakref__')
+
+    _intern_table: 'weakref.WeakValueDictionary[tuple, TypeNotation]' = weakref.WeakValueDictionary()
+    _intern_lock = threading.Lock()
+
+    def __new__(cls, name: str = '?'):
+        return cls.intern((name,), name=name)
+
+    @classmethod
+    def intern(cls, key: tuple, **fields):
+        instance = TypeNotation._intern_table.get((cls,) + key)
+        if instance is not None:
+            return instance
+
+        with TypeNotation._intern_lock:
+            instance = TypeNotation._intern_table.get((cls,) + key)
+            if instance is None:
+                instance = object.__new__(cls)
+                object.__setattr__(instance, 'key', key)
+                for field_name, value in fields.items():
+                    object.__setattr__(instance, field_name, value)
+                TypeNotation._intern_table[(cls,) + key] = instance
+        return instance
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __reduce__(self):
+        return type(self), self.key
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def __str__(self):
         return self.name
 
+    def __repr__(self):
+        return str(self)
+
 
 class UnknownType(TypeNotation):
-    def __init__(self):
-        super().__init__('?')
+    __slots__ = ()
+
+    def __new__(cls):
+        return cls.intern((), name='?')
+
 
 class NoneType(TypeNotation):
-    def __init__(self):
-        super().__init__('None')
+    __slots__ = ()
+
+    def __new__(cls):
+        return cls.intern((), name='None')
 
 
 class ScalarType(TypeNotation):
-    def __init__(self, name: str):
-        super().__init__(name)
+    __slots__ = ('dtype',)
+
+    def __new__(cls, dtype: DType):
+        dtype = DType(dtype)
+        return cls.intern((dtype,), name=dtype.value, dtype=dtype)
 
 
 class TensorType(TypeNotation):
-    def __init__(self, shape: typing.Sequence[int], element_type: TypeNotation):
-        super().__init__()
-        self.shape = list(shape)
-        self.element_type = element_type
+    __slots__ = ('shape', 'element_type')
+
+    def __new__(cls, shape: typing.Sequence[int | None], element_type: DType):
+        """
+        :param shape: dims, None for unknown dims.
+        :param element_type:
+        """
+        shape = tuple(shape)
+        element_type = DType(element_type)
+        return cls.intern((shape, element_type), name='?', shape=shape, element_type=element_type)
 
     def __str__(self):
-        return f'tensor({self.shape}, {self.element_type})'
+        return f'tensor({list(self.shape)}, {self.element_type})'
 
 
 class TupleType(TypeNotation):
-    def __init__(self, types: typing.Sequence[TypeNotation]):
-        super().__init__()
-        self.types = types
+    __slots__ = ('types',)
+
+    def __new__(cls, types: typing.Sequence[TypeNotation]):
+        types = tuple(types)
+        return cls.intern((types,), name='?', types=types)
 
     def __str__(self):
         return f'tuple({", ".join(str(t) for t in self.types)})'
 
 
-def broadcast_shape(shape1: typing.List[int], shape2: typing.List[int]) -> typing.List[int]:
+def broadcast_shape(shape1: typing.Sequence[int | None], shape2: typing.Sequence[int | None]) -> typing.Tuple[int | None, ...]:
     """
     Broadcast two shapes together.
     """
@@ -57,21 +134,25 @@ def broadcast_shape(shape1: typing.List[int], shape2: typing.List[int]) -> typin
             result.append(dim2)
         elif dim2 == 1:
             result.append(dim1)
+        elif dim1 is None or dim2 is None:
+            result.append(dim1 if dim2 is None else dim2)
         else:
             raise ValueError(f'Incompatible shapes: {shape1}, {shape2}')
-    return list(reversed(result))
+    return tuple(reversed(result))
 
 
 def get_type_from_value(value):
-    if isinstance(value, int):
-        return ScalarType('int')
+    if isinstance(value, bool):
+        return ScalarType(DType.bool)
+    elif isinstance(value, int):
+        return ScalarType(DType.int64)
     elif isinstance(value, float):
-        return ScalarType('float')
-    elif isinstance(value, bool):
-        return ScalarType('bool')
+        return ScalarType(DType.float64)
     elif isinstance(value, str):
-        return ScalarType('str')
+        return ScalarType(DType.str)
     elif isinstance(value, tuple):
         return TupleType([get_type_from_value(v) for v in value])
+    elif hasattr(value, 'shape') and hasattr(value, 'dtype'):
+        return TensorType(value.shape, DType(str(value.dtype)))
     else:
-        raise ValueError(f'Unsupported constant type: {type(value)}')
\ No newline at end of file
+        raise ValueError(f'Unsupported constant type: {type(value)}')
@@ -43,11 +43,10 @@ class Addmm(AtenNode):
         ), f'Addmm mat1 and mat2 should be compatible, but got {mat1_type} and {mat2_type}'
 
         if len(mat1_type.shape) == 1:
-            last_dim = mat1_type.shape[-1]
-            out_shape = mat2_type.shape[-2:] + [last_dim]
+            out_shape = mat2_type.shape[:-2] + mat2_type.shape[-1:]
         else:
-            out_shape = type_notation.broadcast_shape(mat1_type.shape[-2:], mat2_type.shape[-2:])
-            out_shape = out_shape + [mat1_type.shape[-2], mat2_type.shape[-1]]
+            out_shape = type_notation.broadcast_shape(mat1_type.shape[:-2], mat2_type.shape[:-2])
+            out_shape = out_shape + (mat1_type.shape[-2], mat2_type.shape[-1])
 
         out_type = TensorType(out_shape, mat1_type.element_type)
         return out_type
@@ -77,8 +76,8 @@ class Mm(AtenNode):
                 mat1_type.shape[-1] == mat2_type.shape[-2]  #
         ), f'Mm mat1 and mat2 should be compatible, but got {mat1_type} and {mat2_type}'
 
-        out_shape = type_notation.broadcast_shape(mat1_type.shape[:-1], mat2_type.shape[:-2])
-        out_shape = out_shape + [mat1_type.shape[-2], mat2_type.shape[-1]]
+        out_shape = type_notation.broadcast_shape(mat1_type.shape[:-2], mat2_type.shape[:-2])
+        out_shape = out_shape + (mat1_type.shape[-2], mat2_type.shape[-1])
 
         out_type = TensorType(out_shape, mat1_type.element_type)
         return out_type
@@ -163,7 +162,7 @@ class Max(AtenNode):
         assert len(arg_type.shape) >= 1, f'Max arg should have at least 1 dimensions, but got {arg_type}'
         assert self.attrs['dim'] < len(arg_type.shape), f'Max dim should be less than arg dimensions, but got {self.attrs["dim"]} and {len(arg_type.shape)}'
         if self.attrs['keepdim']:
-            out_shape = arg_type.shape[:self.attrs['dim']] + [1] + arg_type.shape[self.attrs['dim'] + 1:]
+            out_shape = arg_type.shape[:self.attrs['dim']] + (1,) + arg_type.shape[self.attrs['dim'] + 1:]
         else:
             out_shape = arg_type.shape[:self.attrs['dim']] + arg_type.shape[self.attrs['dim'] + 1:]
 
@@ -219,7 +218,7 @@ class Transpose(AtenNode):
         arg_type = Node.get_type_notation(arg)
         assert isinstance(arg_type, TensorType), f'Transpose arg should be tensor, but got {arg_type}'
         assert len(arg_type.shape) >= 2, f'Transpose arg should have at least 2 dimensions, but got {arg_type}'
-        out_shape = arg_type.shape[:-2] + [arg_type.shape[-1], arg_type.shape[-2]]
+        out_shape = arg_type.shape[:-2] + (arg_type.shape[-1], arg_type.shape[-2])
         out_type = TensorType(out_shape, arg_type.element_type)
         return out_type
 
@@ -5,7 +5,23 @@ import numpy
 
 from plai.core.location import Location
 from plai.core.node import Node
-from plai.core.type_notation import TypeNotation, ScalarType, TensorType, UnknownType, NoneType, broadcast_shape
+from plai.core.type_notation import TypeNotation, ScalarType, TensorType, NoneType, broadcast_shape, \
+    get_type_from_value
+
+
+def elementwise_type_notation(op_name: str, operand1_type: TypeNotation, operand2_type: TypeNotation) -> TypeNotation:
+    """
+    Scalar operands are broadcast and take the element type of the tensor operand.
+    """
+    assert isinstance(operand1_type, (TensorType, ScalarType)), f'{op_name} operand1 should be a tensor or scalar'
+    assert isinstance(operand2_type, (TensorType, ScalarType)), f'{op_name} operand2 should be a tensor or scalar'
+    if isinstance(operand1_type, ScalarType):
+        return operand2_type
+    if isinstance(operand2_type, ScalarType):
+        return operand1_type
+    assert operand1_type.element_type == operand2_type.element_type, f'{op_name} operands should have the same element type'
+    common_shape = broadcast_shape(operand1_type.shape, operand2_type.shape)
+    return TensorType(common_shape, operand1_type.element_type)
 
 
 class PlaiNode(Node, ABC):
@@ -15,24 +31,19 @@ class PlaiNode(Node, ABC):
 
 
 class Constant(PlaiNode):
+    __slots__ = ('value_type',)
+
     def __init__(self, value, loc: Location = None):
         super().__init__([], {'value': value}, loc)
-        if isinstance(value, int):
-            self.value_type = ScalarType('int')
-        elif isinstance(value, float):
-            self.value_type = ScalarType('float')
-        elif isinstance(value, bool):
-            self.value_type = ScalarType('bool')
-        elif isinstance(value, numpy.ndarray):
-            self.value_type = TensorType(value.shape, UnknownType())
-        else:
+        if not isinstance(value, (bool, int, float, numpy.ndarray)):
             raise ValueError(f'Unsupported constant type: {type(value)}')
+        self.value_type = get_type_from_value(value)
 
     def get_value(self):
         return self.attrs['value']
 
     def inference_type_notation(self) -> TypeNotation:
-        assert self.operands == [], 'Constant node should not have operands'
+        assert self.operands == (), 'Constant node should not have operands'
         return self.value_type
 
 
@@ -61,7 +72,7 @@ class Relu(PlaiNode):
         assert len(self.operands) == 1, 'Relu node should have exactly one operand'
         operand_type = Node.get_type_notation(self.operands[0])
         assert isinstance(operand_type, TensorType), 'Relu operand should be a tensor'
-        return TensorType(operand_type.shape, operand_type.element_type)
+        return operand_type
 
 
 class AddMm(PlaiNode):
@@ -104,10 +115,10 @@ class AddMm(PlaiNode):
         mat1_shape = mat1_type.shape
         mat2_shape = mat2_type.shape
         if len(mat1_shape) == 1:
-            return TensorType(mat2_shape[:-2] + [mat2_type.shape[-1]], element_type)
+            return TensorType(mat2_shape[:-2] + (mat2_type.shape[-1],), element_type)
         else:
             common_shape = broadcast_shape(mat1_shape[:-1], mat2_shape[:-2])
-            return TensorType(common_shape + [mat2_type.shape[-1]], element_type)
+            return TensorType(common_shape + (mat2_type.shape[-1],), element_type)
 
 
 class Add(PlaiNode):
@@ -119,14 +130,7 @@ class Add(PlaiNode):
         operand1_type = Node.get_type_notation(self.operands[0])
         operand2_type = Node.get_type_notation(self.operands[1])
 
-        assert isinstance(operand1_type, TensorType), 'Add operand1 should be a tensor'
-        assert isinstance(operand2_type, TensorType), 'Add operand2 should be a tensor'
-        assert operand1_type.element_type == operand2_type.element_type, 'Add operands should have the same element type'
-        element_type = operand1_type.element_type
-        shape1 = operand1_type.shape
-        shape2 = operand2_type.shape
-        common_shape = broadcast_shape(shape1, shape2)
-        return TensorType(common_shape, element_type)
+        return elementwise_type_notation('Add', operand1_type, operand2_type)
 
 
 class Mul(PlaiNode):
@@ -138,33 +142,140 @@ class Mul(PlaiNode):
         operand1_type = Node.get_type_notation(self.operands[0])
         operand2_type = Node.get_type_notation(self.operands[1])
 
-        assert isinstance(operand1_type, TensorType), 'Mul operand1 should be a tensor'
-        assert isinstance(operand2_type, TensorType), 'Mul operand2 should be a tensor'
-        assert operand1_type.element_type == operand2_type.element_type, 'Mul operands should have the same element type'
-        element_type = operand1_type.element_type
-        shape1 = operand1_type.shape
-        shape2 = operand2_type.shape
-        common_shape = broadcast_shape(shape1, shape2)
-        return TensorType(common_shape, element_type)
+        return elementwise_type_notation('Mul', operand1_type, operand2_type)
+
+
+def is_last_two_dims_swap(permutation) -> bool:
+    """
+    :return: True when permutation only swaps the last two dimensions.
+    """
+    rank = len(permutation)
+    return rank >= 2 and list(permutation) == list(range(rank - 2)) + [rank - 1, rank - 2]
+
+
+def matmul_type_notation(operand1_type: TypeNotation, operand2_type: TypeNotation,
+                         transpose_b: bool = False) -> TypeNotation:
+    assert isinstance(operand1_type, TensorType), 'MatMul operand1 should be a tensor'
+    assert isinstance(operand2_type, TensorType), 'MatMul operand2 should be a tensor'
+    assert operand1_type.element_type == operand2_type.element_type, 'MatMul operands should have the same element type'
+    element_type = operand1_type.element_type
+    shape1 = operand1_type.shape
+    shape2 = operand2_type.shape
+    if transpose_b:
+        assert len(shape2) >= 2, 'MatMul operand2 should have at least 2 dimensions with transpose_b'
+        shape2 = shape2[:-2] + (shape2[-1], shape2[-2])
+    assert len(shape1) >= 1 and len(shape2) >= 1, 'MatMul operands should have at least 1 dimension'
+    if len(shape1) == 1:
+        return TensorType(shape2[:-2] + shape2[-1:], element_type)
+    if len(shape2) == 1:
+        return TensorType(shape1[:-1], element_type)
+    common_shape = broadcast_shape(shape1[:-2], shape2[:-2])
+    return TensorType(common_shape + (shape1[-2], shape2[-1]), element_type)
 
 
 class MatMul(PlaiNode):
-    def __init__(self, arg1: Node, arg2: Node, loc: Location = None):
-        super().__init__([arg1, arg2], {}, loc)
+    def __init__(self, arg1: Node, arg2: Node, loc: Location = None, transpose_b: bool = False):
+        """
+        :param transpose_b: multiply by arg2 with its last two dimensions swapped,
+                            kernels hand the transposed layout to BLAS instead of copying arg2.
+        """
+        super().__init__([arg1, arg2], {'transpose_b': True} if transpose_b else {}, loc)
+
+    def get_transpose_b(self) -> bool:
+        return self.attrs.get('transpose_b', False)
 
     def inference_type_notation(self) -> TypeNotation:
         assert len(self.operands) == 2, 'MatMul node should have exactly two operands'
-        operand1_type = Node.get_type_notation(self.operands[0])
-        operand2_type = Node.get_type_notation(self.operands[1])
+        return matmul_type_notation(Node.get_type_notation(self.operands[0]),
+                                    Node.get_type_notation(self.operands[1]), self.get_transpose_b())
+
+
+class FusedLinear(PlaiNode):
+    """
+    relu(alpha * (a @ b) + beta * bias), a MatMul with its elementwise epilogue.
+    The bias and the relu are optional, b is transposed like MatMul with transpose_b.
+    """
+
+    def __init__(self, a: Node, b: Node, bias: Node = None, alpha: float = 1.0, beta: float = 1.0,
+                 relu: bool = False, transpose_b: bool = False, loc: Location = None):
+        operands = [a, b] if bias is None else [a, b, bias]
+        super().__init__(operands, {'alpha': alpha, 'beta': beta, 'relu': relu, 'transpose_b': transpose_b}, loc)
+
+    def get_bias(self) -> Node | None:
+        return self.operands[2] if len(self.operands) == 3 else None
 
-        assert isinstance(operand1_type, TensorType), 'MatMul operand1 should be a tensor'
-        assert isinstance(operand2_type, TensorType), 'MatMul operand2 should be a tensor'
-        assert operand1_type.element_type == operand2_type.element_type, 'MatMul operands should have the same element type'
-        element_type = operand1_type.element_type
-        shape1 = operand1_type.shape
-        shape2 = operand2_type.shape
-        common_shape = broadcast_shape(shape1[:-1], shape2[:-2])
-        return TensorType(common_shape + [shape1[-1], shape2[-1]], element_type)
+    def get_alpha(self):
+        return self.attrs['alpha']
+
+    def get_beta(self):
+        return self.attrs['beta']
+
+    def get_relu(self) -> bool:
+        return self.attrs['relu']
+
+    def get_transpose_b(self) -> bool:
+        return self.attrs['transpose_b']
+
+    def inference_type_notation(self) -> TypeNotation:
+        assert len(self.operands) in (2, 3), 'FusedLinear node should have two or three operands'
+        result_type = matmul_type_notation(Node.get_type_notation(self.operands[0]),
+                                           Node.get_type_notation(self.operands[1]), self.get_transpose_b())
+        if self.get_bias() is not None:
+            result_type = elementwise_type_notation('FusedLinear', result_type,
+                                                    Node.get_type_notation(self.get_bias()))
+        return result_type
+
+
+class FusedElementwise(PlaiNode):
+    """
+    A region of elementwise ops evaluated in one pass.
+    program is a tuple of steps (op name, refs), op name is one of 'add', 'mul', 'relu',
+    a ref is ('input', operand index), ('step', step index) or ('const', scalar).
+    The last step is the result.
+    """
+
+    def __init__(self, inputs: List[Node], program: tuple, loc: Location = None):
+        super().__init__(inputs, {'program': program}, loc)
+
+    def get_program(self) -> tuple:
+        return self.attrs['program']
+
+    def evaluate(self, input_values: list, op_dict: dict, const_fn=lambda value: value):
+        """
+        Evaluate the program over any value domain, such as types, arrays or source expressions.
+
+        :param input_values: values of the operands.
+        :param op_dict: op name -> function of the values of its refs.
+        :param const_fn: value of a ('const', scalar) ref.
+        :return: value of the last step.
+        """
+        step_values = []
+        for op_name, refs in self.get_program():
+            args = []
+            for kind, value in refs:
+                if kind == 'input':
+                    args.append(input_values[value])
+                elif kind == 'step':
+                    args.append(step_values[value])
+                else:
+                    args.append(const_fn(value))
+            step_values.append(op_dict[op_name](*args))
+        return step_values[-1]
+
+    def inference_type_notation(self) -> TypeNotation:
+        assert len(self.get_program()) > 0, 'FusedElementwise program should not be empty'
+
+        def relu_type(operand_type):
+            assert isinstance(operand_type, TensorType), 'Relu operand should be a tensor'
+            return operand_type
+
+        op_dict = {
+            'add': lambda t1, t2: elementwise_type_notation('Add', t1, t2),
+            'mul': lambda t1, t2: elementwise_type_notation('Mul', t1, t2),
+            'relu': relu_type,
+        }
+        return self.evaluate([Node.get_type_notation(operand) for operand in self.operands], op_dict,
+                             get_type_from_value)
 
 
 def register_dialect():
@@ -4,7 +4,7 @@ from typing import Callable
 
 from plai.core.location import Location
 from plai.core.node import Node
-from plai.core.type_notation import TupleType
+from plai.core.type_notation import TupleType, TensorType, TypeNotation, NoneType
 
 
 class TorchNode(Node, abc.ABC):
@@ -66,6 +66,21 @@ class Linear(TorchNode):
     def from_torch(args: list, attrs: dict, loc: Location = None):
         return Linear(args[0], args[1], args[2], loc)
 
+    def inference_type_notation(self) -> TypeNotation:
+        assert len(self.operands) == 3, f'Linear should have 3 operands, but got {len(self.operands)}'
+        [arg, weight, bias] = self.operands
+        arg_type = Node.get_type_notation(arg)
+        weight_type = Node.get_type_notation(weight)
+        bias_type = Node.get_type_notation(bias)
+        assert isinstance(arg_type, TensorType), f'Linear arg should be tensor, but got {arg_type}'
+        assert isinstance(weight_type, TensorType), f'Linear weight should be tensor, but got {weight_type}'
+        assert isinstance(bias_type, (TensorType, NoneType)), f'Linear bias should be tensor or None, but got {bias_type}'
+        assert len(weight_type.shape) == 2, f'Linear weight should have 2 dimensions, but got {weight_type}'
+        assert (  #
+                arg_type.shape[-1] == weight_type.shape[-1]  #
+        ), f'Linear arg and weight should be compatible, but got {arg_type} and {weight_type}'
+        return TensorType(arg_type.shape[:-1] + (weight_type.shape[0],), arg_type.element_type)
+
     @classmethod
     def register_torch_overload(cls, register: Callable[[str, Callable], None]):
         name = f'{cls.get_namespace()}._C._nn.linear'
@@ -80,6 +95,13 @@ class Relu(TorchNode):
     def from_torch(args: list, attrs: dict, loc: Location = None):
         return Relu(args[0], loc)
 
+    def inference_type_notation(self) -> TypeNotation:
+        assert len(self.operands) == 1, f'Relu should have 1 operand, but got {len(self.operands)}'
+        [arg] = self.operands
+        arg_type = Node.get_type_notation(arg)
+        assert isinstance(arg_type, TensorType), f'Relu arg should be tensor, but got {arg_type}'
+        return arg_type
+
     @classmethod
     def register_torch_overload(cls, register: Callable[[str, Callable], None]):
         name = f'{cls.get_namespace()}.relu'
@@ -0,0 +1,61 @@
+import typing
+
+import numpy
+
+from plai.core import pipeline
+from plai.core.graph import Graph
+from plai.core.node import Node
+
+
+def get_hashable_attr(value) -> typing.Hashable:
+    """
+    :return: a hashable key equal for equal attrs, the type is part of the key so that 1, 1.0 and True differ.
+    :raise TypeError: when value cannot be hashed.
+    """
+    if isinstance(value, (list, tuple)):
+        return type(value), tuple(get_hashable_attr(v) for v in value)
+    if isinstance(value, dict):
+        return dict, tuple(sorted((k, get_hashable_attr(v)) for k, v in value.items()))
+    if isinstance(value, numpy.ndarray):
+        return numpy.ndarray, value.dtype.str, value.shape, value.tobytes()
+    hash(value)
+    return type(value), value
+
+
+def get_node_key(node: Node) -> typing.Hashable | None:
+    """
+    :return: a key equal for nodes computing the same value, None for nodes which cannot be merged.
+    """
+    if node.has_side_effect():
+        return None
+    try:
+        attrs = get_hashable_attr(dict(node.attrs))
+    except TypeError:
+        return None
+    return type(node), node.operands, attrs
+
+
+class CommonSubexpressionEliminationPass(pipeline.Pass):
+    """
+    Merge nodes of the same class with the same operands and attrs, in one sweep over the graph.
+    Operands come before their users, so users of merged nodes are merged in the same sweep.
+    removed_count is the number of nodes removed by the last call.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.removed_count = 0
+
+    def __call__(self, graph: Graph) -> bool:
+        self.removed_count = 0
+        node_dict: typing.Dict[typing.Hashable, Node] = {}
+        for node in graph:
+            key = get_node_key(node)
+            if key is None:
+                continue
+            existing = node_dict.setdefault(key, node)
+            if existing is not node:
+                graph.replace_all_uses_with(node, existing)
+                graph.erase_node(node)
+                self.removed_count += 1
+        return self.removed_count > 0
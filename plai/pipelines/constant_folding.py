@@ -0,0 +1,68 @@
+import typing
+
+import numpy
+
+from plai.core import pipeline
+from plai.core.graph import Graph
+from plai.dialect import plai_dialect
+from plai.runtime.kernel_registry import KernelRegistry
+from plai.runtime.numpy_kernels import numpy_kernel_registry
+
+
+def bind_constant_arguments(graph: Graph, value_dict: typing.Dict[int, numpy.ndarray]) -> int:
+    """
+    Replace the uses of arguments with constants, the arguments are kept so the graph signature stays the same.
+
+    :param value_dict: argument index -> value.
+    :return: count of bound arguments.
+    """
+    insert_point = graph.insert_point
+    graph.set_insert_point_before(graph.first_node)
+    for idx, value in value_dict.items():
+        arg = graph.arguments[idx]
+        constant = graph.add_node(plai_dialect.Constant(value, arg.loc))
+        for user, operand_idx in list(arg.uses):
+            user.set_operand(operand_idx, constant)
+    graph.restore_insert_point(insert_point)
+    return len(value_dict)
+
+
+class ConstantFoldingPass(pipeline.Pass):
+    """
+    Evaluate nodes whose operands are all constants with the kernels of kernel_registry,
+    and replace them with constants of their results, in one sweep so whole constant subgraphs are folded.
+    Operands left unused are erased by DeadCodeEliminationPass.
+    folded_count is the number of nodes folded by the last call.
+    """
+
+    def __init__(self, kernel_registry: KernelRegistry = numpy_kernel_registry):
+        super().__init__()
+        self.kernel_registry = kernel_registry
+        self.folded_count = 0
+
+    def __call__(self, graph: Graph) -> bool:
+        self.folded_count = 0
+        insert_point = graph.insert_point
+        for node in graph:
+            if isinstance(node, plai_dialect.Constant) or node.has_side_effect() or not node.operands:
+                continue
+            if not all(isinstance(operand, plai_dialect.Constant) for operand in node.operands):
+                continue
+            if self.kernel_registry.lookup(node) is None:
+                continue
+            values = [operand.get_value() for operand in node.operands]
+            result = self.kernel_registry.create_kernel(node)(*values)
+            if numpy.ndim(result) == 0 and not any(isinstance(value, numpy.ndarray) for value in values):
+                # numpy scalars such as numpy.int64 become python scalars, so the constant stays a ScalarType.
+                result = numpy.asarray(result).item()
+            else:
+                # a kernel may return a view of a constant, such as a transpose, the copy is contiguous.
+                result = numpy.array(result, order='C')
+
+            graph.set_insert_point_before(node)
+            constant = graph.add_node(plai_dialect.Constant(result, node.loc))
+            graph.replace_all_uses_with(node, constant)
+            graph.erase_node(node)
+            self.folded_count += 1
+        graph.restore_insert_point(insert_point)
+        return self.folded_count > 0
@@ -0,0 +1,25 @@
+from plai.core import pipeline
+from plai.core.graph import Graph
+
+
+class DeadCodeEliminationPass(pipeline.Pass):
+    """
+    Erase unused nodes without side effects, walking the graph backwards from the outputs.
+    Users come after their operands, so an operand left unused by an erased user is visited later in the same walk.
+    removed_count is the number of nodes erased by the last call.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.removed_count = 0
+
+    def __call__(self, graph: Graph) -> bool:
+        self.removed_count = 0
+        node = graph.last_node
+        while node is not None:
+            prev_node = node.prev_node
+            if not node.dead and node.get_use_count() == 0 and not node.has_side_effect():
+                graph.erase_node(node)
+                self.removed_count += 1
+            node = prev_node
+        return self.removed_count > 0
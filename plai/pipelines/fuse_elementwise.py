@@ -0,0 +1,88 @@
+import typing
+
+from plai.core import pipeline
+from plai.core.graph import Graph
+from plai.core.node import Node
+from plai.dialect import plai_dialect
+
+ELEMENTWISE_OP_NAMES = {
+    plai_dialect.Add: 'add',
+    plai_dialect.Mul: 'mul',
+    plai_dialect.Relu: 'relu',
+}
+
+
+def get_elementwise_op_name(node: Node) -> str | None:
+    return ELEMENTWISE_OP_NAMES.get(type(node))
+
+
+def is_scalar_constant(node: Node) -> bool:
+    return isinstance(node, plai_dialect.Constant) and isinstance(node.get_value(), (bool, int, float))
+
+
+class ElementwiseRegion:
+    """
+    Elementwise nodes ending at root whose intermediate results are used only inside the region.
+    """
+
+    def __init__(self, root: Node):
+        self.inputs: typing.List[Node] = []
+        self.steps: typing.List[tuple] = []
+        self.nodes: typing.List[Node] = []
+        self.constants: typing.List[Node] = []
+        self.add_step(root)
+
+    def get_ref(self, operand: Node) -> tuple:
+        if is_scalar_constant(operand):
+            self.constants.append(operand)
+            return 'const', operand.get_value()
+        if get_elementwise_op_name(operand) is not None and operand.has_single_use():
+            return 'step', self.add_step(operand)
+        if operand not in self.inputs:
+            self.inputs.append(operand)
+        return 'input', self.inputs.index(operand)
+
+    def add_step(self, node: Node) -> int:
+        refs = tuple(self.get_ref(operand) for operand in node.operands)
+        self.steps.append((get_elementwise_op_name(node), refs))
+        self.nodes.append(node)
+        return len(self.steps) - 1
+
+
+class FuseElementwisePass(pipeline.Pass):
+    """
+    Replace each region of at least min_size Add/Mul/Relu nodes with one FusedElementwise node.
+    Scalar constants are folded into the program.
+    """
+
+    def __init__(self, min_size: int = 2):
+        super().__init__()
+        self.min_size = min_size
+
+    def is_region_root(self, node: Node) -> bool:
+        if get_elementwise_op_name(node) is None:
+            return False
+        # a node with a single elementwise user is fused into the region of that user.
+        return not (node.has_single_use() and get_elementwise_op_name(node.users[0]) is not None)
+
+    def __call__(self, graph: Graph) -> bool:
+        changed = False
+        insert_point = graph.insert_point
+        for root in [node for node in graph if self.is_region_root(node)]:
+            region = ElementwiseRegion(root)
+            if len(region.nodes) < self.min_size:
+                continue
+            # operands are added before their users, so the root is the last step.
+            program = tuple(region.steps)
+
+            graph.set_insert_point_before(root)
+            fused = graph.add_node(plai_dialect.FusedElementwise(region.inputs, program, root.loc))
+            graph.replace_all_uses_with(root, fused)
+            for node in reversed(region.nodes):
+                graph.erase_node(node)
+            for constant in dict.fromkeys(region.constants):
+                if not constant.dead and constant.get_use_count() == 0:
+                    graph.erase_node(constant)
+            changed = True
+        graph.restore_insert_point(insert_point)
+        return changed
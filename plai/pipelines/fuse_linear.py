@@ -0,0 +1,115 @@
+from plai.core import pipeline
+from plai.core.graph import Graph
+from plai.core.node import Node
+from plai.core.type_notation import TensorType, broadcast_shape
+from plai.dialect import plai_dialect
+from plai.pipelines.fuse_elementwise import is_scalar_constant
+
+
+def get_single_user(node: Node) -> Node | None:
+    return node.users[0] if node.has_single_use() else None
+
+
+def match_scale(node: Node, value: Node) -> Node | None:
+    """
+    :return: the scalar constant node multiplies value with, None when node is not such a Mul.
+    """
+    if not isinstance(node, plai_dialect.Mul) or value not in node.operands:
+        return None
+    other = node.operands[1] if node.operands[0] is value else node.operands[0]
+    return other if is_scalar_constant(other) else None
+
+
+def is_bias_of(bias: Node, result: Node) -> bool:
+    """
+    :return: True when adding bias to result keeps the shape of result.
+    """
+    bias_type = Node.get_type_notation(bias)
+    result_type = Node.get_type_notation(result)
+    if not isinstance(bias_type, TensorType) or not isinstance(result_type, TensorType):
+        return False
+    try:
+        return broadcast_shape(result_type.shape, bias_type.shape) == tuple(result_type.shape)
+    except AssertionError:
+        return False
+
+
+class LinearChain:
+    """
+    MatMul -> Mul(alpha) -> Add(bias or Mul(beta, bias)) -> Relu, every step optional but the MatMul,
+    in the order DecomposePlaiAddMmPass emits them. Each intermediate result has a single use.
+    """
+
+    def __init__(self, matmul: plai_dialect.MatMul):
+        self.matmul = matmul
+        self.nodes = [matmul]
+        self.constants = []
+        self.alpha = 1
+        self.beta = 1
+        self.bias = None
+        self.relu = False
+
+        user = get_single_user(matmul)
+        alpha = match_scale(user, matmul)
+        if alpha is not None:
+            self.alpha = alpha.get_value()
+            self.constants.append(alpha)
+            self.nodes.append(user)
+            user = get_single_user(user)
+
+        if isinstance(user, plai_dialect.Add) and user.operands[0] is not user.operands[1]:
+            bias = user.operands[1] if user.operands[0] is self.nodes[-1] else user.operands[0]
+            if is_bias_of(bias, matmul):
+                self.nodes.append(user)
+                beta = None
+                if bias.has_single_use() and isinstance(bias, plai_dialect.Mul):
+                    beta = match_scale(bias, bias.operands[1]) or match_scale(bias, bias.operands[0])
+                if beta is not None:
+                    self.beta = beta.get_value()
+                    self.constants.append(beta)
+                    # the Mul of beta is erased after the Add, its only user.
+                    self.nodes.insert(0, bias)
+                    bias = bias.operands[1] if bias.operands[0] is beta else bias.operands[0]
+                self.bias = bias
+                user = get_single_user(user)
+
+        if isinstance(user, plai_dialect.Relu):
+            self.relu = True
+            self.nodes.append(user)
+
+    def get_result(self) -> Node:
+        return self.nodes[-1]
+
+
+class FuseLinearPass(pipeline.Pass):
+    """
+    Replace a MatMul and its elementwise epilogue (alpha scaling, bias, relu) with one FusedLinear node,
+    whose kernel applies the epilogue in place on the product.
+    fused_count is the number of FusedLinear nodes created by the last call.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.fused_count = 0
+
+    def __call__(self, graph: Graph) -> bool:
+        self.fused_count = 0
+        insert_point = graph.insert_point
+        for matmul in [node for node in graph if isinstance(node, plai_dialect.MatMul)]:
+            chain = LinearChain(matmul)
+            if len(chain.nodes) == 1:
+                continue
+            result = chain.get_result()
+            graph.set_insert_point_before(result)
+            fused = graph.add_node(plai_dialect.FusedLinear(
+                matmul.operands[0], matmul.operands[1], chain.bias, chain.alpha, chain.beta, chain.relu,
+                matmul.get_transpose_b(), result.loc))
+            graph.replace_all_uses_with(result, fused)
+            for node in reversed(chain.nodes):
+                graph.erase_node(node)
+            for constant in chain.constants:
+                if not constant.dead and constant.get_use_count() == 0:
+                    graph.erase_node(constant)
+            self.fused_count += 1
+        graph.restore_insert_point(insert_point)
+        return self.fused_count > 0
@@ -0,0 +1,126 @@
+import numpy
+
+from plai.core import pipeline, rewrite_pattern
+from plai.core.graph import Graph
+from plai.core.node import Node
+from plai.dialect import plai_dialect
+from plai.dialect.plai_dialect import is_last_two_dims_swap
+
+
+def get_permutation(node: plai_dialect.Transpose) -> list:
+    return list(node.attrs['permutation'])
+
+
+def erase_if_unused(graph: Graph, node: Node):
+    if not node.dead and node.get_use_count() == 0 and not node.has_side_effect():
+        graph.erase_node(node)
+
+
+def replace_node(graph: Graph, node: Node, new_node: Node):
+    graph.replace_all_uses_with(node, new_node)
+    graph.erase_node(node)
+
+
+class CancelTranspose(rewrite_pattern.TypedRewritePattern):
+    """
+    transpose(transpose(x, p1), p2) -> transpose(x, p1[p2]), or x when the composition is the identity.
+    """
+
+    def __init__(self):
+        super().__init__(plai_dialect.Transpose)
+
+    def match_and_replace(self, graph: Graph, node: Node) -> bool:
+        inner = node.operands[0]
+        if not isinstance(inner, plai_dialect.Transpose):
+            return False
+        permutation = [get_permutation(inner)[idx] for idx in get_permutation(node)]
+        if permutation == list(range(len(permutation))):
+            replace_node(graph, node, inner.operands[0])
+        else:
+            replace_node(graph, node, graph.add_node(plai_dialect.Transpose(inner.operands[0], permutation, node.loc)))
+        erase_if_unused(graph, inner)
+        return True
+
+
+class FoldConstantTranspose(rewrite_pattern.TypedRewritePattern):
+    """
+    transpose(constant) -> a row-major constant, later kernels never see the strided view.
+    """
+
+    def __init__(self):
+        super().__init__(plai_dialect.Transpose)
+
+    def match_and_replace(self, graph: Graph, node: Node) -> bool:
+        constant = node.operands[0]
+        if not isinstance(constant, plai_dialect.Constant) or not isinstance(constant.get_value(), numpy.ndarray):
+            return False
+        value = numpy.ascontiguousarray(numpy.transpose(constant.get_value(), get_permutation(node)))
+        replace_node(graph, node, graph.add_node(plai_dialect.Constant(value, node.loc)))
+        erase_if_unused(graph, constant)
+        return True
+
+
+class PushTransposeThroughScale(rewrite_pattern.TypedRewritePattern):
+    """
+    transpose(scalar * x) -> scalar * transpose(x), moving the transpose toward x,
+    where it may cancel, fold into a constant or into a MatMul.
+    Only done when the scaled value has no other user, so no work is duplicated.
+    """
+
+    def __init__(self):
+        super().__init__(plai_dialect.Transpose)
+
+    def match_and_replace(self, graph: Graph, node: Node) -> bool:
+        scaled = node.operands[0]
+        if not isinstance(scaled, (plai_dialect.Mul, plai_dialect.Add)) or not scaled.has_single_use():
+            return False
+        scalar_indices = [idx for idx, operand in enumerate(scaled.operands) if
+                          isinstance(operand, plai_dialect.Constant) and
+                          isinstance(operand.get_value(), (bool, int, float))]
+        if len(scalar_indices) != 1:
+            return False
+        scalar_idx = scalar_indices[0]
+        transposed = graph.add_node(
+            plai_dialect.Transpose(scaled.operands[1 - scalar_idx], get_permutation(node), node.loc))
+        operands = [transposed, transposed]
+        operands[scalar_idx] = scaled.operands[scalar_idx]
+        replace_node(graph, node, graph.add_node(type(scaled)(*operands, scaled.loc)))
+        erase_if_unused(graph, scaled)
+        return True
+
+
+class FoldTransposeIntoMatMul(rewrite_pattern.TypedRewritePattern):
+    """
+    matmul(a, transpose(b)) -> matmul(a, b, transpose_b) for a transpose of the last two dimensions,
+    and the other way round, so a pair of them cancels.
+    """
+
+    def __init__(self):
+        super().__init__(plai_dialect.MatMul)
+
+    def match_and_replace(self, graph: Graph, node: Node) -> bool:
+        assert isinstance(node, plai_dialect.MatMul)
+        rhs = node.operands[1]
+        if not isinstance(rhs, plai_dialect.Transpose) or not is_last_two_dims_swap(get_permutation(rhs)):
+            return False
+        new_node = plai_dialect.MatMul(node.operands[0], rhs.operands[0], node.loc,
+                                       transpose_b=not node.get_transpose_b())
+        replace_node(graph, node, graph.add_node(new_node))
+        erase_if_unused(graph, rhs)
+        return True
+
+
+class TransposeEliminationPass(pipeline.Pass):
+    """
+    Cancel pairs of transposes, move transposes through scalar scaling,
+    fold them into constants and into the transpose_b attribute of MatMul.
+    """
+
+    def __init__(self):
+        super().__init__()
+
+    def __call__(self, graph: Graph) -> bool:
+        pattern_list = rewrite_pattern.RewritePatternList([
+            CancelTranspose(), FoldConstantTranspose(), PushTransposeThroughScale(), FoldTransposeIntoMatMul(),
+        ])
+        return rewrite_pattern.rewrite_pattern_recursive(graph, pattern_list)
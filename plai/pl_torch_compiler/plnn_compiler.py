@@ -1,3 +1,6 @@
+import concurrent.futures
+import threading
+import warnings
 from typing import Tuple, Callable, List, Dict, Sequence
 
 import torch
@@ -5,22 +8,82 @@ import torch.fx as fx
 
 from plai.core import core_dialect
 from plai.core.graph import Graph
-from plai.core.location import NamedLocation
 from plai.core.node import Node
 from plai.core.pipeline import Pipeline, Pass
 from plai.core.runtime import Runtime
+from plai.core.type_notation import TypeNotation, TensorType, TupleType, ScalarType, UnknownType, DType, \
+    get_type_from_value
 from plai.dialect import aten_dialect, torch_dialect
+from plai.pipelines.constant_folding import ConstantFoldingPass, bind_constant_arguments
+from plai.pipelines.dead_code_elimination import DeadCodeEliminationPass
 from plai.pl_torch_compiler import torch_to_plai_convertion
+from plai.runtime.kernel_registry import KernelRegistry
+from plai.runtime.numpy_kernels import numpy_kernel_registry
+
+
+TORCH_DTYPE_DICT: Dict[torch.dtype, DType] = {
+    torch.bool: DType.bool,
+    torch.int8: DType.int8,
+    torch.uint8: DType.uint8,
+    torch.int16: DType.int16,
+    torch.int32: DType.int32,
+    torch.int64: DType.int64,
+    torch.float16: DType.float16,
+    torch.bfloat16: DType.bfloat16,
+    torch.float32: DType.float32,
+    torch.float64: DType.float64,
+}
+
+
+def get_type_from_torch_value(value) -> TypeNotation:
+    """
+    Type of a tensor, a fake tensor from fx meta['val'], or a nested tuple of them.
+    Symbolic dims become unknown (None) dims.
+    """
+    if isinstance(value, torch.Tensor):
+        shape = [dim if isinstance(dim, int) else None for dim in value.shape]
+        return TensorType(shape, TORCH_DTYPE_DICT.get(value.dtype, DType.unknown))
+    elif isinstance(value, (tuple, list)):
+        return TupleType([get_type_from_torch_value(v) for v in value])
+    elif isinstance(value, (bool, int, float)):
+        return get_type_from_value(value)
+    elif isinstance(value, torch.SymInt):
+        return ScalarType(DType.int64)
+    elif isinstance(value, torch.SymFloat):
+        return ScalarType(DType.float64)
+    else:
+        return UnknownType()
 
 
 class CustomCompiler:
-    def __init__(self, pipeline: Sequence[Pass] | Pass = None, runtime: Runtime = None):
+    def __init__(self, pipeline: Sequence[Pass] | Pass = None, runtime: Runtime = None, async_compile: bool = False,
+                 executor: concurrent.futures.Executor = None, freeze: bool = False):
+        """
+        :param pipeline: a sequence of passes runs as a Pipeline cleaned up by DeadCodeEliminationPass.
+        :param runtime: runs the compiled graphs, the forward of the graph module is returned when None.
+        :param async_compile: return at once a forward running the graph module eagerly,
+                              it switches to the runtime when the graph is compiled on executor.
+                              A graph failing to compile keeps running eagerly.
+        :param executor: compiles graphs in async mode, a single worker thread when None.
+        :param freeze: for inference, the nn.Parameter inputs of the first call are bound to constants
+                       and the subgraphs computed from constants only are folded, see freeze_graph.
+                       Later changes of the parameters are not seen by the compiled forward.
+        """
         if isinstance(pipeline, Sequence):
-            pipeline = Pipeline('compile_pipeline', pipeline)
+            pipeline = Pipeline('compile_pipeline', pipeline, cleanup=DeadCodeEliminationPass())
         self.pipeline = pipeline
         self.runtime = runtime
         self.graph = Graph('main_graph')
         self.node_mapping_dict: Dict[torch.fx.Node, Node] = {}
+        self.async_compile = async_compile
+        self.freeze = freeze
+        self.executor = executor
+        self.own_executor = executor is None
+        self.compile_lock = threading.Lock()
+        # graphs submitted and not compiled yet.
+        self.compile_queue_depth = 0
+        self.compile_count = 0
+        self.compile_errors: List[BaseException] = []
 
     @staticmethod
     def node_mapping(node, node_mapping_dict: Dict[torch.fx.Node, Node]):
@@ -36,7 +99,8 @@ class CustomCompiler:
             return node
 
     @staticmethod
-    def import_graph(gm: fx.GraphModule, node_mapping_dict: Dict[torch.fx.Node, Node]) -> Graph:
+    def import_graph(gm: fx.GraphModule, node_mapping_dict: Dict[torch.fx.Node, Node],
+                     example_inputs: Sequence[torch.Tensor] = None) -> Graph:
         aten_dialect.register_dialect()
         converter = torch_to_plai_convertion.Converter()
         converter.register_convertion_function_dict(torch_dialect.TorchNode.convertion_function_dict)
@@ -44,12 +108,19 @@ class CustomCompiler:
         def local_node_mapping(n):
             return CustomCompiler.node_mapping(n, node_mapping_dict)
 
+        def get_node_type(n: fx.Node):
+            if 'val' in n.meta:
+                return get_type_from_torch_value(n.meta['val'])
+            if n.op == 'placeholder' and example_inputs is not None and len(graph.arguments) < len(example_inputs):
+                return get_type_from_torch_value(example_inputs[len(graph.arguments)])
+            return UnknownType()
+
         graph = Graph('main_graph')
         # 遍历计算图中的所有节点并收集信息
         for node in gm.graph.nodes:
             assert isinstance(node, fx.Node)
             if node.op == 'placeholder':
-                new_node = core_dialect.Placeholder(NamedLocation(node.target))
+                new_node = core_dialect.Placeholder(get_node_type(node), graph.get_named_location(node.target))
                 graph.add_argument(new_node)
             elif node.op == 'output':
                 for i in node.args[0]:
@@ -59,8 +130,11 @@ class CustomCompiler:
             elif node.op == 'get_attr':
                 raise NotImplementedError("get_attr is not supported")
             elif node.op in ('call_method', 'call_module', 'call_function'):
-                new_node = converter.convert_node(node, local_node_mapping)
+                new_node = converter.convert_node(node, local_node_mapping, graph.get_named_location)
                 graph.add_node(new_node)
+                node_type = get_node_type(node)
+                if not isinstance(node_type, UnknownType):
+                    new_node.set_type_notation(node_type)
             else:
                 raise ValueError(f"Unsupported op: {node.op}")
 
@@ -69,18 +143,125 @@ class CustomCompiler:
         return graph
 
     def __call__(self, gm: fx.GraphModule, example_inputs: Tuple[torch.Tensor, ...]) -> Callable:
-        self.graph = self.import_graph(gm, self.node_mapping_dict)
+        if not self.async_compile:
+            return self.compile(gm, example_inputs)
+        return self.compile_async(gm, example_inputs)
+
+    def get_compile_queue_depth(self) -> int:
+        return self.compile_queue_depth
+
+    def compile_async(self, gm: fx.GraphModule, example_inputs: Tuple[torch.Tensor, ...]) -> Callable:
+        """
+        :return: a forward calling gm.forward until the compiled forward is ready.
+        """
+        compiled_forward = None
+        # detach the inputs, compilation must not keep the autograd graph of the first call.
+        example_inputs = tuple(v.detach() if isinstance(v, torch.Tensor) else v for v in example_inputs)
+
+        def compile_job():
+            nonlocal compiled_forward
+            try:
+                compiled_forward = self.compile(gm, example_inputs)
+                with self.compile_lock:
+                    self.compile_count += 1
+            except Exception as e:
+                warnings.warn(f'Failed to compile graph, keep running it eagerly: {e!r}')
+                with self.compile_lock:
+                    self.compile_errors.append(e)
+            finally:
+                with self.compile_lock:
+                    self.compile_queue_depth -= 1
+
+        with self.compile_lock:
+            if self.executor is None:
+                self.executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='plai_compile')
+            self.compile_queue_depth += 1
+        try:
+            compile_future = self.executor.submit(compile_job)
+        except BaseException:
+            with self.compile_lock:
+                self.compile_queue_depth -= 1
+            raise
+
+        def forward(*input_tensors):
+            # the assignment of compiled_forward is atomic, a call sees None or the whole compiled forward.
+            current_forward = compiled_forward
+            if current_forward is not None:
+                return current_forward(*input_tensors)
+            return gm.forward(*input_tensors)
+
+        forward.compile_future = compile_future
+        return forward
+
+    def shutdown(self):
+        if self.own_executor and self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def compile(self, gm: fx.GraphModule, example_inputs: Tuple[torch.Tensor, ...]) -> Callable:
+        """
+        :return: a forward closing over its own graph, self.graph only keeps the last compiled graph for inspection.
+        The graph is not modified after compilation, so the forward may be called by several threads at once
+        as long as the runtime keeps per call state out of shared objects.
+        """
+        node_mapping_dict: Dict[torch.fx.Node, Node] = {}
+        graph = self.import_graph(gm, node_mapping_dict, example_inputs)
+        self.graph = graph
+        self.node_mapping_dict = node_mapping_dict
 
         if self.pipeline is not None:
-            changed = self.pipeline(self.graph)
+            changed = self.pipeline(graph)
             _ = changed
 
         if self.runtime is None:
             # 返回未修改的前向传播函数
             return gm.forward
 
+        runtime = self.runtime
+        argument_count = len(example_inputs)
+        if self.freeze:
+            return self.create_freezing_forward(graph, runtime, argument_count)
+        runtime.prepare(graph)
+
+        def forward(*input_tensors):
+            assert len(input_tensors) == argument_count
+            return runtime(graph, input_tensors)
+
+        return forward
+
+    @staticmethod
+    def freeze_graph(graph: Graph, input_tensors: Sequence[torch.Tensor],
+                     kernel_registry: KernelRegistry = numpy_kernel_registry) -> int:
+        """
+        Bind the nn.Parameter inputs to constants, fold the nodes computed from constants only and erase dead nodes.
+
+        :return: count of folded nodes.
+        """
+        value_dict = {idx: tensor.detach().cpu().numpy().copy() for idx, tensor in enumerate(input_tensors)
+                      if isinstance(tensor, torch.nn.Parameter)}
+        bind_constant_arguments(graph, value_dict)
+        folding_pass = ConstantFoldingPass(kernel_registry)
+        folding_pass(graph)
+        DeadCodeEliminationPass()(graph)
+        return folding_pass.folded_count
+
+    def create_freezing_forward(self, graph: Graph, runtime: Runtime, argument_count: int) -> Callable:
+        """
+        :return: a forward freezing graph on its first call, then running it in runtime.
+        """
+        frozen = False
+        freeze_lock = threading.Lock()
+        kernel_registry = getattr(runtime, 'kernel_registry', numpy_kernel_registry)
+
         def forward(*input_tensors):
-            assert len(input_tensors) == len(example_inputs)
-            return self.runtime(self.graph, input_tensors)
+            nonlocal frozen
+            assert len(input_tensors) == argument_count
+            if not frozen:
+                with freeze_lock:
+                    if not frozen:
+                        self.freeze_graph(graph, input_tensors, kernel_registry)
+                        runtime.prepare(graph)
+                        frozen = True
+            return runtime(graph, input_tensors)
 
         return forward
@@ -36,7 +36,8 @@ class Converter:
         assert func_name in self.node_converter_dict, f"Unregistered function: {func_name}"
         return self.node_converter_dict.get(func_name)
 
-    def convert_node(self, node: fx.Node, node_mapping: Callable[[fx.Node], Any]) -> Node:
+    def convert_node(self, node: fx.Node, node_mapping: Callable[[fx.Node], Any],
+                     location_fn: Callable[[str], Location] = NamedLocation) -> Node:
         if node.op == 'call_method':
             raise NotImplementedError("call_method is not supported yet.")
         elif node.op == 'call_module':
@@ -45,6 +46,6 @@ class Converter:
             args = [node_mapping(arg) for arg in node.args]
             attrs = {k: node_mapping(v) for k, v in node.kwargs.items()}
             converter = self.get_converter(node.target)
-            return converter(args, attrs, NamedLocation(node.name))
+            return converter(args, attrs, location_fn(node.name))
         else:
             raise ValueError(f"Unsupported op: {node.op}")
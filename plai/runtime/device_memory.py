@@ -0,0 +1,169 @@
+import threading
+import typing
+
+import numpy
+
+from plai.runtime.execution_plan import MemoryStatistics
+
+
+class ValueOnDevice:
+    """
+    A reference counted value in device memory.
+    A value owns a pooled block, owns a buffer allocated by a kernel, or is a view of base values.
+    """
+
+    def __init__(self, np_array, block: numpy.ndarray = None, owned: bool = False,
+                 bases: typing.Tuple['ValueOnDevice', ...] = ()):
+        """
+        :param np_array:
+        :param block: the pooled block holding np_array.
+        :param owned: np_array is a buffer allocated by a kernel, not pooled.
+        :param bases: values np_array may be a view of, kept alive while this value lives.
+        """
+        self.value = np_array
+        self.block = block
+        self.owned = owned
+        self.bases = bases
+        self.ref_count = 1
+        self.pinned = False
+        self.is_result = False
+
+    def get_value(self):
+        return self.value
+
+    def get_nbytes(self) -> int:
+        """
+        :return: bytes of device memory owned by this value.
+        """
+        if self.block is not None:
+            return self.block.nbytes
+        return self.value.nbytes if self.owned else 0
+
+
+def get_size_class(nbytes: int) -> int:
+    """
+    :return: the smallest power of two not less than nbytes.
+    """
+    return 1 << max(nbytes - 1, 0).bit_length()
+
+
+class DeviceMemoryManager:
+    """
+    Power of two size class pools of device blocks.
+    Blocks return to their pool when the reference count of their value drops to zero,
+    pinned values hold one reference until they are unpinned.
+    All methods are thread safe, so concurrent calls can share one manager.
+    """
+
+    def __init__(self):
+        self.free_block_dict: typing.Dict[int, typing.List[numpy.ndarray]] = {}
+        self.statistics = MemoryStatistics()  # bytes of blocks and kernel buffers in use
+        self.result_statistics = MemoryStatistics()  # bytes of op results alive
+        self.pooled_bytes = 0
+        self.pinned_bytes = 0
+        self.allocation_count = 0
+        self.hit_count = 0
+        self.lock = threading.RLock()
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hit_count / self.allocation_count if self.allocation_count else 0.0
+
+    def allocate_block(self, nbytes: int) -> numpy.ndarray:
+        size_class = get_size_class(nbytes)
+        with self.lock:
+            self.allocation_count += 1
+            self.statistics.add(size_class)
+            free_blocks = self.free_block_dict.get(size_class)
+            if free_blocks:
+                self.hit_count += 1
+                self.pooled_bytes -= size_class
+                return free_blocks.pop()
+        return numpy.empty(size_class, dtype=numpy.uint8)
+
+    def release_block(self, block: numpy.ndarray):
+        with self.lock:
+            self.statistics.sub(block.nbytes)
+            self.pooled_bytes += block.nbytes
+            self.free_block_dict.setdefault(block.nbytes, []).append(block)
+
+    def allocate(self, shape: typing.Tuple[int, ...], dtype) -> ValueOnDevice:
+        dtype = numpy.dtype(dtype)
+        nbytes = int(numpy.prod(shape, dtype=numpy.int64)) * dtype.itemsize
+        block = self.allocate_block(nbytes)
+        return ValueOnDevice(block[:nbytes].view(dtype).reshape(shape), block=block)
+
+    def adopt(self, np_array, bases: typing.Tuple[ValueOnDevice, ...] = ()) -> ValueOnDevice:
+        """
+        Wrap a value computed outside of the pools.
+
+        :param np_array:
+        :param bases: values np_array may be a view of, empty when np_array owns its buffer.
+        """
+        owned = not bases and getattr(np_array, 'base', 0) is None
+        with self.lock:
+            for base in bases:
+                self.retain(base)
+            if owned:
+                self.statistics.add(np_array.nbytes)
+        return ValueOnDevice(np_array, owned=owned, bases=bases)
+
+    def mark_result(self, value: ValueOnDevice):
+        """
+        Count value in result_statistics until it is released.
+        """
+        with self.lock:
+            if not value.is_result and value.get_nbytes():
+                value.is_result = True
+                self.result_statistics.add(value.get_nbytes())
+
+    def retain(self, value: ValueOnDevice):
+        with self.lock:
+            assert value.ref_count > 0, "Value is already released"
+            value.ref_count += 1
+
+    def release(self, value: ValueOnDevice):
+        with self.lock:
+            assert value.ref_count > 0, "Value is already released"
+            value.ref_count -= 1
+            if value.ref_count > 0:
+                return
+            if value.is_result:
+                self.result_statistics.sub(value.get_nbytes())
+            if value.block is not None:
+                self.release_block(value.block)
+            elif value.owned:
+                self.statistics.sub(value.value.nbytes)
+            for base in value.bases:
+                self.release(base)
+            value.value = value.block = None
+            value.bases = ()
+
+    def pin(self, value: ValueOnDevice):
+        with self.lock:
+            assert not value.pinned, "Value is already pinned"
+            self.retain(value)
+            value.pinned = True
+            if value.block is not None:
+                self.pinned_bytes += value.block.nbytes
+
+    def unpin(self, value: ValueOnDevice):
+        with self.lock:
+            assert value.pinned, "Value is not pinned"
+            value.pinned = False
+            if value.block is not None:
+                self.pinned_bytes -= value.block.nbytes
+            self.release(value)
+
+    def trim(self):
+        """
+        Drop all free blocks.
+        """
+        with self.lock:
+            self.free_block_dict.clear()
+            self.pooled_bytes = 0
+
+    def __repr__(self):
+        return (f'DeviceMemoryManager(bytes_in_use={self.statistics.current_bytes}, '
+                f'peak_bytes={self.statistics.peak_bytes}, pooled_bytes={self.pooled_bytes}, '
+                f'pinned_bytes={self.pinned_bytes}, hit_rate={self.hit_rate:.2f})')
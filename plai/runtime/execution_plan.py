@@ -0,0 +1,292 @@
+import functools
+import threading
+import typing
+
+import numpy
+
+from plai.core.core_dialect import Output
+from plai.core.graph import Graph
+from plai.core.node import Node
+from plai.core.type_notation import TypeNotation, TensorType
+
+if typing.TYPE_CHECKING:
+    from plai.runtime.memory_planner import MemoryPlan
+
+Kernel = typing.Callable[..., typing.Any]
+
+
+class KernelProvider:
+    def create_kernel(self, node: Node, inplace_operand_index: int | None = None) -> Kernel:
+        """
+        :param node:
+        :param inplace_operand_index: when set, the kernel should write its result into this operand.
+        :return: a callable taking operand values and returning the result.
+        """
+        raise NotImplementedError()
+
+    def create_out_kernel(self, node: Node) -> Kernel | None:
+        """
+        :return: a callable taking operand values and an `out` keyword argument to write the result into,
+                 None when node cannot write into a given buffer.
+        """
+        return None
+
+    def supports_inplace(self, node: Node) -> bool:
+        return False
+
+    def returns_new_buffer(self, node: Node) -> bool:
+        """
+        True when the result never aliases an operand, so it is safe to overwrite once it dies.
+        """
+        return False
+
+
+class MemoryStatistics:
+    def __init__(self):
+        self.current_bytes = 0
+        self.peak_bytes = 0
+
+    def add(self, nbytes: int):
+        self.current_bytes += nbytes
+        self.peak_bytes = max(self.peak_bytes, self.current_bytes)
+
+    def sub(self, nbytes: int):
+        self.current_bytes -= nbytes
+
+    def __repr__(self):
+        return f'MemoryStatistics(current_bytes={self.current_bytes}, peak_bytes={self.peak_bytes})'
+
+
+def get_static_type_notation(node: Node) -> TypeNotation | None:
+    """
+    The type of node when it is fully known at plan time, None otherwise.
+    """
+    try:
+        type_notation = Node.get_type_notation(node)
+    except AssertionError:
+        return None
+    if isinstance(type_notation, TensorType) and None not in type_notation.shape:
+        return type_notation
+    return None
+
+
+def compute_last_use_dict(graph: Graph) -> typing.Dict[Node, Node]:
+    """
+    :return: value -> the last node in graph order using it.
+    """
+    last_use_dict: typing.Dict[Node, Node] = {}
+    for node in graph:
+        for operand in node.operands:
+            if operand is not None:
+                last_use_dict[operand] = node
+    return last_use_dict
+
+
+def compute_buffer_last_use_dict(graph: Graph, owns_buffer: typing.Callable[[Node], bool]) -> typing.Dict[Node, Node]:
+    """
+    :param owns_buffer: True when the result of node is a buffer of its own,
+                        other nodes are treated as views of their operands, like a Transpose.
+    :return: node owning a buffer -> the last node in graph order using the buffer, directly or through a view.
+    """
+    alias_root_dict: typing.Dict[Node, typing.Tuple[Node, ...]] = {}
+    last_use_dict: typing.Dict[Node, Node] = {}
+    for node in graph:
+        for operand in node.operands:
+            for root in alias_root_dict.get(operand, ()):
+                last_use_dict[root] = node
+        if owns_buffer(node):
+            alias_root_dict[node] = (node,)
+        else:
+            roots = [root for operand in node.operands for root in alias_root_dict.get(operand, ())]
+            alias_root_dict[node] = tuple(dict.fromkeys(roots))
+    return last_use_dict
+
+
+def find_inplace_operand_index(node: Node, buffer_last_use_dict: typing.Dict[Node, Node],
+                               new_buffer_nodes: typing.Collection[Node]) -> int | None:
+    """
+    :param buffer_last_use_dict: from compute_buffer_last_use_dict.
+    :return: index of an operand the result of node can be written into, None when there is none.
+    The operand must own its buffer, the buffer and all its views must die at node,
+    and the operand must have exactly the type of the result.
+    """
+    node_type = get_static_type_notation(node)
+    if node_type is None:
+        return None
+    for idx, operand in enumerate(node.operands):
+        if operand in new_buffer_nodes and buffer_last_use_dict.get(operand) is node and \
+                get_static_type_notation(operand) == node_type:
+            return idx
+    return None
+
+
+class ExecutionPlan:
+    """
+    A graph lowered to a flat instruction list over value slots.
+    Slots [0, len(arguments)) hold the graph arguments, then one slot per node.
+    Each instruction is (kernel, operand slots, output slot, slots to release after it).
+    Values are released right after their last use, and elementwise kernels
+    write into an operand which dies at them when the types prove it is safe.
+    With a memory plan, planned nodes write into views of an arena owned by an ExecutionContext,
+    contexts are pooled so that concurrent calls never share an arena and serial calls reuse one.
+    Both rely on the static types, calls with other argument shapes use a dynamic plan without them.
+    The plan itself is immutable after construction and may be run by several threads at once.
+    """
+
+    def __init__(self, graph: Graph, kernel_provider: KernelProvider, memory_plan: 'MemoryPlan' = None,
+                 use_static_types: bool = True):
+        self.slot_dict: typing.Dict[Node, int] = {}
+        for arg in graph.arguments:
+            self.slot_dict[arg] = len(self.slot_dict)
+        self.argument_count = len(graph.arguments)
+
+        self.memory_plan = memory_plan
+        self.argument_shapes: typing.List[typing.Tuple[typing.Tuple[int, ...], numpy.dtype]] = []
+        self.dynamic_plan: ExecutionPlan | None = None
+        argument_types = [get_static_type_notation(arg) for arg in graph.arguments]
+        if use_static_types and all(arg_type is not None for arg_type in argument_types):
+            self.argument_shapes = [(arg_type.shape, numpy.dtype(arg_type.element_type.value))
+                                    for arg_type in argument_types]
+            self.dynamic_plan = ExecutionPlan(graph, kernel_provider, use_static_types=False)
+        else:
+            use_static_types = False
+        if memory_plan is not None:
+            assert use_static_types, 'Memory plan requires static argument types'
+        # instruction index -> node writing into its arena view, bound by every ExecutionContext.
+        self.arena_instruction_dict: typing.Dict[int, Node] = {}
+
+        last_use_dict = compute_last_use_dict(graph)
+        buffer_last_use_dict = compute_buffer_last_use_dict(graph, kernel_provider.returns_new_buffer)
+        new_buffer_nodes: typing.Set[Node] = set()
+
+        self.instructions: typing.List[typing.Tuple[Kernel, typing.Tuple[int, ...], int, typing.Tuple[int, ...]]] = []
+        for node in graph:
+            if isinstance(node, Output):
+                continue
+            self.slot_dict[node] = len(self.slot_dict)
+            operand_slots = tuple(self.slot_dict[operand] for operand in node.operands)
+            dying_operands = [operand for operand in dict.fromkeys(node.operands)
+                              if operand is not None and last_use_dict.get(operand) is node]
+            free_slots = [self.slot_dict[operand] for operand in dying_operands]
+            if node not in last_use_dict:
+                free_slots.append(self.slot_dict[node])
+
+            if memory_plan is not None and node in memory_plan.offset_dict:
+                # arena buffers are not reused in place, the result may outlive the arena buffer.
+                kernel = kernel_provider.create_out_kernel(node)
+                self.arena_instruction_dict[len(self.instructions)] = node
+            else:
+                inplace_operand_index = None
+                if use_static_types and kernel_provider.supports_inplace(node):
+                    inplace_operand_index = find_inplace_operand_index(node, buffer_last_use_dict, new_buffer_nodes)
+                if kernel_provider.returns_new_buffer(node):
+                    new_buffer_nodes.add(node)
+                kernel = kernel_provider.create_kernel(node, inplace_operand_index)
+            self.instructions.append((kernel, operand_slots, self.slot_dict[node], tuple(free_slots)))
+
+        self.slot_count = len(self.slot_dict)
+        self.output_slots = [self.slot_dict[output] for output in graph.outputs.operands]
+
+        self.context_pool: typing.List[ExecutionContext] = []
+        self.context_lock = threading.Lock()
+        self.context_count = 0
+        if memory_plan is not None:
+            self.release_context(self.acquire_context())
+
+    def acquire_context(self) -> 'ExecutionContext':
+        with self.context_lock:
+            if self.context_pool:
+                return self.context_pool.pop()
+            self.context_count += 1
+        return ExecutionContext(self)
+
+    def release_context(self, context: 'ExecutionContext'):
+        with self.context_lock:
+            self.context_pool.append(context)
+
+    def match_arguments(self, input_values: typing.Sequence) -> bool:
+        return all(value.shape == shape and value.dtype == dtype
+                   for value, (shape, dtype) in zip(input_values, self.argument_shapes))
+
+    def run(self, input_values: typing.Sequence) -> list:
+        assert len(input_values) == self.argument_count
+        if self.dynamic_plan is not None and not self.match_arguments(input_values):
+            return self.dynamic_plan.run(input_values)
+        if self.memory_plan is None:
+            return self.run_instructions(self.instructions, input_values)
+        context = self.acquire_context()
+        try:
+            return self.run_instructions(context.instructions, input_values)
+        finally:
+            self.release_context(context)
+
+    def run_instructions(self, instructions: list, input_values: typing.Sequence) -> list:
+        slots = [None] * self.slot_count
+        slots[:self.argument_count] = input_values
+        for kernel, operand_slots, output_slot, free_slots in instructions:
+            slots[output_slot] = kernel(*[slots[idx] for idx in operand_slots])
+            for idx in free_slots:
+                slots[idx] = None
+        return [slots[idx] for idx in self.output_slots]
+
+    def run_with_memory_statistics(self, input_values: typing.Sequence, statistics: MemoryStatistics) -> list:
+        """
+        Same as run, also counts the bytes of intermediate buffers alive in slots.
+        Views and input buffers are not counted, see memory_plan for the arena size.
+        """
+        assert len(input_values) == self.argument_count
+        if self.dynamic_plan is not None and not self.match_arguments(input_values):
+            return self.dynamic_plan.run_with_memory_statistics(input_values, statistics)
+        context = self.acquire_context() if self.memory_plan is not None else None
+        try:
+            return self.run_instructions_with_memory_statistics(
+                context.instructions if context is not None else self.instructions, input_values, statistics)
+        finally:
+            if context is not None:
+                self.release_context(context)
+
+    def run_instructions_with_memory_statistics(self, instructions: list, input_values: typing.Sequence,
+                                                statistics: MemoryStatistics) -> list:
+        slots = [None] * self.slot_count
+        slots[:self.argument_count] = input_values
+        slot_count_dict: typing.Dict[int, int] = {}  # id(buffer) -> number of slots holding it
+
+        for kernel, operand_slots, output_slot, free_slots in instructions:
+            result = kernel(*[slots[idx] for idx in operand_slots])
+            slots[output_slot] = result
+            if getattr(result, 'base', 0) is None:
+                if id(result) not in slot_count_dict:
+                    slot_count_dict[id(result)] = 0
+                    statistics.add(result.nbytes)
+                slot_count_dict[id(result)] += 1
+            for idx in free_slots:
+                value = slots[idx]
+                slots[idx] = None
+                if id(value) in slot_count_dict:
+                    slot_count_dict[id(value)] -= 1
+                    if slot_count_dict[id(value)] == 0:
+                        del slot_count_dict[id(value)]
+                        statistics.sub(value.nbytes)
+
+        results = [slots[idx] for idx in self.output_slots]
+        for idx in self.output_slots:
+            value = slots[idx]
+            if slot_count_dict.pop(id(value), None) is not None:
+                statistics.sub(value.nbytes)  # handed over to the caller
+        return results
+
+
+class ExecutionContext:
+    """
+    Mutable state of one call of an ExecutionPlan with a memory plan:
+    an arena and the instructions writing into its views.
+    """
+
+    def __init__(self, plan: ExecutionPlan):
+        self.arena = plan.memory_plan.create_arena()
+        views = plan.memory_plan.create_views(self.arena)
+        self.instructions = list(plan.instructions)
+        for idx, node in plan.arena_instruction_dict.items():
+            kernel, operand_slots, output_slot, free_slots = self.instructions[idx]
+            self.instructions[idx] = (functools.partial(kernel, out=views[node]), operand_slots, output_slot,
+                                      free_slots)
@@ -0,0 +1,96 @@
+import typing
+
+from plai.core.node import Node
+from plai.core.type_notation import DType, TensorType, ScalarType
+from plai.runtime.execution_plan import Kernel, KernelProvider
+
+REFERENCE = 'reference'  # factory(node) -> kernel(*operands)
+INPLACE = 'inplace'  # factory(node, inplace_operand_index) -> kernel(*operands) writing into that operand
+OUT = 'out'  # factory(node) -> kernel(*operands, out=buffer)
+FUSED = 'fused'  # factory(node) -> kernel(*operands) of a node standing for several ops
+
+KernelFactory = typing.Callable[..., Kernel]
+
+
+def get_element_type(node: Node) -> DType | None:
+    """
+    :return: element type of the result of node when it is known at plan time, None otherwise.
+    """
+    try:
+        type_notation = Node.get_type_notation(node)
+    except AssertionError:
+        return None
+    if isinstance(type_notation, TensorType):
+        return type_notation.element_type
+    if isinstance(type_notation, ScalarType):
+        return type_notation.dtype
+    return None
+
+
+class KernelRegistry(KernelProvider):
+    """
+    Kernel factories keyed by (node class, element type, variant).
+    Lookups fall back along the mro of the node class, and from the element type to None,
+    so a kernel registered for a class without dtype serves all its subclasses and dtypes.
+    Kernels are resolved once at plan time, runtimes keep the resolved callables.
+    Variants missing in a registry are looked up in its parent.
+    """
+
+    def __init__(self, parent: 'KernelRegistry' = None):
+        self.parent = parent
+        self.factory_dict: typing.Dict[typing.Tuple[type, DType | None, str], KernelFactory] = {}
+        self.new_buffer_classes: typing.Set[type] = set()
+
+    def register(self, node_cls: type, variant: str = REFERENCE, dtype: DType = None, new_buffer: bool = False):
+        """
+        Decorator registering a kernel factory.
+
+        :param node_cls:
+        :param variant: one of REFERENCE, INPLACE, OUT, FUSED.
+        :param dtype: element type of the result, None for any.
+        :param new_buffer: the reference kernel never returns a view of an operand.
+        """
+
+        def decorator(factory: KernelFactory) -> KernelFactory:
+            key = (node_cls, dtype, variant)
+            assert key not in self.factory_dict, f'Kernel {key} is already registered'
+            self.factory_dict[key] = factory
+            if new_buffer:
+                self.new_buffer_classes.add(node_cls)
+            return factory
+
+        return decorator
+
+    def lookup(self, node: Node, variant: str = REFERENCE) -> KernelFactory | None:
+        dtype = get_element_type(node)
+        for cls in type(node).__mro__:
+            factory = self.factory_dict.get((cls, dtype, variant))
+            if factory is None and dtype is not None:
+                factory = self.factory_dict.get((cls, None, variant))
+            if factory is not None:
+                return factory
+        if self.parent is not None:
+            return self.parent.lookup(node, variant)
+        return None
+
+    def create_kernel(self, node: Node, inplace_operand_index: int | None = None) -> Kernel:
+        if inplace_operand_index is not None:
+            factory = self.lookup(node, INPLACE)
+            assert factory is not None, f'No in-place kernel for {node.get_op_name()}'
+            return factory(node, inplace_operand_index)
+        factory = self.lookup(node, REFERENCE) or self.lookup(node, FUSED)
+        if factory is None:
+            raise NotImplementedError(f"Node {node.get_op_name()} has no registered kernel")
+        return factory(node)
+
+    def create_out_kernel(self, node: Node) -> Kernel | None:
+        factory = self.lookup(node, OUT)
+        return factory(node) if factory is not None else None
+
+    def supports_inplace(self, node: Node) -> bool:
+        return self.lookup(node, INPLACE) is not None
+
+    def returns_new_buffer(self, node: Node) -> bool:
+        if any(cls in self.new_buffer_classes for cls in type(node).__mro__):
+            return True
+        return self.parent is not None and self.parent.returns_new_buffer(node)
@@ -0,0 +1,107 @@
+import typing
+
+import numpy
+
+from plai.core.core_dialect import Output
+from plai.core.graph import Graph
+from plai.core.node import Node
+from plai.core.type_notation import DType
+from plai.runtime.execution_plan import get_static_type_notation
+
+
+class MemoryPlan:
+    """
+    Offsets of intermediate buffers in one preallocated byte arena.
+    Buffers whose lifetimes do not overlap may share bytes.
+    """
+
+    def __init__(self, arena_size: int, offset_dict: typing.Dict[Node, int]):
+        self.arena_size = arena_size
+        self.offset_dict = offset_dict
+
+    def create_arena(self) -> numpy.ndarray:
+        return numpy.empty(self.arena_size, dtype=numpy.uint8)
+
+    def create_views(self, arena: numpy.ndarray) -> typing.Dict[Node, numpy.ndarray]:
+        """
+        :return: node -> the view of its buffer in arena.
+        """
+        views = {}
+        for node, offset in self.offset_dict.items():
+            node_type = get_static_type_notation(node)
+            dtype = numpy.dtype(node_type.element_type.value)
+            nbytes = int(numpy.prod(node_type.shape, dtype=numpy.int64)) * dtype.itemsize
+            views[node] = arena[offset:offset + nbytes].view(dtype).reshape(node_type.shape)
+        return views
+
+    def __str__(self):
+        return f'arena {self.arena_size} bytes, {len(self.offset_dict)} buffers'
+
+
+def get_buffer_size(node: Node) -> int | None:
+    """
+    :return: bytes of the result of node, None when it is not static or not a numpy dtype.
+    """
+    node_type = get_static_type_notation(node)
+    if node_type is None or node_type.element_type in (DType.unknown, DType.bfloat16, DType.str):
+        return None
+    return int(numpy.prod(node_type.shape, dtype=numpy.int64)) * numpy.dtype(node_type.element_type.value).itemsize
+
+
+def align(value: int, alignment: int) -> int:
+    return (value + alignment - 1) // alignment * alignment
+
+
+def plan_memory(graph: Graph, can_write_into: typing.Callable[[Node], bool], alignment: int = 64) -> MemoryPlan:
+    """
+    Assign arena offsets with greedy interval colouring: buffers are placed largest first,
+    each at the lowest offset not used by a placed buffer with an overlapping lifetime.
+
+    :param graph:
+    :param can_write_into: True when the kernel of node can write its result into a given buffer.
+                           Other nodes are treated as views of their operands.
+    :param alignment: alignment of every offset in bytes.
+    :return:
+    """
+    index_dict: typing.Dict[Node, int] = {}
+    alias_root_dict: typing.Dict[Node, typing.Tuple[Node, ...]] = {}
+    lifetime_dict: typing.Dict[Node, typing.List[int]] = {}  # buffer root -> [first index, last index]
+    escaping_roots: typing.Set[Node] = set()
+
+    for index, node in enumerate(graph):
+        index_dict[node] = index
+        for operand in node.operands:
+            for root in alias_root_dict.get(operand, ()):
+                lifetime_dict[root][1] = index
+                if isinstance(node, Output):
+                    escaping_roots.add(root)
+
+        if isinstance(node, Output):
+            continue
+        if can_write_into(node) and get_buffer_size(node):
+            alias_root_dict[node] = (node,)
+            lifetime_dict[node] = [index, index]
+        else:
+            roots = [root for operand in node.operands for root in alias_root_dict.get(operand, ())]
+            alias_root_dict[node] = tuple(dict.fromkeys(roots))
+
+    buffers = [(get_buffer_size(root), lifetime, root) for root, lifetime in lifetime_dict.items()
+               if root not in escaping_roots]
+    buffers.sort(key=lambda item: (-item[0], index_dict[item[2]]))
+
+    placed: typing.List[typing.Tuple[int, int, typing.List[int]]] = []  # (offset, size, lifetime)
+    offset_dict: typing.Dict[Node, int] = {}
+    arena_size = 0
+    for size, lifetime, root in buffers:
+        conflicts = sorted((offset, placed_size) for offset, placed_size, placed_lifetime in placed
+                           if placed_lifetime[0] <= lifetime[1] and lifetime[0] <= placed_lifetime[1])
+        offset = 0
+        for conflict_offset, conflict_size in conflicts:
+            if offset + size <= conflict_offset:
+                break
+            offset = max(offset, align(conflict_offset + conflict_size, alignment))
+        placed.append((offset, size, lifetime))
+        offset_dict[root] = offset
+        arena_size = max(arena_size, offset + size)
+
+    return MemoryPlan(align(arena_size, alignment), offset_dict)
@@ -0,0 +1,282 @@
+import ctypes
+import functools
+import hashlib
+import math
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import threading
+import typing
+import warnings
+
+import numpy
+
+from plai.core.type_notation import DType, TensorType
+from plai.dialect.plai_dialect import FusedElementwise
+from plai.runtime.execution_plan import Kernel, get_static_type_notation
+from plai.runtime.kernel_registry import KernelRegistry, REFERENCE, INPLACE, OUT
+from plai.runtime.numpy_kernels import numpy_kernel_registry
+from plai.runtime.plai_numpy_runtime import PlaiNumpyRuntime
+
+C_TYPE_DICT = {
+    DType.float32: 'float',
+    DType.float64: 'double',
+}
+
+C_ELEMENTWISE_OP_DICT = {
+    'add': lambda lhs, rhs: f'({lhs} + {rhs})',
+    'mul': lambda lhs, rhs: f'({lhs} * {rhs})',
+    # NaN is kept like numpy.maximum does.
+    'relu': lambda value: f'(({value} > 0 || {value} != {value}) ? {value} : 0)',
+}
+
+
+def get_c_literal(value, c_type: str) -> str:
+    value = float(value)
+    if math.isnan(value):
+        return f'(({c_type})NAN)'
+    if math.isinf(value):
+        return f'(({c_type})({"-" if value < 0 else ""}INFINITY))'
+    return f'(({c_type}){value!r})'
+
+
+@functools.cache
+def get_host_cpu_id() -> str:
+    """
+    :return: the machine, cpu model and cpu features, code built with -march=native only runs on a matching host.
+    """
+    lines = [platform.machine(), platform.processor()]
+    keys = set()
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                key = line.split(':', 1)[0].strip()
+                if key in ('model name', 'flags', 'Features', 'CPU implementer', 'CPU part') and key not in keys:
+                    keys.add(key)
+                    lines.append(line.strip())
+    except OSError:
+        pass
+    return '\n'.join(lines)
+
+
+def find_c_compiler(compiler: str = None) -> str | None:
+    """
+    :param compiler: a compiler name or path, $CC or cc when None.
+    :return: the path of the compiler, None when it is not installed.
+    """
+    return shutil.which(compiler or os.environ.get('CC', 'cc'))
+
+
+class NativeLibraryCache:
+    """
+    Shared objects built from C sources, cached on disk by the hash of source, compiler, flags and host cpu,
+    so processes share builds and a graph with the same structure is never built twice.
+    """
+
+    def __init__(self, compiler: str, cache_dir: str = None, flags: typing.Sequence[str] = ('-O3', '-march=native')):
+        self.compiler = compiler
+        self.flags = list(flags)
+        self.host_cpu_id = get_host_cpu_id()
+        self.cache_dir = cache_dir or os.environ.get(
+            'PLAI_NATIVE_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'plai', 'native'))
+        self.library_dict: typing.Dict[str, ctypes.CDLL] = {}
+        self.lock = threading.Lock()
+        self.build_count = 0
+
+    def get_key(self, source: str) -> str:
+        key_source = '\0'.join([self.compiler, *self.flags, self.host_cpu_id, source])
+        return hashlib.sha256(key_source.encode()).hexdigest()[:24]
+
+    def get_library(self, source: str) -> ctypes.CDLL:
+        key = self.get_key(source)
+        with self.lock:
+            library = self.library_dict.get(key)
+            if library is None:
+                path = os.path.join(self.cache_dir, f'plai_{key}.so')
+                if not os.path.exists(path):
+                    self.build(source, path)
+                library = ctypes.CDLL(path)
+                self.library_dict[key] = library
+        return library
+
+    def build(self, source: str, path: str):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self.cache_dir) as build_dir:
+            source_path = os.path.join(build_dir, 'kernel.c')
+            with open(source_path, 'w') as f:
+                f.write(source)
+            library_path = os.path.join(build_dir, 'kernel.so')
+            subprocess.run([self.compiler, *self.flags, '-shared', '-fPIC', '-o', library_path, source_path],
+                           check=True, capture_output=True)
+            # another process may build the same key at the same time, the rename is atomic.
+            os.replace(library_path, path)
+        self.build_count += 1
+
+
+class NativeFusedKernel:
+    """
+    A FusedElementwise node lowered to one C loop over the result.
+    Every operand either has the shape of the result,
+    or the shape of its trailing dimensions and is repeated along the leading ones, like a bias.
+    Operands are passed as pointers to their numpy buffers without copy, out may be one of them.
+    Calls with other shapes, dtypes or non contiguous operands use the reference kernel.
+    """
+
+    def __init__(self, node: FusedElementwise, library_cache: NativeLibraryCache, fallback: Kernel):
+        self.fallback = fallback
+        node_type = get_static_type_notation(node)
+        assert node_type is not None, 'FusedElementwise result should have a static type'
+        c_type = C_TYPE_DICT.get(node_type.element_type)
+        assert c_type is not None, f'Unsupported element type {node_type.element_type}'
+        self.dtype = numpy.dtype(node_type.element_type.value)
+        self.ndim = len(node_type.shape)
+
+        # trailing dimension count of each operand, ndim for operands with the shape of the result.
+        self.operand_ndims: typing.List[int] = []
+        operand_exprs = []
+        offset_lines = []
+        for idx, operand in enumerate(node.operands):
+            operand_type = get_static_type_notation(operand)
+            assert isinstance(operand_type, TensorType) and operand_type.element_type == node_type.element_type, \
+                'FusedElementwise operands should be tensors of the result element type'
+            operand_ndim = len(operand_type.shape)
+            assert 0 < operand_ndim <= self.ndim and operand_type.shape == node_type.shape[self.ndim - operand_ndim:], \
+                'FusedElementwise operands should have the trailing shape of the result'
+            self.operand_ndims.append(operand_ndim)
+            if operand_ndim == self.ndim:
+                operand_exprs.append(f'in{idx}[row + i]')
+            else:
+                # the inner loop runs over the smallest broadcast operand, so a larger one never wraps inside it.
+                offset_lines.append(f'        const {c_type} *row{idx} = in{idx} + (o % (m{idx} / inner)) * inner;')
+                operand_exprs.append(f'row{idx}[i]')
+
+        # each step is a local of the inner loop, so an operand expression is never repeated and the source
+        # grows linearly with the program, relu refers to its operand three times.
+        step_lines = []
+
+        def create_step(op_fn):
+            def step(*args):
+                name = f's{len(step_lines)}'
+                step_lines.append(f'            const {c_type} {name} = {op_fn(*args)};')
+                return name
+
+            return step
+
+        op_dict = {op_name: create_step(op_fn) for op_name, op_fn in C_ELEMENTWISE_OP_DICT.items()}
+        result = node.evaluate(operand_exprs, op_dict, lambda value: get_c_literal(value, c_type))
+        params = ', '.join([f'const {c_type} *in{idx}, int64_t m{idx}' for idx in range(len(node.operands))]
+                           + [f'{c_type} *out'])
+        self.source = '\n'.join([
+            '#include <math.h>',
+            '#include <stdint.h>',
+            f'void plai_fused(int64_t n, int64_t inner, {params}) {{',
+            '    for (int64_t o = 0; o < n / inner; ++o) {',
+            '        int64_t row = o * inner;',
+            *offset_lines,
+            '        for (int64_t i = 0; i < inner; ++i) {',
+            *step_lines,
+            f'            out[row + i] = {result};',
+            '        }',
+            '    }',
+            '}',
+            '',
+        ])
+        self.function = library_cache.get_library(self.source).plai_fused
+        self.function.restype = None
+        self.function.argtypes = [ctypes.c_int64, ctypes.c_int64] + [ctypes.c_void_p, ctypes.c_int64] * len(
+            node.operands) + [ctypes.c_void_p]
+
+    def match_operands(self, operands, out: numpy.ndarray | None) -> typing.Tuple[int, ...] | None:
+        """
+        :return: the shape of the result when the loop can run on operands and out, None otherwise.
+        """
+        if self.ndim not in self.operand_ndims:
+            return None
+        shape = getattr(operands[self.operand_ndims.index(self.ndim)], 'shape', None)
+        for operand, operand_ndim in zip(operands, self.operand_ndims):
+            if not (isinstance(operand, numpy.ndarray) and operand.dtype == self.dtype and operand.flags.c_contiguous
+                    and operand.shape == shape[len(shape) - operand_ndim:]):
+                return None
+        if out is not None and (out.shape != shape or out.dtype != self.dtype or not out.flags.c_contiguous):
+            return None
+        return shape
+
+    def __call__(self, *operands, out: numpy.ndarray = None):
+        shape = self.match_operands(operands, out)
+        if shape is None:
+            result = self.fallback(*operands)
+            if out is None:
+                return result
+            numpy.copyto(out, result)
+            return out
+        if out is None:
+            out = numpy.empty(shape, dtype=self.dtype)
+        args = []
+        inner = out.size
+        for operand, operand_ndim in zip(operands, self.operand_ndims):
+            args += [operand.ctypes.data, operand.size]
+            if operand_ndim != self.ndim:
+                inner = min(inner, operand.size)
+        if inner > 0:
+            self.function(out.size, inner, *args, out.ctypes.data)
+        return out
+
+
+def create_native_kernel_registry(library_cache: NativeLibraryCache,
+                                  parent: KernelRegistry = numpy_kernel_registry) -> KernelRegistry:
+    """
+    FusedElementwise kernels as C loops, nodes which cannot be lowered use the kernels of parent.
+    """
+    registry = KernelRegistry(parent)
+
+    def create_native_kernel(node: FusedElementwise) -> NativeFusedKernel | None:
+        try:
+            return NativeFusedKernel(node, library_cache, parent.create_kernel(node))
+        except AssertionError:
+            return None
+        except (OSError, subprocess.CalledProcessError) as e:
+            warnings.warn(f'Failed to build a native kernel for {node.get_op_name()}, use numpy instead: {e}')
+            return None
+
+    @registry.register(FusedElementwise, REFERENCE, new_buffer=True)
+    def fused_kernel(node: FusedElementwise):
+        return create_native_kernel(node) or parent.create_kernel(node)
+
+    @registry.register(FusedElementwise, OUT)
+    def fused_out_kernel(node: FusedElementwise):
+        return create_native_kernel(node)
+
+    @registry.register(FusedElementwise, INPLACE)
+    def fused_inplace_kernel(node: FusedElementwise, inplace_operand_index: int):
+        kernel = create_native_kernel(node)
+        if kernel is None:
+            return parent.create_kernel(node)
+        # each element of the result only reads the same element of a full shape operand.
+        return lambda *operands: kernel(*operands, out=operands[inplace_operand_index])
+
+    return registry
+
+
+class NativeRuntime(PlaiNumpyRuntime):
+    """
+    PlaiNumpyRuntime running FusedElementwise nodes (see FuseElementwisePass) as C loops built with the local compiler.
+    Without a compiler it runs as PlaiNumpyRuntime.
+    """
+
+    def __init__(self, compiler: str = None, cache_dir: str = None, **kwargs):
+        """
+        :param compiler: a compiler name or path, $CC or cc when None.
+        :param cache_dir: directory of built shared objects, $PLAI_NATIVE_CACHE or ~/.cache/plai/native when None.
+        :param kwargs: arguments of PlaiNumpyRuntime.
+        """
+        compiler_path = find_c_compiler(compiler)
+        self.library_cache = None
+        if compiler_path is not None:
+            self.library_cache = NativeLibraryCache(compiler_path, cache_dir)
+            kwargs['kernel_registry'] = create_native_kernel_registry(
+                self.library_cache, kwargs.get('kernel_registry', numpy_kernel_registry))
+        else:
+            warnings.warn('No C compiler found, NativeRuntime runs kernels with numpy.')
+        super().__init__(**kwargs)
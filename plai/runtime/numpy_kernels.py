@@ -0,0 +1,144 @@
+import functools
+
+import numpy
+
+from plai.dialect.plai_dialect import Constant, Transpose, MatMul, Add, Mul, Relu, FusedElementwise, FusedLinear
+from plai.runtime.kernel_registry import KernelRegistry, INPLACE, OUT
+
+numpy_kernel_registry = KernelRegistry()
+
+# the epilogue of FusedLinear runs on row blocks of about this many elements of the result,
+# so all its steps read and write a block while it is still in cache.
+EPILOGUE_BLOCK_ELEMENTS = 1 << 15
+
+
+def relu(value):
+    return numpy.maximum(value, 0)
+
+
+def relu_inplace(value):
+    return numpy.maximum(value, 0, out=value)
+
+
+def relu_out(value, out):
+    return numpy.maximum(value, 0, out=out)
+
+
+def matmul_transpose_b(lhs, rhs, out=None):
+    # the swapped view of a row-major rhs is column-major, numpy passes it to BLAS with the transpose flag.
+    return numpy.matmul(lhs, numpy.swapaxes(rhs, -1, -2), out=out)
+
+
+def add_inplace_0(lhs, rhs):
+    return numpy.add(lhs, rhs, out=lhs)
+
+
+def add_inplace_1(lhs, rhs):
+    return numpy.add(lhs, rhs, out=rhs)
+
+
+def mul_inplace_0(lhs, rhs):
+    return numpy.multiply(lhs, rhs, out=lhs)
+
+
+def mul_inplace_1(lhs, rhs):
+    return numpy.multiply(lhs, rhs, out=rhs)
+
+
+@numpy_kernel_registry.register(Constant)
+def constant_kernel(node: Constant):
+    value = node.get_value()
+    return lambda: value
+
+
+@numpy_kernel_registry.register(Transpose)
+def transpose_kernel(node: Transpose):
+    return functools.partial(numpy.transpose, axes=node.attrs['permutation'])
+
+
+@numpy_kernel_registry.register(MatMul, new_buffer=True)
+@numpy_kernel_registry.register(MatMul, OUT)
+def matmul_kernel(node: MatMul):
+    return matmul_transpose_b if node.get_transpose_b() else numpy.matmul
+
+
+@numpy_kernel_registry.register(Add, new_buffer=True)
+@numpy_kernel_registry.register(Add, OUT)
+def add_kernel(node: Add):
+    return numpy.add
+
+
+@numpy_kernel_registry.register(Add, INPLACE)
+def add_inplace_kernel(node: Add, inplace_operand_index: int):
+    return (add_inplace_0, add_inplace_1)[inplace_operand_index]
+
+
+@numpy_kernel_registry.register(Mul, new_buffer=True)
+@numpy_kernel_registry.register(Mul, OUT)
+def mul_kernel(node: Mul):
+    return numpy.multiply
+
+
+@numpy_kernel_registry.register(Mul, INPLACE)
+def mul_inplace_kernel(node: Mul, inplace_operand_index: int):
+    return (mul_inplace_0, mul_inplace_1)[inplace_operand_index]
+
+
+@numpy_kernel_registry.register(Relu, new_buffer=True)
+def relu_kernel(node: Relu):
+    return relu
+
+
+@numpy_kernel_registry.register(Relu, INPLACE)
+def relu_inplace_kernel(node: Relu, inplace_operand_index: int):
+    return relu_inplace
+
+
+@numpy_kernel_registry.register(Relu, OUT)
+def relu_out_kernel(node: Relu):
+    return relu_out
+
+
+NUMPY_ELEMENTWISE_OP_DICT = {
+    'add': numpy.add,
+    'mul': numpy.multiply,
+    'relu': relu,
+}
+
+
+@numpy_kernel_registry.register(FusedElementwise, new_buffer=True)
+def fused_elementwise_kernel(node: FusedElementwise):
+    return lambda *operands: node.evaluate(list(operands), NUMPY_ELEMENTWISE_OP_DICT)
+
+
+def create_fused_linear_kernel(alpha, beta, relu: bool, transpose_b: bool):
+    def epilogue(out, bias):
+        if alpha != 1:
+            numpy.multiply(out, alpha, out=out)
+        if bias is not None:
+            numpy.add(out, bias, out=out)
+        if relu:
+            numpy.maximum(out, 0, out=out)
+
+    def fused_linear(a, b, bias=None, out=None):
+        out = numpy.matmul(a, numpy.swapaxes(b, -1, -2) if transpose_b else b, out=out)
+        if bias is not None and beta != 1:
+            bias = numpy.asarray(bias * beta, dtype=out.dtype)
+        if out.ndim != 2:
+            epilogue(out, bias)
+            return out
+        block_rows = max(1, EPILOGUE_BLOCK_ELEMENTS // max(out.shape[1], 1))
+        # a bias with one row per result row is sliced with the block, others broadcast.
+        split_bias = isinstance(bias, numpy.ndarray) and bias.ndim == 2 and bias.shape[0] != 1
+        for start in range(0, out.shape[0], block_rows):
+            stop = start + block_rows
+            epilogue(out[start:stop], bias[start:stop] if split_bias else bias)
+        return out
+
+    return fused_linear
+
+
+@numpy_kernel_registry.register(FusedLinear, new_buffer=True)
+@numpy_kernel_registry.register(FusedLinear, OUT)
+def fused_linear_kernel(node: FusedLinear):
+    return create_fused_linear_kernel(node.get_alpha(), node.get_beta(), node.get_relu(), node.get_transpose_b())
@@ -0,0 +1,135 @@
+import concurrent.futures
+import os
+import threading
+import typing
+
+import numpy
+
+from plai.dialect.plai_dialect import MatMul, Add, Mul, Relu
+from plai.runtime.kernel_registry import KernelRegistry, REFERENCE, INPLACE, OUT
+
+
+class ThreadBudget:
+    """
+    Threads shared by the runtimes of a process, so that several models do not oversubscribe cores.
+    """
+
+    def __init__(self, total: int = None):
+        self.total = total if total is not None else os.cpu_count() or 1
+        self.available = self.total
+        self.lock = threading.Lock()
+
+    def acquire(self, requested: int) -> int:
+        """
+        :return: granted threads, 0 when the budget is used up, to be given back with release.
+        """
+        with self.lock:
+            granted = min(requested, self.available)
+            self.available -= granted
+            return granted
+
+    def release(self, granted: int):
+        with self.lock:
+            self.available += granted
+
+
+global_thread_budget = ThreadBudget()
+
+
+class TileRunner:
+    """
+    Splits work along the first dimension into tiles, the calling thread runs the first tile
+    and the executor the others.
+    A tile covers at least min_tile_cost elements of work, fewer tiles are used for small inputs.
+    """
+
+    def __init__(self, executor: concurrent.futures.Executor, num_threads: int, min_tile_cost: int = 1 << 15):
+        self.executor = executor
+        self.num_threads = num_threads
+        self.min_tile_cost = min_tile_cost
+
+    def split_rows(self, rows: int, row_cost: int) -> typing.List[typing.Tuple[int, int]]:
+        tile_rows = max(-(-rows // self.num_threads), -(-self.min_tile_cost // max(row_cost, 1)), 1)
+        return [(start, min(start + tile_rows, rows)) for start in range(0, rows, tile_rows)]
+
+    def run(self, fn: typing.Callable[[int, int], typing.Any], tiles: typing.List[typing.Tuple[int, int]]):
+        futures = [self.executor.submit(fn, start, stop) for start, stop in tiles[1:]]
+        fn(*tiles[0])
+        for future in futures:
+            future.result()
+
+
+def slice_rows(operand, out: numpy.ndarray, start: int, stop: int):
+    """
+    :return: the rows of operand used by out[start:stop], all of operand when it is broadcast along the rows.
+    """
+    if isinstance(operand, numpy.ndarray) and operand.ndim == out.ndim and operand.shape[0] == out.shape[0]:
+        return operand[start:stop]
+    return operand
+
+
+def overlaps_out(operands, out: numpy.ndarray) -> bool:
+    """
+    :return: True when an operand other than out itself may share memory with out,
+             such as a transposed view, tiles would then overwrite rows other tiles still read.
+    """
+    return any(isinstance(operand, numpy.ndarray) and operand is not out and numpy.may_share_memory(operand, out)
+               for operand in operands)
+
+
+def create_tiled_elementwise(tile_runner: TileRunner, ufunc: numpy.ufunc, extra_operands: tuple = ()):
+    def kernel(*operands, out=None):
+        operands = operands + extra_operands
+        if out is None:
+            out = numpy.empty(numpy.broadcast_shapes(*[numpy.shape(operand) for operand in operands]),
+                              dtype=numpy.result_type(*operands))
+        if out.ndim == 0:
+            return ufunc(*operands, out=out)
+        tiles = tile_runner.split_rows(out.shape[0], out[0].size)
+        if len(tiles) == 1 or overlaps_out(operands, out):
+            return ufunc(*operands, out=out)
+        tile_runner.run(lambda start, stop: ufunc(*[slice_rows(operand, out, start, stop) for operand in operands],
+                                                  out=out[start:stop]), tiles)
+        return out
+
+    return kernel
+
+
+def create_tiled_matmul(tile_runner: TileRunner, transpose_b: bool = False):
+    def kernel(lhs, rhs, out=None):
+        if transpose_b:
+            rhs = numpy.swapaxes(rhs, -1, -2)
+        if lhs.ndim < 2 or rhs.ndim != 2:
+            return numpy.matmul(lhs, rhs, out=out)
+        if out is None:
+            out = numpy.empty(lhs.shape[:-1] + rhs.shape[-1:], dtype=numpy.result_type(lhs, rhs))
+        tiles = tile_runner.split_rows(lhs.shape[0], out[0].size * lhs.shape[-1])
+        if len(tiles) == 1 or overlaps_out((lhs, rhs), out):
+            return numpy.matmul(lhs, rhs, out=out)
+        tile_runner.run(lambda start, stop: numpy.matmul(lhs[start:stop], rhs, out=out[start:stop]), tiles)
+        return out
+
+    return kernel
+
+
+def create_tiled_kernel_registry(tile_runner: TileRunner, parent: KernelRegistry) -> KernelRegistry:
+    """
+    Kernels of MatMul, Add, Mul and Relu split along the rows of their result, other kernels come from parent.
+    """
+    registry = KernelRegistry(parent)
+    matmul = create_tiled_matmul(tile_runner)
+    matmul_transpose_b = create_tiled_matmul(tile_runner, transpose_b=True)
+    elementwise_dict = {
+        Add: create_tiled_elementwise(tile_runner, numpy.add),
+        Mul: create_tiled_elementwise(tile_runner, numpy.multiply),
+        Relu: create_tiled_elementwise(tile_runner, numpy.maximum, (0,)),
+    }
+
+    registry.register(MatMul, new_buffer=True)(lambda node: matmul_transpose_b if node.get_transpose_b() else matmul)
+    registry.register(MatMul, OUT)(lambda node: matmul_transpose_b if node.get_transpose_b() else matmul)
+    for node_cls, kernel in elementwise_dict.items():
+        registry.register(node_cls, REFERENCE, new_buffer=True)(lambda node, kernel=kernel: kernel)
+        registry.register(node_cls, OUT)(lambda node, kernel=kernel: kernel)
+        registry.register(node_cls, INPLACE)(
+            lambda node, idx, kernel=kernel: lambda *operands: kernel(*operands, out=operands[idx]))
+    return registry
@@ -0,0 +1,109 @@
+import concurrent.futures
+import heapq
+import typing
+
+import numpy
+
+from plai.core.core_dialect import Output
+from plai.core.graph import Graph
+from plai.core.node import Node
+from plai.dialect.plai_dialect import MatMul, FusedLinear
+from plai.runtime.execution_plan import Kernel, KernelProvider, get_static_type_notation
+
+
+def estimate_cost(node: Node) -> int:
+    """
+    :return: a rough cost of node, the number of result elements, times the inner dimension for MatMul and FusedLinear.
+    """
+    node_type = get_static_type_notation(node)
+    if node_type is None:
+        return 1
+    cost = int(numpy.prod(node_type.shape, dtype=numpy.int64)) or 1
+    if isinstance(node, (MatMul, FusedLinear)):
+        operand_type = get_static_type_notation(node.operands[0])
+        if operand_type is not None:
+            cost *= operand_type.shape[-1]
+    return cost
+
+
+class ParallelSchedule:
+    """
+    A graph lowered for inter-op parallelism with dependency counting.
+    A node is ready when all its operands are computed, ready nodes are sent to the executor
+    in order of their critical path, the longest estimated cost from the node to an output.
+    At most max_in_flight nodes are queued so that the priority decides which node runs next.
+    Values are released after their last user finished, kernels never write into operands.
+    """
+
+    def __init__(self, graph: Graph, kernel_provider: KernelProvider, executor: concurrent.futures.Executor,
+                 max_in_flight: int):
+        self.executor = executor
+        self.max_in_flight = max_in_flight
+        self.argument_count = len(graph.arguments)
+        slot_dict: typing.Dict[Node, int] = {arg: idx for idx, arg in enumerate(graph.arguments)}
+        nodes = [node for node in graph if not isinstance(node, Output)]
+        for node in nodes:
+            slot_dict[node] = len(slot_dict)
+        self.slot_count = len(slot_dict)
+        self.output_slots = [slot_dict[output] for output in graph.outputs.operands]
+
+        # per node, indexed by slot - argument_count
+        self.kernels: typing.List[Kernel] = [kernel_provider.create_kernel(node) for node in nodes]
+        self.operand_slots: typing.List[typing.Tuple[int, ...]] = [
+            tuple(slot_dict[operand] for operand in node.operands) for node in nodes]
+        self.dependency_counts: typing.List[int] = []
+        self.user_slots: typing.List[typing.List[int]] = [[] for _ in range(self.slot_count)]
+        for node in nodes:
+            operand_nodes = [operand for operand in dict.fromkeys(node.operands) if operand in slot_dict]
+            self.dependency_counts.append(sum(1 for operand in operand_nodes if slot_dict[operand] >= self.argument_count))
+            for operand in operand_nodes:
+                self.user_slots[slot_dict[operand]].append(slot_dict[node])
+        # values are released when their use count drops to zero, outputs are never released.
+        self.use_counts = [len(users) for users in self.user_slots]
+        for idx in self.output_slots:
+            self.use_counts[idx] += 1
+
+        critical_path = [0] * self.slot_count
+        for node in reversed(nodes):
+            slot = slot_dict[node]
+            critical_path[slot] = estimate_cost(node) + max((critical_path[user] for user in self.user_slots[slot]),
+                                                            default=0)
+        self.priorities = critical_path
+
+        self.initial_ready = [(-self.priorities[slot_dict[node]], slot_dict[node]) for idx, node in enumerate(nodes)
+                              if self.dependency_counts[idx] == 0]
+        heapq.heapify(self.initial_ready)
+
+    def run_node(self, slot: int, slots: list):
+        idx = slot - self.argument_count
+        return self.kernels[idx](*[slots[operand_slot] for operand_slot in self.operand_slots[idx]])
+
+    def run(self, input_values: typing.Sequence) -> list:
+        assert len(input_values) == self.argument_count
+        slots = [None] * self.slot_count
+        slots[:self.argument_count] = input_values
+        dependency_counts = list(self.dependency_counts)
+        use_counts = list(self.use_counts)
+        ready = list(self.initial_ready)
+        in_flight: typing.Dict[concurrent.futures.Future, int] = {}
+
+        while ready or in_flight:
+            while ready and len(in_flight) < self.max_in_flight:
+                _, slot = heapq.heappop(ready)
+                in_flight[self.executor.submit(self.run_node, slot, slots)] = slot
+            done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                slot = in_flight.pop(future)
+                slots[slot] = future.result()
+                for user in self.user_slots[slot]:
+                    dependency_counts[user - self.argument_count] -= 1
+                    if dependency_counts[user - self.argument_count] == 0:
+                        heapq.heappush(ready, (-self.priorities[user], user))
+                for operand_slot in dict.fromkeys(self.operand_slots[slot - self.argument_count]):
+                    use_counts[operand_slot] -= 1
+                    if use_counts[operand_slot] == 0:
+                        slots[operand_slot] = None
+                if use_counts[slot] == 0:
+                    slots[slot] = None
+
+        return [slots[idx] for idx in self.output_slots]
@@ -1,88 +1,237 @@
+import threading
 import typing
+import weakref
 
 import numpy
 import torch
 
 from plai.core import runtime
 from plai.core.core_dialect import Output
+from plai.core.graph import Graph
 from plai.core.node import Node
-from plai.dialect.plai_dialect import Transpose, MatMul, Add, Relu
-
-
-class ValueOnDevice:
-    def __init__(self, np_array: numpy.ndarray):
-        self.value = np_array
-
-    def get_value(self):
-        return self.value
+from plai.runtime.device_memory import ValueOnDevice, DeviceMemoryManager
+from plai.runtime.execution_plan import Kernel, compute_last_use_dict, compute_buffer_last_use_dict, \
+    find_inplace_operand_index, get_static_type_notation
+from plai.runtime.kernel_registry import KernelRegistry, OUT
+from plai.runtime.memory_planner import get_buffer_size
+from plai.runtime.numpy_kernels import numpy_kernel_registry
 
 
 class Backend:
 
-    def __init__(self):
-        self.heap = set()
+    def __init__(self, memory_manager: DeviceMemoryManager = None):
+        self.memory_manager = memory_manager if memory_manager is not None else DeviceMemoryManager()
+        self.memory_statistics = self.memory_manager.result_statistics
 
     def load(self, np_array: numpy.ndarray) -> ValueOnDevice:
-        result = ValueOnDevice(np_array)
-        self.heap.add(result)
+        """
+        Copy a host array into a pooled device block.
+        """
+        result = self.memory_manager.allocate(np_array.shape, np_array.dtype)
+        numpy.copyto(result.value, np_array)
         return result
 
-    def store(self, device_array: ValueOnDevice):
-        assert device_array in self.heap, "Device array is not on device"
-        return device_array.get_value()
-
-    def clear(self):
-        self.heap.clear()
-
-    def run_op(self, node_ty: str, operands: typing.List[ValueOnDevice], attrs: typing.Dict):
-        assert all(operand in self.heap for operand in operands), "Not all operands are on device"
-        operands_in_numpy = [operand.get_value() for operand in operands]
-        if node_ty == 'Transpose':
-            np_result = numpy.transpose(operands_in_numpy[0], axes=attrs['permutation'])
-        elif node_ty == 'MatMul':
-            np_result = numpy.matmul(operands_in_numpy[0], operands_in_numpy[1])
-        elif node_ty == 'Add':
-            np_result = operands_in_numpy[0] + operands_in_numpy[1]
-        elif node_ty == 'Relu':
-            np_result = numpy.maximum(operands_in_numpy[0], 0)
+    def store(self, device_array: ValueOnDevice) -> numpy.ndarray:
+        """
+        Copy a device value to the host, a buffer allocated by a kernel is handed over without copy.
+        """
+        assert device_array.ref_count > 0, "Device array is already released"
+        if device_array.owned:
+            return device_array.get_value()
+        return numpy.array(device_array.get_value(), copy=True)
+
+    def retain(self, device_array: ValueOnDevice):
+        self.memory_manager.retain(device_array)
+
+    def free(self, device_array: ValueOnDevice):
+        self.memory_manager.release(device_array)
+
+    def pin(self, device_array: ValueOnDevice):
+        self.memory_manager.pin(device_array)
+
+    def unpin(self, device_array: ValueOnDevice):
+        self.memory_manager.unpin(device_array)
+
+    def run_op(self, kernel: Kernel, operands: typing.List[ValueOnDevice], inplace_operand_index: int = None,
+               out_type: typing.Tuple[typing.Tuple[int, ...], numpy.dtype] = None, new_buffer: bool = True):
+        """
+        :param kernel: resolved from a KernelRegistry at plan time.
+        :param operands:
+        :param inplace_operand_index: the kernel writes its result into this operand, which is returned.
+        :param out_type: (shape, dtype) of a pooled block the kernel writes its result into with `out`.
+        :param new_buffer: the result of kernel never aliases an operand.
+        :return: a new reference to the result.
+        """
+        assert all(operand.ref_count > 0 for operand in operands), "Operands are already released"
+        operand_values = [operand.get_value() for operand in operands]
+        if inplace_operand_index is not None:
+            kernel(*operand_values)
+            return operands[inplace_operand_index]
+
+        if out_type is not None:
+            result = self.memory_manager.allocate(*out_type)
+            kernel(*operand_values, out=result.value)
         else:
-            raise NotImplementedError(f"Node {node_ty} is not supported by Backend")
-
-        result = ValueOnDevice(np_result)
-        self.heap.add(result)
+            result = self.memory_manager.adopt(kernel(*operand_values), () if new_buffer else tuple(operands))
+        self.memory_manager.mark_result(result)
         return result
 
 
+class BackendSchedule:
+    """
+    Steps (node, kernel, inplace operand index, out type, new buffer, nodes to free after node) in graph order.
+    Results with static shapes are written into pooled blocks or into dying operands,
+    calls with other argument shapes use dynamic_schedule.
+    """
+
+    def __init__(self, graph: Graph, kernel_registry: KernelRegistry, use_pool: bool = True):
+        self.argument_shapes: typing.List[typing.Tuple[typing.Tuple[int, ...], numpy.dtype]] = []
+        self.dynamic_schedule: BackendSchedule | None = None
+        if use_pool:
+            argument_types = [get_static_type_notation(arg) for arg in graph.arguments]
+            if all(arg_type is not None for arg_type in argument_types):
+                self.argument_shapes = [(arg_type.shape, numpy.dtype(arg_type.element_type.value))
+                                        for arg_type in argument_types]
+                self.dynamic_schedule = BackendSchedule(graph, kernel_registry, use_pool=False)
+            else:
+                use_pool = False
+
+        last_use_dict = compute_last_use_dict(graph)
+        # nodes with an out kernel write into a pooled block of their own.
+        buffer_last_use_dict = compute_buffer_last_use_dict(graph, lambda node: kernel_registry.returns_new_buffer(
+            node) or (use_pool and get_buffer_size(node) and kernel_registry.lookup(node, OUT) is not None))
+        new_buffer_nodes = set()
+        self.steps = []
+        for node in graph:
+            if isinstance(node, Output):
+                continue
+            dying_operands = [operand for operand in dict.fromkeys(node.operands)
+                              if operand is not None and last_use_dict.get(operand) is node]
+            inplace_operand_index = None
+            if use_pool and kernel_registry.supports_inplace(node):
+                inplace_operand_index = find_inplace_operand_index(node, buffer_last_use_dict, new_buffer_nodes)
+            new_buffer = kernel_registry.returns_new_buffer(node)
+            out_kernel = None
+            out_type = None
+            if inplace_operand_index is None and use_pool and get_buffer_size(node):
+                out_kernel = kernel_registry.create_out_kernel(node)
+                if out_kernel is not None:
+                    node_type = get_static_type_notation(node)
+                    out_type = (node_type.shape, numpy.dtype(node_type.element_type.value))
+                    new_buffer = True
+            if new_buffer:
+                new_buffer_nodes.add(node)
+            kernel = out_kernel if out_kernel is not None else kernel_registry.create_kernel(node, inplace_operand_index)
+
+            free_nodes = [operand for operand in dying_operands
+                          if inplace_operand_index is None or operand is not node.operands[inplace_operand_index]]
+            if node not in last_use_dict:
+                free_nodes.append(node)
+            self.steps.append((node, kernel, inplace_operand_index, out_type, new_buffer, free_nodes))
+
+    def match_arguments(self, input_values: typing.Sequence[ValueOnDevice]) -> bool:
+        return all(value.get_value().shape == shape and value.get_value().dtype == dtype
+                   for value, (shape, dtype) in zip(input_values, self.argument_shapes))
+
+
+def get_weight_key(tensor: torch.Tensor) -> tuple:
+    """
+    :return: a key which changes when the tensor is replaced or modified in place.
+    """
+    return tensor.data_ptr(), tensor._version, tuple(tensor.shape), tensor.stride(), tensor.dtype
+
+
 class PlaiNumpyBackendRuntime(runtime.Runtime):
-    def __init__(self, backend: Backend):
+    def __init__(self, backend: Backend, kernel_registry: KernelRegistry = numpy_kernel_registry,
+                 keep_weights_resident: bool = True):
+        """
+        :param backend:
+        :param kernel_registry: kernels of the nodes, shared with PlaiNumpyRuntime by default.
+        :param keep_weights_resident: keep nn.Parameter arguments pinned on device between calls,
+                                      they are loaded again only when replaced or modified.
+        """
         self.backend = backend
+        self.kernel_registry = kernel_registry
+        self.keep_weights_resident = keep_weights_resident
+        self.schedule_dict: typing.MutableMapping[Graph, BackendSchedule] = weakref.WeakKeyDictionary()
+        self.schedule_lock = threading.Lock()
+        # graph -> {argument index: (weight key, host tensor, pinned device value)}
+        self.resident_weight_dict: typing.MutableMapping[Graph, typing.Dict[int, tuple]] = \
+            weakref.WeakKeyDictionary()
+        self.weight_lock = threading.Lock()
+        self.weight_load_count = 0
+
+    def create_schedule(self, graph: Graph) -> BackendSchedule:
+        return BackendSchedule(graph, self.kernel_registry)
+
+    def prepare(self, graph: Graph):
+        self.get_schedule(graph)
+
+    def get_schedule(self, graph: Graph) -> BackendSchedule:
+        schedule = self.schedule_dict.get(graph)
+        if schedule is None:
+            with self.schedule_lock:
+                schedule = self.schedule_dict.get(graph)
+                if schedule is None:
+                    schedule = self.create_schedule(graph)
+                    self.schedule_dict[graph] = schedule
+        return schedule
+
+    def load_weight(self, graph: Graph, argument_index: int, tensor: torch.Tensor) -> ValueOnDevice:
+        """
+        :return: a new reference to the resident device value of tensor.
+        """
+        key = get_weight_key(tensor)
+        with self.weight_lock:
+            resident_weights = self.resident_weight_dict.setdefault(graph, {})
+            entry = resident_weights.get(argument_index)
+            if entry is None or entry[0] != key:
+                if entry is not None:
+                    # calls still using the old value hold their own references.
+                    self.backend.unpin(entry[2])
+                device_value = self.backend.load(tensor.detach().cpu().numpy())
+                self.backend.pin(device_value)
+                self.backend.free(device_value)
+                self.weight_load_count += 1
+                # the host tensor is kept alive so its data_ptr cannot be taken by another tensor.
+                entry = (key, tensor, device_value)
+                resident_weights[argument_index] = entry
+            self.backend.retain(entry[2])
+            return entry[2]
+
+    def evict_weights(self, graph: Graph):
+        with self.weight_lock:
+            resident_weights = self.resident_weight_dict.pop(graph, {})
+        for _, _, device_value in resident_weights.values():
+            self.backend.unpin(device_value)
 
     def run(self, graph, input_tensors):
-        self.backend.clear()
-        node_value_dict: typing.Dict[Node, numpy.ndarray] = {
-            k: v.cpu().numpy() for k, v in zip(graph.arguments, input_tensors)
-        }
-        node_device_value_dict: typing.Dict[Node, ValueOnDevice] = {
-            k: self.backend.load(v) for k, v in node_value_dict.items()
-        }
-
-        def calc_value(node: Node):
-            operand_values = [node_device_value_dict[operand] for operand in node.operands]
-            if isinstance(node, Output):
-                result = None
-            elif isinstance(node, Transpose):
-                result = self.backend.run_op('Transpose', operand_values, node.attrs)
-            elif isinstance(node, MatMul):
-                result = self.backend.run_op('MatMul', operand_values, node.attrs)
-            elif isinstance(node, Add):
-                result = self.backend.run_op('Add', operand_values, node.attrs)
-            elif isinstance(node, Relu):
-                result = self.backend.run_op('Relu', operand_values, node.attrs)
+        """
+        Values of a call live in a local dict and are reference counted, so calls may run concurrently.
+        """
+        schedule = self.get_schedule(graph)
+        node_device_value_dict: typing.Dict[Node, ValueOnDevice] = {}
+        for idx, (arg, tensor) in enumerate(zip(graph.arguments, input_tensors)):
+            if self.keep_weights_resident and isinstance(tensor, torch.nn.Parameter):
+                node_device_value_dict[arg] = self.load_weight(graph, idx, tensor)
             else:
-                raise NotImplementedError(f"Node {node} is not supported by NumpyRuntime")
+                node_device_value_dict[arg] = self.backend.load(tensor.detach().cpu().numpy())
+        if schedule.dynamic_schedule is not None and not schedule.match_arguments(
+                [node_device_value_dict[arg] for arg in graph.arguments]):
+            schedule = schedule.dynamic_schedule
 
-            node_device_value_dict[node] = result
-
-        graph.walk(calc_value)
-
-        return [torch.from_numpy(node_device_value_dict[output].get_value()) for output in graph.outputs.operands]
+        for node, kernel, inplace_operand_index, out_type, new_buffer, free_nodes in schedule.steps:
+            operand_values = [node_device_value_dict[operand] for operand in node.operands]
+            node_device_value_dict[node] = self.backend.run_op(kernel, operand_values, inplace_operand_index,
+                                                               out_type, new_buffer)
+            if inplace_operand_index is not None:
+                # the reference of the dying operand is taken over by node.
+                del node_device_value_dict[node.operands[inplace_operand_index]]
+            for free_node in free_nodes:
+                self.backend.free(node_device_value_dict.pop(free_node))
+
+        results = [torch.from_numpy(self.backend.store(node_device_value_dict[output])) for output in
+                   graph.outputs.operands]
+        for device_value in node_device_value_dict.values():
+            self.backend.free(device_value)
+        return results
@@ -1,35 +1,115 @@
+import concurrent.futures
+import threading
 import typing
+import weakref
 
 import numpy
 import torch
 
 from plai.core import runtime
 from plai.core.core_dialect import Output
+from plai.core.graph import Graph
 from plai.core.node import Node
-from plai.dialect.plai_dialect import Transpose, MatMul, Add, Relu
+from plai.runtime import memory_planner
+from plai.runtime.execution_plan import ExecutionPlan, MemoryStatistics, get_static_type_notation
+from plai.runtime.kernel_registry import KernelRegistry
+from plai.runtime.numpy_kernels import numpy_kernel_registry
+from plai.runtime.parallel_kernels import ThreadBudget, TileRunner, global_thread_budget, \
+    create_tiled_kernel_registry
+from plai.runtime.parallel_scheduler import ParallelSchedule
 
 
 class PlaiNumpyRuntime(runtime.Runtime):
+    def __init__(self, track_memory: bool = False, plan_memory: bool = True,
+                 kernel_registry: KernelRegistry = numpy_kernel_registry, num_workers: int = 0,
+                 intra_op_threads: int = 1, thread_budget: ThreadBudget = global_thread_budget):
+        """
+        :param track_memory: count bytes of intermediate buffers in memory_statistics, slower.
+        :param plan_memory: place intermediates of graphs with static shapes in a preallocated arena.
+        :param kernel_registry: kernels of the nodes, shared with PlaiNumpyBackendRuntime by default.
+        :param num_workers: run independent nodes on a thread pool of this size when greater than 1,
+                            memory planning and in-place kernels are not used then.
+        :param intra_op_threads: split MatMul and elementwise kernels over up to this many threads,
+                                 as far as thread_budget grants them.
+        :param thread_budget: threads shared with the other runtimes of the process.
+        """
+        assert not (track_memory and num_workers > 1), 'track_memory is not supported with parallel workers'
+        self.track_memory = track_memory
+        self.plan_memory = plan_memory
+        self.num_workers = num_workers
+        self.executor = None
+        if num_workers > 1:
+            self.executor = concurrent.futures.ThreadPoolExecutor(num_workers, thread_name_prefix='plai_numpy')
+        self.memory_statistics = MemoryStatistics()
+        self.kernel_registry = kernel_registry
+        self.thread_budget = thread_budget
+        # the calling thread always runs, acquired_threads is what is given back to thread_budget on shutdown.
+        self.acquired_threads = thread_budget.acquire(intra_op_threads) if intra_op_threads > 1 else 0
+        self.intra_op_threads = max(1, self.acquired_threads)
+        self.intra_op_executor = None
+        if self.intra_op_threads > 1:
+            self.intra_op_executor = concurrent.futures.ThreadPoolExecutor(self.intra_op_threads - 1,
+                                                                           thread_name_prefix='plai_numpy_tile')
+            self.kernel_registry = create_tiled_kernel_registry(
+                TileRunner(self.intra_op_executor, self.intra_op_threads), kernel_registry)
+        self.plan_dict: typing.MutableMapping[Graph, ExecutionPlan | ParallelSchedule] = weakref.WeakKeyDictionary()
+        self.plan_lock = threading.Lock()
+
+    def prepare(self, graph: Graph):
+        self.get_plan(graph)
+
+    def get_plan(self, graph: Graph) -> ExecutionPlan | ParallelSchedule:
+        plan = self.plan_dict.get(graph)
+        if plan is None:
+            with self.plan_lock:
+                plan = self.plan_dict.get(graph)
+                if plan is None:
+                    plan = self.create_plan(graph)
+                    self.plan_dict[graph] = plan
+        return plan
+
+    def create_plan(self, graph: Graph) -> ExecutionPlan | ParallelSchedule:
+        if self.executor is not None:
+            return ParallelSchedule(graph, self.kernel_registry, self.executor, self.num_workers)
+        memory_plan = None
+        if self.plan_memory and all(get_static_type_notation(arg) is not None for arg in graph.arguments):
+            memory_plan = memory_planner.plan_memory(
+                graph, lambda node: self.kernel_registry.create_out_kernel(node) is not None)
+            graph.metadata['memory_plan'] = memory_plan
+            if not memory_plan.offset_dict:
+                memory_plan = None
+        return ExecutionPlan(graph, self.kernel_registry, memory_plan)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+        if self.intra_op_executor is not None:
+            self.intra_op_executor.shutdown()
+            self.intra_op_executor = None
+        self.thread_budget.release(self.acquired_threads)
+        self.acquired_threads = 0
+
     def run(self, graph, input_tensors):
-        node_value_dict: typing.Dict[Node, numpy.ndarray] = {k: v.cpu().numpy() for k, v in
+        plan = self.get_plan(graph)
+        input_values = [v.detach().cpu().numpy() for v in input_tensors]
+        if self.track_memory:
+            results = plan.run_with_memory_statistics(input_values, self.memory_statistics)
+        else:
+            results = plan.run(input_values)
+        return [torch.from_numpy(result) for result in results]
+
+    def run_interpreted(self, graph, input_tensors):
+        """
+        Walk the graph and dispatch every node on each call, without an execution plan.
+        """
+        node_value_dict: typing.Dict[Node, numpy.ndarray] = {k: v.detach().cpu().numpy() for k, v in
                                                              zip(graph.arguments, input_tensors)}
 
         def calc_value(node: Node):
-            operand_values = [node_value_dict[operand] for operand in node.operands]
             if isinstance(node, Output):
-                result = None
-            elif isinstance(node, Transpose):
-                result = numpy.transpose(operand_values[0], axes=node.attrs['permutation'])
-            elif isinstance(node, MatMul):
-                result = numpy.matmul(operand_values[0], operand_values[1])
-            elif isinstance(node, Add):
-                result = operand_values[0] + operand_values[1]
-            elif isinstance(node, Relu):
-                result = numpy.maximum(operand_values[0], 0)
-            else:
-                raise NotImplementedError(f"Node {node} is not supported by NumpyRuntime")
-
-            node_value_dict[node] = result
+                return
+            kernel = self.kernel_registry.create_kernel(node)
+            node_value_dict[node] = kernel(*[node_value_dict[operand] for operand in node.operands])
 
         graph.walk(calc_value)
 
@@ -0,0 +1,118 @@
+import keyword
+import linecache
+import math
+import threading
+import typing
+import weakref
+
+import torch
+
+from plai.core import runtime
+from plai.core.core_dialect import Output
+from plai.core.graph import Graph
+from plai.core.node import Node
+from plai.dialect.plai_dialect import Constant
+from plai.runtime.execution_plan import compute_last_use_dict
+from plai.runtime.kernel_registry import KernelRegistry
+from plai.runtime.numpy_kernels import numpy_kernel_registry
+
+
+class GeneratedFunction:
+    """
+    Straight-line python source of a graph, its code object and the function built from it.
+    Kernels, array and non-finite constants are bound as globals of the function, finite scalars are inlined.
+    The function is always named FUNCTION_NAME, the graph name may be a kernel name or a keyword.
+    """
+
+    FUNCTION_NAME = '__plai_graph__'
+
+    def __init__(self, graph: Graph, kernel_registry: KernelRegistry):
+        self.global_dict: typing.Dict[str, typing.Any] = {}
+        name_dict: typing.Dict[Node, str] = {}
+        for idx, arg in enumerate(graph.arguments):
+            name_dict[arg] = f'a{idx}'
+        local_names = set(name_dict.values())
+
+        last_use_dict = compute_last_use_dict(graph)
+        lines = [f'# graph {graph.name!r}',
+                 f'def {self.FUNCTION_NAME}({", ".join(name_dict[arg] for arg in graph.arguments)}):']
+        for idx, node in enumerate(graph):
+            if isinstance(node, Output):
+                continue
+            if isinstance(node, Constant):
+                value = node.get_value()
+                # repr of inf and nan is not a python literal.
+                is_literal = isinstance(value, (bool, int, float)) and math.isfinite(value)
+                name_dict[node] = repr(value) if is_literal else self.bind_global(value, f'c{idx}')
+                continue
+            name_dict[node] = f'v{idx}'
+            local_names.add(name_dict[node])
+            kernel_name = self.bind_global(kernel_registry.create_kernel(node), f'k{idx}')
+            operands = ', '.join(name_dict[operand] for operand in node.operands)
+            comment = node.get_op_name() + (f' {node.loc}' if node.loc is not None else '')
+            lines.append(f'    {name_dict[node]} = {kernel_name}({operands})  # {" ".join(comment.split())}')
+            dying = [name_dict[operand] for operand in dict.fromkeys(node.operands)
+                     if last_use_dict.get(operand) is node and name_dict[operand] in local_names]
+            if node not in last_use_dict:
+                dying.append(name_dict[node])
+            if dying:
+                lines.append(f'    del {", ".join(dying)}')
+        lines.append(f'    return [{", ".join(name_dict[output] for output in graph.outputs.operands)}]')
+        self.source = '\n'.join(lines) + '\n'
+
+        self.filename = f'<plai codegen {graph.name!r} {id(self):x}>'
+        self.code = compile(self.source, self.filename, 'exec')
+        # makes the source visible in tracebacks and debuggers.
+        linecache.cache[self.filename] = (len(self.source), None, self.source.splitlines(True), self.filename)
+        exec(self.code, self.global_dict)
+        self.function = self.global_dict[self.FUNCTION_NAME]
+
+    def bind_global(self, value, fallback_name: str) -> str:
+        """
+        :return: the global name of value, the name of a function is kept when it is free.
+        """
+        name = getattr(value, '__name__', None)
+        if not isinstance(name, str) or not name.isidentifier() or keyword.iskeyword(name) or \
+                name == self.FUNCTION_NAME:
+            name = fallback_name
+        if self.global_dict.get(name, value) is not value:
+            name = fallback_name
+        self.global_dict[name] = value
+        return name
+
+    def __del__(self):
+        linecache.cache.pop(getattr(self, 'filename', None), None)
+
+
+class PythonCodegenRuntime(runtime.Runtime):
+    """
+    Runs each graph as a generated python function, so a call costs one python call per node.
+    """
+
+    def __init__(self, kernel_registry: KernelRegistry = numpy_kernel_registry):
+        """
+        :param kernel_registry: kernels called by the generated source.
+        """
+        self.kernel_registry = kernel_registry
+        self.function_dict: typing.MutableMapping[Graph, GeneratedFunction] = weakref.WeakKeyDictionary()
+        self.function_lock = threading.Lock()
+
+    def prepare(self, graph: Graph):
+        self.get_function(graph)
+
+    def get_function(self, graph: Graph) -> GeneratedFunction:
+        function = self.function_dict.get(graph)
+        if function is None:
+            with self.function_lock:
+                function = self.function_dict.get(graph)
+                if function is None:
+                    function = GeneratedFunction(graph, self.kernel_registry)
+                    self.function_dict[graph] = function
+        return function
+
+    def get_source(self, graph: Graph) -> str:
+        return self.get_function(graph).source
+
+    def run(self, graph, input_tensors):
+        results = self.get_function(graph).function(*[v.detach().cpu().numpy() for v in input_tensors])
+        return [torch.from_numpy(result) for result in results]
@@ -0,0 +1,151 @@
+import concurrent.futures
+import threading
+import time
+import typing
+import warnings
+import weakref
+
+from plai.core import runtime
+from plai.core.graph import Graph
+from plai.core.pipeline import Pass
+from plai.pipelines.fuse_elementwise import FuseElementwisePass
+from plai.runtime.native_runtime import NativeRuntime, find_c_compiler
+from plai.runtime.plai_numpy_runtime import PlaiNumpyRuntime
+
+INTERPRETED = 'interpreted'
+OPTIMIZED = 'optimized'
+
+
+class TierStatistics:
+    def __init__(self):
+        self.call_count = 0
+        self.total_seconds = 0.0
+
+    def get_mean_seconds(self) -> float:
+        return self.total_seconds / self.call_count if self.call_count else 0.0
+
+    def __repr__(self):
+        return f'{self.call_count} calls, mean {self.get_mean_seconds() * 1e6:.1f} us'
+
+
+class TieredGraphState:
+    """
+    Tier of one graph. optimized_graph is assigned once, after optimized runtime is prepared for it,
+    so a call either sees None and interprets or sees a ready graph.
+    """
+
+    def __init__(self):
+        self.tier_statistics = {INTERPRETED: TierStatistics(), OPTIMIZED: TierStatistics()}
+        self.optimized_graph: Graph | None = None
+        self.promotion: concurrent.futures.Future | None = None
+        self.promotion_seconds = 0.0
+        self.promotion_error: BaseException | None = None
+
+
+class TieredRuntime(runtime.Runtime):
+    """
+    Interprets each graph first, which needs no preparation, and counts its calls.
+    After hot_threshold calls a copy of the graph is optimized and prepared on a background thread,
+    later calls then run the copy in optimized_runtime. A failed promotion keeps interpreting.
+    """
+
+    def __init__(self, hot_threshold: int = 100, interpreter: PlaiNumpyRuntime = None,
+                 optimized_runtime: runtime.Runtime = None, optimize_pipeline: Pass = None,
+                 executor: concurrent.futures.Executor = None):
+        """
+        :param hot_threshold: interpreted calls of a graph before it is promoted, 0 promotes on prepare.
+        :param interpreter: runs graphs with run_interpreted.
+        :param optimized_runtime: NativeRuntime when a C compiler is found, PlaiNumpyRuntime otherwise.
+        :param optimize_pipeline: applied to the copy of a hot graph,
+                                  FuseElementwisePass by default when optimized_runtime is a NativeRuntime.
+        :param executor: runs promotions, a single worker thread when None.
+        """
+        self.hot_threshold = hot_threshold
+        self.interpreter = interpreter if interpreter is not None else PlaiNumpyRuntime(plan_memory=False)
+        if optimized_runtime is None:
+            optimized_runtime = NativeRuntime() if find_c_compiler() is not None else PlaiNumpyRuntime()
+        self.optimized_runtime = optimized_runtime
+        if optimize_pipeline is None and isinstance(optimized_runtime, NativeRuntime):
+            optimize_pipeline = FuseElementwisePass()
+        self.optimize_pipeline = optimize_pipeline
+        self.executor = executor
+        self.own_executor = executor is None
+        self.state_dict: typing.MutableMapping[Graph, TieredGraphState] = weakref.WeakKeyDictionary()
+        self.lock = threading.Lock()
+        self.tier_statistics = {INTERPRETED: TierStatistics(), OPTIMIZED: TierStatistics()}
+
+    def get_state(self, graph: Graph) -> TieredGraphState:
+        state = self.state_dict.get(graph)
+        if state is None:
+            with self.lock:
+                state = self.state_dict.get(graph)
+                if state is None:
+                    state = TieredGraphState()
+                    self.state_dict[graph] = state
+        return state
+
+    def get_tier(self, graph: Graph) -> str:
+        return OPTIMIZED if self.get_state(graph).optimized_graph is not None else INTERPRETED
+
+    def prepare(self, graph: Graph):
+        if self.hot_threshold <= 0:
+            self.request_promotion(graph, self.get_state(graph))
+            self.wait_for_promotion(graph)
+
+    def promote(self, graph: Graph, state: TieredGraphState):
+        start_time = time.perf_counter()
+        try:
+            optimized_graph = graph.clone()
+            if self.optimize_pipeline is not None:
+                self.optimize_pipeline(optimized_graph)
+            self.optimized_runtime.prepare(optimized_graph)
+        except Exception as e:
+            state.promotion_error = e
+            warnings.warn(f'Failed to optimize graph {graph.name}, keep interpreting it: {e!r}')
+            return
+        finally:
+            state.promotion_seconds = time.perf_counter() - start_time
+        state.optimized_graph = optimized_graph
+
+    def request_promotion(self, graph: Graph, state: TieredGraphState):
+        with self.lock:
+            if state.promotion is not None:
+                return
+            if self.executor is None:
+                self.executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='plai_tiering')
+            state.promotion = self.executor.submit(self.promote, graph, state)
+
+    def wait_for_promotion(self, graph: Graph, timeout: float = None) -> bool:
+        """
+        :return: True when graph runs in the optimized tier.
+        """
+        promotion = self.get_state(graph).promotion
+        if promotion is not None:
+            concurrent.futures.wait([promotion], timeout)
+        return self.get_tier(graph) == OPTIMIZED
+
+    def shutdown(self):
+        if self.own_executor and self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def record(self, state: TieredGraphState, tier: str, seconds: float):
+        with self.lock:
+            for tier_statistics in [state.tier_statistics, self.tier_statistics]:
+                tier_statistics[tier].call_count += 1
+                tier_statistics[tier].total_seconds += seconds
+
+    def run(self, graph, input_tensors):
+        state = self.get_state(graph)
+        start_time = time.perf_counter()
+        optimized_graph = state.optimized_graph
+        if optimized_graph is not None:
+            results = self.optimized_runtime(optimized_graph, input_tensors)
+            self.record(state, OPTIMIZED, time.perf_counter() - start_time)
+            return results
+
+        results = self.interpreter.run_interpreted(graph, input_tensors)
+        self.record(state, INTERPRETED, time.perf_counter() - start_time)
+        if state.promotion is None and state.tier_statistics[INTERPRETED].call_count >= self.hot_threshold:
+            self.request_promotion(graph, state)
+        return results
@@ -0,0 +1,191 @@
+import asyncio
+import collections
+import concurrent.futures
+import time
+import typing
+
+import torch
+
+
+class BatchingMetrics:
+    """
+    Counters of a BatchingServer, queue latency is the time from infer() to the start of its batch.
+    """
+
+    def __init__(self, latency_window: int = 10000):
+        self.start_time = time.perf_counter()
+        self.request_count = 0
+        self.sample_count = 0
+        self.batch_count = 0
+        self.error_count = 0
+        self.busy_seconds = 0.0
+        self.queue_latencies: typing.Deque[float] = collections.deque(maxlen=latency_window)
+
+    def get_throughput(self) -> float:
+        """
+        :return: requests finished per second since start.
+        """
+        return self.request_count / max(time.perf_counter() - self.start_time, 1e-9)
+
+    def get_mean_batch_size(self) -> float:
+        return self.sample_count / self.batch_count if self.batch_count else 0.0
+
+    def get_queue_latency(self, quantile: float) -> float:
+        """
+        :return: the quantile of the recent queue latencies in seconds.
+        """
+        if not self.queue_latencies:
+            return 0.0
+        latencies = sorted(self.queue_latencies)
+        return latencies[min(int(quantile * len(latencies)), len(latencies) - 1)]
+
+    def __str__(self):
+        return (f'{self.request_count} requests in {self.batch_count} batches, '
+                f'{self.get_throughput():.1f} requests/s, mean batch size {self.get_mean_batch_size():.2f}, '
+                f'queue latency p50 {self.get_queue_latency(0.5) * 1e3:.3f} ms '
+                f'p99 {self.get_queue_latency(0.99) * 1e3:.3f} ms')
+
+
+class BatchingServer:
+    """
+    Merges concurrent infer() calls along dim 0 and runs forward once per batch.
+    A batch is closed when it holds max_batch_size samples or max_latency seconds after its first request.
+    Batches run one at a time in executor, requests arriving meanwhile form the next batch.
+    """
+
+    def __init__(self, forward: typing.Callable[..., typing.Sequence[torch.Tensor]],
+                 batch_argument_indices: typing.Sequence[int], max_batch_size: int = 32,
+                 max_latency: float = 0.002, batch_output_indices: typing.Sequence[int] = None,
+                 executor: concurrent.futures.Executor = None):
+        """
+        :param forward: a compiled forward, such as the one returned by CustomCompiler, or runtime(graph, ...).
+        :param batch_argument_indices: arguments concatenated along dim 0,
+                                       the others, such as weights, are taken from the first request of a batch.
+        :param max_batch_size: samples of a batch.
+        :param max_latency: seconds a request waits for others to join its batch.
+        :param batch_output_indices: outputs split back along dim 0, all outputs when None.
+                                     The others are returned to every request as they are.
+        :param executor: runs forward, a single worker thread when None.
+        """
+        self.forward = forward
+        self.batch_argument_indices = list(batch_argument_indices)
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.batch_output_indices = batch_output_indices
+        self.executor = executor
+        self.own_executor = executor is None
+        self.metrics = BatchingMetrics()
+        self.queue: asyncio.Queue | None = None
+        self.batcher_task: asyncio.Task | None = None
+        self.pending_request = None
+
+    async def start(self):
+        assert self.batcher_task is None, 'BatchingServer is already started'
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='plai_batching')
+        self.queue = asyncio.Queue()
+        self.metrics = BatchingMetrics()
+        self.batcher_task = asyncio.create_task(self.batch_loop())
+
+    async def stop(self):
+        if self.batcher_task is not None:
+            self.batcher_task.cancel()
+            try:
+                await self.batcher_task
+            except asyncio.CancelledError:
+                pass
+            self.batcher_task = None
+        while self.queue is not None and not self.queue.empty():
+            _, future, _ = self.queue.get_nowait()
+            future.cancel()
+        if self.pending_request is not None:
+            self.pending_request[1].cancel()
+            self.pending_request = None
+        if self.own_executor and self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+    async def infer(self, *input_tensors: torch.Tensor) -> typing.List[torch.Tensor]:
+        assert self.batcher_task is not None, 'BatchingServer is not started'
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((input_tensors, future, time.perf_counter()))
+        return await future
+
+    def get_sample_count(self, input_tensors) -> int:
+        return input_tensors[self.batch_argument_indices[0]].shape[0]
+
+    async def collect_batch(self) -> list:
+        if self.pending_request is not None:
+            first, self.pending_request = self.pending_request, None
+        else:
+            first = await self.queue.get()
+        batch = [first]
+        sample_count = self.get_sample_count(first[0])
+        deadline = first[2] + self.max_latency
+        while sample_count < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                request = self.queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self.queue.get(), timeout)
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            request_sample_count = self.get_sample_count(request[0])
+            if sample_count + request_sample_count > self.max_batch_size:
+                self.pending_request = request
+                break
+            batch.append(request)
+            sample_count += request_sample_count
+        return batch
+
+    def run_batch(self, input_tensors_list: typing.List[typing.Sequence[torch.Tensor]]) -> typing.List[list]:
+        """
+        :return: outputs of every request.
+        """
+        input_tensors = list(input_tensors_list[0])
+        for idx in self.batch_argument_indices:
+            input_tensors[idx] = torch.cat([request_inputs[idx] for request_inputs in input_tensors_list])
+        outputs = self.forward(*input_tensors)
+
+        sample_counts = [self.get_sample_count(request_inputs) for request_inputs in input_tensors_list]
+        batch_output_indices = range(len(outputs)) if self.batch_output_indices is None else self.batch_output_indices
+        results = [list(outputs) for _ in input_tensors_list]
+        for idx in batch_output_indices:
+            for result, output_part in zip(results, torch.split(outputs[idx], sample_counts)):
+                result[idx] = output_part
+        return results
+
+    async def batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self.collect_batch()
+            start_time = time.perf_counter()
+            for _, _, enqueue_time in batch:
+                self.metrics.queue_latencies.append(start_time - enqueue_time)
+            try:
+                results = await loop.run_in_executor(self.executor, self.run_batch,
+                                                     [input_tensors for input_tensors, _, _ in batch])
+            except asyncio.CancelledError:
+                for _, future, _ in batch:
+                    future.cancel()
+                raise
+            except Exception as e:
+                self.metrics.error_count += len(batch)
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.metrics.busy_seconds += time.perf_counter() - start_time
+                self.metrics.batch_count += 1
+
+            for (input_tensors, future, _), result in zip(batch, results):
+                self.metrics.request_count += 1
+                self.metrics.sample_count += self.get_sample_count(input_tensors)
+                if not future.done():
+                    future.set_result(result)
@@ -0,0 +1,67 @@
+import numpy
+
+from plai.core.core_dialect import Placeholder
+from plai.core.graph import Graph
+from plai.core.type_notation import TensorType, DType
+from plai.dialect import plai_dialect
+
+
+def build_deep_mlp_graph(layer_count: int, size: int):
+    graph = Graph('deep_mlp')
+    x = Placeholder(TensorType([size, size], DType.float32))
+    weight = Placeholder(TensorType([size, size], DType.float32))
+    graph.add_argument(x)
+    graph.add_argument(weight)
+    last = x
+    for _ in range(layer_count):
+        last = graph.add_node(plai_dialect.MatMul(last, weight))
+        last = graph.add_node(plai_dialect.Relu(last))
+    graph.add_output(last)
+    return graph
+
+
+def deep_mlp_reference(layer_count: int, x: numpy.ndarray, weight: numpy.ndarray):
+    for _ in range(layer_count):
+        x = numpy.maximum(numpy.matmul(x, weight), 0)
+    return x
+
+
+def build_multi_branch_graph(branch_count: int, size: int):
+    """
+    branch_count independent matmul/relu branches of x summed up, one weight argument per branch.
+    """
+    graph = Graph('multi_branch')
+    x = Placeholder(TensorType([size, size], DType.float32))
+    graph.add_argument(x)
+    total = None
+    for _ in range(branch_count):
+        weight = Placeholder(TensorType([size, size], DType.float32))
+        graph.add_argument(weight)
+        branch = graph.add_node(plai_dialect.Relu(graph.add_node(plai_dialect.MatMul(x, weight))))
+        branch = graph.add_node(plai_dialect.Relu(graph.add_node(plai_dialect.MatMul(branch, weight))))
+        total = branch if total is None else graph.add_node(plai_dialect.Add(total, branch))
+    graph.add_output(total)
+    return graph
+
+
+def multi_branch_reference(x: numpy.ndarray, *weights: numpy.ndarray):
+    return sum(numpy.maximum(numpy.maximum(x @ weight, 0) @ weight, 0) for weight in weights)
+
+
+def build_scaled_linear_graph(size: int):
+    """
+    relu(bias + 0.5 * (x @ x)), the shape of DecomposePlaiAddMmPass output.
+    """
+    graph = Graph('scaled_linear')
+    x = Placeholder(TensorType([size, size], DType.float32))
+    bias = Placeholder(TensorType([size], DType.float32))
+    graph.add_argument(x)
+    graph.add_argument(bias)
+    alpha = graph.add_node(plai_dialect.Constant(0.5))
+    product = graph.add_node(plai_dialect.Mul(alpha, graph.add_node(plai_dialect.MatMul(x, x))))
+    graph.add_output(graph.add_node(plai_dialect.Relu(graph.add_node(plai_dialect.Add(bias, product)))))
+    return graph
+
+
+def scaled_linear_reference(x: numpy.ndarray, bias: numpy.ndarray):
+    return numpy.maximum(bias + 0.5 * (x @ x), 0)
@@ -0,0 +1,45 @@
+import asyncio
+
+import numpy
+import torch
+
+from plai.core.core_dialect import Placeholder
+from plai.core.graph import Graph
+from plai.core.type_notation import TensorType, DType
+from plai.dialect import plai_dialect
+from plai.runtime.plai_numpy_runtime import PlaiNumpyRuntime
+from plai.serving.batching_server import BatchingServer
+
+
+def build_linear_relu_graph(in_features: int, out_features: int):
+    graph = Graph('linear_relu')
+    x = Placeholder(TensorType([1, in_features], DType.float32))
+    weight = Placeholder(TensorType([in_features, out_features], DType.float32))
+    graph.add_argument(weight)
+    graph.add_argument(x)
+    graph.add_output(graph.add_node(plai_dialect.Relu(graph.add_node(plai_dialect.MatMul(x, weight)))))
+    return graph
+
+
+def test_batching_server():
+    request_count = 16
+    graph = build_linear_relu_graph(4, 3)
+    numpy_runtime = PlaiNumpyRuntime()
+    weight = torch.randn(4, 3)
+    inputs = [torch.randn(1, 4) for _ in range(request_count)]
+
+    async def serve():
+        server = BatchingServer(lambda *input_tensors: numpy_runtime(graph, input_tensors),
+                                batch_argument_indices=[1], max_batch_size=8, max_latency=0.05)
+        async with server:
+            results = await asyncio.gather(*[server.infer(weight, x) for x in inputs])
+        return server, results
+
+    server, results = asyncio.run(serve())
+    for x, [result] in zip(inputs, results):
+        assert result.shape == (1, 3)
+        assert numpy.allclose(result.numpy(), numpy.maximum(x.numpy() @ weight.numpy(), 0), atol=1e-6)
+    print(server.metrics)
+    assert server.metrics.request_count == request_count
+    assert server.metrics.batch_count < request_count
+    assert server.metrics.get_mean_batch_size() > 1
@@ -0,0 +1,63 @@
+import numpy
+import torch
+
+from plai.core.core_dialect import Placeholder
+from plai.core.graph import Graph
+from plai.core.type_notation import TensorType, DType
+from plai.dialect import plai_dialect
+from plai.pipelines.common_subexpression_elimination import CommonSubexpressionEliminationPass
+from plai.runtime.plai_numpy_runtime import PlaiNumpyRuntime
+
+
+def build_duplicated_linear_graph(size: int):
+    """
+    relu(0.5 * (x @ w.T)) + 0.5 * (x @ w.T) with every node duplicated, as DecomposeAddMm leaves it.
+    """
+    graph = Graph('duplicated_linear')
+    x = Placeholder(TensorType([size, size], DType.float32))
+    weight = Placeholder(TensorType([size, size], DType.float32))
+    graph.add_argument(x)
+    graph.add_argument(weight)
+    branches = []
+    for _ in range(2):
+        weight_t = graph.add_node(plai_dialect.Transpose(weight, [1, 0]))
+        alpha = graph.add_node(plai_dialect.Constant(0.5))
+        branches.append(graph.add_node(plai_dialect.Mul(alpha, graph.add_node(plai_dialect.MatMul(x, weight_t)))))
+    graph.add_output(graph.add_node(plai_dialect.Add(graph.add_node(plai_dialect.Relu(branches[0])), branches[1])))
+    return graph
+
+
+def test_common_subexpression_elimination():
+    size = 8
+    graph = build_duplicated_linear_graph(size)
+    input_tensors = [torch.randn(size, size), torch.randn(size, size)]
+    expected = PlaiNumpyRuntime()(graph, input_tensors)[0].numpy()
+    node_count = len(graph)
+
+    cse_pass = CommonSubexpressionEliminationPass()
+    assert cse_pass(graph)
+    assert cse_pass.removed_count == 4
+    assert len(graph) == node_count - 4
+    add = graph.outputs.operands[0]
+    assert add.operands[0].operands[0] is add.operands[1]
+    assert numpy.allclose(PlaiNumpyRuntime()(graph, input_tensors)[0].numpy(), expected)
+
+    assert not cse_pass(graph)
+    assert cse_pass.removed_count == 0
+
+
+def test_common_subexpression_elimination_keeps_different_attrs():
+    graph = Graph('different_attrs')
+    x = Placeholder(TensorType([2, 3, 4], DType.float32))
+    graph.add_argument(x)
+    transposes = [graph.add_node(plai_dialect.Transpose(x, permutation)) for permutation in [[2, 1, 0], [1, 0, 2]]]
+    # 1, 1.0 and True compare equal but have different types.
+    constants = [graph.add_node(plai_dialect.Constant(value)) for value in [1, 1.0, True]]
+    arrays = [graph.add_node(plai_dialect.Constant(numpy.arange(3, dtype=dtype))) for dtype in ['int32', 'int64']]
+    for node in transposes + constants + arrays:
+        graph.add_output(node)
+    assert not CommonSubexpressionEliminationPass()(graph)
+
+    graph.add_output(graph.add_node(plai_dialect.Constant(numpy.arange(3, dtype='int32'))))
+    assert CommonSubexpressionEliminationPass()(graph)
+    assert graph.outputs.operands[-1] is arrays[0]
@@ -1,15 +1,32 @@
+import concurrent.futures
+
+import pytest
 import torch
 from torch._dynamo.backends.common import aot_autograd
 from torch._functorch._aot_autograd.utils import make_boxed_compiler
 
+from plai.core.node import Node
+from plai.core.pipeline import Pass
+from plai.core.type_notation import TensorType, DType
+from plai.dialect import plai_dialect
+from plai.pipelines.common_subexpression_elimination import CommonSubexpressionEliminationPass
 from plai.pipelines.convertion_dialect_torch_to_plai import TorchToPlaiPass
 from plai.pipelines.decompose_plai_addmm import DecomposePlaiAddMmPass
+from plai.pipelines.fuse_linear import FuseLinearPass
+from plai.pipelines.transpose_elimination import TransposeEliminationPass
 from plai.pl_torch_compiler import plnn_compiler
 from plai.runtime import plai_numpy_backend_runtime
 from plai.runtime.plai_numpy_runtime import PlaiNumpyRuntime
 from tests.module_pool.simple_nn import SimpleNN, check_torch_compile_forward
 
 
+@pytest.fixture(autouse=True)
+def reset_dynamo():
+    # the tests compile SimpleNN with backends of their own, without a reset dynamo would reuse the code
+    # compiled by an earlier test, or give up compiling at its cache size limit.
+    torch._dynamo.reset()
+
+
 def torch_custom_pipline(pipeline=None, runtime=None):
     model = SimpleNN()
     custom_compiler = plnn_compiler.CustomCompiler(pipeline=pipeline, runtime=runtime)
@@ -18,6 +35,7 @@ def torch_custom_pipline(pipeline=None, runtime=None):
     check_torch_compile_forward(model, compiled_model)
     print('dump compile forward:')
     print(custom_compiler.graph)
+    return custom_compiler
 
 
 def test_torch_custom_pipline():
@@ -40,8 +58,116 @@ def test_torch_custom_pipeline_plai_runtime():
     torch_custom_pipline(pipeline=pipeline, runtime=numpy_runtime)
 
 
+def test_torch_custom_pipeline_plai_cse_runtime():
+    pipeline = [TorchToPlaiPass(), DecomposePlaiAddMmPass(), CommonSubexpressionEliminationPass()]
+    torch_custom_pipline(pipeline=pipeline, runtime=PlaiNumpyRuntime())
+
+
+def test_torch_custom_pipeline_plai_transpose_elimination_runtime():
+    pipeline = [TorchToPlaiPass(), DecomposePlaiAddMmPass(), TransposeEliminationPass()]
+    torch_custom_pipline(pipeline=pipeline, runtime=PlaiNumpyRuntime())
+
+
+def test_torch_custom_pipeline_plai_fuse_linear_runtime():
+    pipeline = [TorchToPlaiPass(), DecomposePlaiAddMmPass(), TransposeEliminationPass(), FuseLinearPass()]
+    custom_compiler = torch_custom_pipline(pipeline=pipeline, runtime=PlaiNumpyRuntime())
+    assert any(isinstance(node, plai_dialect.FusedLinear) for node in custom_compiler.graph)
+    assert not any(isinstance(node, plai_dialect.MatMul) for node in custom_compiler.graph)
+
+
 def test_torch_custom_pipeline_plai_backend_runtime():
     pipeline = [TorchToPlaiPass(), DecomposePlaiAddMmPass()]
     backend = plai_numpy_backend_runtime.Backend()
     numpy_runtime = plai_numpy_backend_runtime.PlaiNumpyBackendRuntime(backend)
     torch_custom_pipline(pipeline=pipeline, runtime=numpy_runtime)
+
+
+def test_torch_custom_pipeline_static_type():
+    pipeline = [TorchToPlaiPass(), DecomposePlaiAddMmPass()]
+    custom_compiler = torch_custom_pipline(pipeline=pipeline)
+    graph = custom_compiler.graph
+    argument_types = [Node.get_type_notation(arg) for arg in graph.arguments]
+    assert argument_types == [
+        TensorType([5, 10], DType.float32),
+        TensorType([5], DType.float32),
+        TensorType([1, 10], DType.float32),
+        TensorType([1, 5], DType.float32),
+        TensorType([1], DType.float32),
+    ]
+    graph.update_type_notation()
+    assert all(isinstance(Node.get_type_notation(node), TensorType) for node in graph if node is not graph.outputs)
+    assert Node.get_type_notation(graph.outputs.operands[0]) == TensorType([1, 1], DType.float32)
+
+
+def test_torch_custom_pipeline_concurrent_calls():
+    pipeline = [TorchToPlaiPass(), DecomposePlaiAddMmPass()]
+    custom_compiler = plnn_compiler.CustomCompiler(pipeline=pipeline, runtime=PlaiNumpyRuntime())
+    aot_backend = aot_autograd(fw_compiler=make_boxed_compiler(custom_compiler), bw_compiler=None)
+    model = SimpleNN()
+    compiled_model = torch.compile(model, backend=aot_backend)
+    inputs = [torch.randn(1, 10) for _ in range(64)]
+
+    def infer(x):
+        # grad mode is thread local and guarded by dynamo, other modes would compile again in the workers.
+        with torch.no_grad():
+            return compiled_model(x)
+
+    infer(inputs[0])
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(infer, inputs))
+    with torch.no_grad():
+        for x, result in zip(inputs, results):
+            assert torch.allclose(result, model(x), atol=1e-6)
+
+
+def test_torch_custom_pipeline_freeze():
+    pipeline = [TorchToPlaiPass(), DecomposePlaiAddMmPass()]
+    custom_compiler = plnn_compiler.CustomCompiler(pipeline=pipeline, runtime=PlaiNumpyRuntime(), freeze=True)
+    aot_backend = aot_autograd(fw_compiler=make_boxed_compiler(custom_compiler), bw_compiler=None)
+    model = SimpleNN()
+    compiled_model = torch.compile(model, backend=aot_backend)
+
+    with torch.no_grad():
+        for _ in range(2):
+            x = torch.randn(1, 10)
+            assert torch.allclose(compiled_model(x), model(x), atol=1e-6)
+    graph = custom_compiler.graph
+    # the transposes of the weights are folded, only the input is still used.
+    assert not any(isinstance(node, plai_dialect.Transpose) for node in graph)
+    assert [arg.get_use_count() > 0 for arg in graph.arguments].count(True) == 1
+
+
+def test_torch_custom_pipeline_async_compile():
+    pipeline = [TorchToPlaiPass(), DecomposePlaiAddMmPass()]
+    custom_compiler = plnn_compiler.CustomCompiler(pipeline=pipeline, runtime=PlaiNumpyRuntime(), async_compile=True)
+    aot_backend = aot_autograd(fw_compiler=make_boxed_compiler(custom_compiler), bw_compiler=None)
+    model = SimpleNN()
+    compiled_model = torch.compile(model, backend=aot_backend)
+    x = torch.randn(1, 10)
+
+    with torch.no_grad():
+        # the first calls run eagerly while the graph compiles.
+        assert torch.allclose(compiled_model(x), model(x), atol=1e-6)
+        custom_compiler.shutdown()
+        assert custom_compiler.get_compile_queue_depth() == 0
+        assert custom_compiler.compile_count == 1 and not custom_compiler.compile_errors
+        assert torch.allclose(compiled_model(x), model(x), atol=1e-6)
+
+
+def test_custom_compiler_async_compile_failure():
+    class FailingPass(Pass):
+        def __call__(self, graph):
+            raise RuntimeError('unsupported graph')
+
+    custom_compiler = plnn_compiler.CustomCompiler(pipeline=[FailingPass()], runtime=PlaiNumpyRuntime(),
+                                                   async_compile=True)
+    model = SimpleNN()
+    gm = torch.fx.symbolic_trace(model)
+    x = torch.randn(1, 10)
+    with pytest.warns(UserWarning):
+        forward = custom_compiler(gm, (x,))
+        forward.compile_future.result()
+    assert custom_compiler.get_compile_queue_depth() == 0
+    assert len(custom_compiler.compile_errors) == 1
+    assert torch.allclose(forward(x), model(x))
+    custom_compiler.shutdown()
@@ -0,0 +1,75 @@
+import numpy
+import torch
+
+from plai.core.core_dialect import Placeholder
+from plai.core.graph import Graph
+from plai.core.node import Node
+from plai.core.type_notation import TensorType, DType, ScalarType
+from plai.dialect import plai_dialect
+from plai.pipelines.constant_folding import ConstantFoldingPass, bind_constant_arguments
+from plai.pipelines.dead_code_elimination import DeadCodeEliminationPass
+from plai.runtime.plai_numpy_runtime import PlaiNumpyRuntime
+
+
+def build_linear_graph(size: int):
+    """
+    x @ weight.T + 0.5 * bias, the weight and bias only subgraphs fold once they are bound.
+    """
+    graph = Graph('linear')
+    for shape in [[size, size], [size, size], [size]]:
+        graph.add_argument(Placeholder(TensorType(shape, DType.float32)))
+    x, weight, bias = graph.arguments
+    weight_t = graph.add_node(plai_dialect.Transpose(weight, [1, 0]))
+    scaled_bias = graph.add_node(plai_dialect.Mul(graph.add_node(plai_dialect.Constant(0.5)), bias))
+    graph.add_output(graph.add_node(plai_dialect.Add(graph.add_node(plai_dialect.MatMul(x, weight_t)), scaled_bias)))
+    return graph
+
+
+def test_constant_folding():
+    size = 8
+    graph = build_linear_graph(size)
+    input_tensors = [torch.randn(size, size), torch.randn(size, size), torch.randn(size)]
+    expected = PlaiNumpyRuntime()(graph, input_tensors)[0].numpy()
+
+    folding_pass = ConstantFoldingPass()
+    assert not folding_pass(graph)
+    assert bind_constant_arguments(graph, {1: input_tensors[1].numpy(), 2: input_tensors[2].numpy()}) == 2
+    assert folding_pass(graph)
+    assert folding_pass.folded_count == 2
+    DeadCodeEliminationPass()(graph)
+    assert [type(node) for node in graph] == [plai_dialect.Constant, plai_dialect.Constant, plai_dialect.MatMul,
+                                              plai_dialect.Add, type(graph.outputs)]
+    weight_t = graph.first_node.get_value()
+    assert weight_t.flags.c_contiguous
+    assert numpy.array_equal(weight_t, input_tensors[1].numpy().T)
+    assert all(arg.get_use_count() == 0 for arg in graph.arguments[1:])
+
+    # the bound values are used, whatever is passed for the bound arguments.
+    input_tensors[1:] = [torch.zeros(size, size), torch.zeros(size)]
+    assert numpy.allclose(PlaiNumpyRuntime()(graph, input_tensors)[0].numpy(), expected)
+
+
+def test_constant_folding_scalars():
+    size = 4
+    graph = Graph('scalars')
+    x = Placeholder(TensorType([size], DType.float32))
+    graph.add_argument(x)
+    factor = graph.add_node(plai_dialect.Mul(graph.add_node(plai_dialect.Constant(2)),
+                                             graph.add_node(plai_dialect.Constant(3))))
+    graph.add_output(graph.add_node(plai_dialect.Mul(factor, x)))
+    # the insert point is folded away, nodes are then added where it was.
+    graph.set_insert_point_before(factor)
+
+    folding_pass = ConstantFoldingPass()
+    assert folding_pass(graph)
+    assert folding_pass.folded_count == 1
+    factor = graph.outputs.operands[0].operands[0]
+    assert type(factor.get_value()) is int and factor.get_value() == 6
+    assert isinstance(Node.get_type_notation(factor), ScalarType)
+    assert graph.insert_point is graph.outputs.operands[0]
+    graph.add_node(plai_dialect.Constant(1.0))
+    DeadCodeEliminationPass()(graph)
+    assert [type(node) for node in graph] == [plai_dialect.Constant, plai_dialect.Mul, type(graph.outputs)]
+
+    input_tensors = [torch.randn(size)]
+    assert numpy.allclose(PlaiNumpyRuntime()(graph, input_tensors)[0].numpy(), 6 * input_tensors[0].numpy())
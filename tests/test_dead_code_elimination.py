@@ -0,0 +1,57 @@
+import pytest
+
+from plai.core.core_dialect import Placeholder
+from plai.core.graph import Graph
+from plai.core.pipeline import Pipeline, FnPass
+from plai.core.type_notation import TensorType, DType
+from plai.dialect import plai_dialect
+from plai.pipelines.dead_code_elimination import DeadCodeEliminationPass
+
+
+def build_graph_with_dead_nodes():
+    graph = Graph('dead_nodes')
+    x = Placeholder(TensorType([4, 4], DType.float32))
+    graph.add_argument(x)
+    relu = graph.add_node(plai_dialect.Relu(x))
+    # a dead chain, each node only used by the next one.
+    dead = graph.add_node(plai_dialect.Transpose(x, [1, 0]))
+    dead = graph.add_node(plai_dialect.Mul(graph.add_node(plai_dialect.Constant(2.0)), dead))
+    graph.add_node(plai_dialect.MatMul(dead, relu))
+    graph.add_output(relu)
+    return graph, relu
+
+
+def test_dead_code_elimination():
+    graph, relu = build_graph_with_dead_nodes()
+    dce_pass = DeadCodeEliminationPass()
+    assert dce_pass(graph)
+    assert dce_pass.removed_count == 4
+    assert graph.nodes == [relu, graph.outputs]
+    assert relu.users == [graph.outputs]
+    assert not dce_pass(graph)
+
+
+def test_graph_erase_node():
+    graph, relu = build_graph_with_dead_nodes()
+    with pytest.raises(AssertionError):
+        graph.erase_node(relu)
+    matmul = graph.outputs.prev_node
+    graph.erase_node(matmul)
+    assert matmul.dead and matmul.operands == ()
+    assert relu.users == [graph.outputs]
+
+
+def test_pipeline_cleanup():
+    graph, relu = build_graph_with_dead_nodes()
+    pipeline = Pipeline('cleanup', [FnPass(lambda g: False)], cleanup=DeadCodeEliminationPass())
+    assert not pipeline(graph)
+    assert len(graph) == 6
+
+    def replace_relu(g: Graph) -> bool:
+        g.set_insert_point_before(g.outputs)
+        g.outputs.set_operand(0, g.add_node(plai_dialect.Relu(relu)))
+        return True
+
+    pipeline = Pipeline('cleanup', [FnPass(replace_relu)], cleanup=DeadCodeEliminationPass())
+    assert pipeline(graph)
+    assert len(graph) == 3
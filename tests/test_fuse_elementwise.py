@@ -0,0 +1,135 @@
+import os
+import warnings
+
+import numpy
+import pytest
+import torch
+
+from plai.core.core_dialect import Placeholder
+from plai.core.graph import Graph
+from plai.core.type_notation import TensorType, DType
+from plai.dialect import plai_dialect
+from plai.pipelines.fuse_elementwise import FuseElementwisePass
+from plai.runtime.native_runtime import NativeRuntime, NativeFusedKernel, NativeLibraryCache, find_c_compiler, \
+    get_host_cpu_id
+from plai.runtime.numpy_kernels import numpy_kernel_registry
+from plai.runtime.plai_numpy_runtime import PlaiNumpyRuntime
+from tests.module_pool.plai_graphs import build_scaled_linear_graph, scaled_linear_reference
+
+
+def test_fuse_elementwise_pass():
+    size = 8
+    graph = build_scaled_linear_graph(size)
+    relu = graph.outputs.operands[0]
+    # the insert point is erased with the region, nodes are then added where it was.
+    graph.set_insert_point_before(relu.operands[0])
+    assert FuseElementwisePass()(graph)
+    assert graph.insert_point is graph.outputs.operands[0]
+    assert [type(node) for node in graph][:2] == [plai_dialect.MatMul, plai_dialect.FusedElementwise]
+    assert len(list(graph)) == 3
+    fused = graph.outputs.operands[0]
+    assert isinstance(fused, plai_dialect.FusedElementwise)
+    assert fused.get_program() == (('mul', (('const', 0.5), ('input', 1))),
+                                   ('add', (('input', 0), ('step', 0))),
+                                   ('relu', (('step', 1),)))
+    assert not FuseElementwisePass()(graph)
+
+    input_tensors = [torch.randn(size, size), torch.randn(size)]
+    expected = scaled_linear_reference(input_tensors[0].numpy(), input_tensors[1].numpy())
+    for numpy_runtime in [PlaiNumpyRuntime(), PlaiNumpyRuntime(plan_memory=False)]:
+        assert numpy.allclose(numpy_runtime(graph, input_tensors)[0].numpy(), expected)
+
+
+@pytest.mark.skipif(find_c_compiler() is None, reason='no C compiler')
+def test_native_runtime(tmp_path):
+    size = 8
+    graph = build_scaled_linear_graph(size)
+    FuseElementwisePass()(graph)
+    native_runtime = NativeRuntime(cache_dir=str(tmp_path))
+    native_runtime.prepare(graph)
+    assert native_runtime.library_cache.build_count == 1
+    assert len([name for name in os.listdir(tmp_path) if name.endswith('.so')]) == 1
+
+    input_tensors = [torch.randn(size, size), torch.randn(size)]
+    expected = scaled_linear_reference(input_tensors[0].numpy(), input_tensors[1].numpy())
+    assert numpy.allclose(native_runtime(graph, input_tensors)[0].numpy(), expected)
+    assert numpy.allclose(native_runtime.run_interpreted(graph, input_tensors)[0].numpy(), expected)
+    # float64 inputs do not match the lowered loop and run the numpy kernel.
+    input_tensors = [tensor.double() for tensor in input_tensors]
+    expected = scaled_linear_reference(input_tensors[0].numpy(), input_tensors[1].numpy())
+    assert numpy.allclose(native_runtime.run_interpreted(graph, input_tensors)[0].numpy(), expected)
+
+    # a second runtime with the same cache loads the built library.
+    other_runtime = NativeRuntime(cache_dir=str(tmp_path))
+    other_graph = build_scaled_linear_graph(size)
+    FuseElementwisePass()(other_graph)
+    other_runtime.prepare(other_graph)
+    assert other_runtime.library_cache.build_count == 0
+
+
+@pytest.mark.skipif(find_c_compiler() is None, reason='no C compiler')
+def test_native_runtime_non_finite(tmp_path):
+    # relu(x + bias) + inf is nan where x is nan, like numpy, and the inf constant compiles.
+    size = 4
+    graph = Graph('non_finite')
+    x = Placeholder(TensorType([size, size], DType.float32))
+    bias = Placeholder(TensorType([size], DType.float32))
+    graph.add_argument(x)
+    graph.add_argument(bias)
+    activated = graph.add_node(plai_dialect.Relu(graph.add_node(plai_dialect.Add(x, bias))))
+    graph.add_output(graph.add_node(plai_dialect.Add(activated, graph.add_node(plai_dialect.Constant(float('inf'))))))
+    assert FuseElementwisePass()(graph)
+
+    native_runtime = NativeRuntime(cache_dir=str(tmp_path))
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        native_runtime.prepare(graph)
+    assert native_runtime.library_cache.build_count == 1
+    assert native_runtime.library_cache.host_cpu_id == get_host_cpu_id()
+
+    input_tensors = [torch.randn(size, size), torch.randn(size)]
+    input_tensors[0][0, 0] = float('nan')
+    expected = PlaiNumpyRuntime()(graph, input_tensors)[0].numpy()
+    assert numpy.isnan(expected[0, 0])
+    assert numpy.array_equal(native_runtime(graph, input_tensors)[0].numpy(), expected, equal_nan=True)
+
+
+@pytest.mark.skipif(find_c_compiler() is None, reason='no C compiler')
+def test_native_kernel_source_grows_linearly(tmp_path):
+    # relu refers to its operand three times, steps are locals so the source does not grow as 3^k.
+    step_count, size = 16, 4
+    graph = Graph('add_relu_chain')
+    x = Placeholder(TensorType([size], DType.float32))
+    bias = Placeholder(TensorType([size], DType.float32))
+    graph.add_argument(x)
+    graph.add_argument(bias)
+    value = x
+    for _ in range(step_count // 2):
+        value = graph.add_node(plai_dialect.Relu(graph.add_node(plai_dialect.Add(value, bias))))
+    graph.add_output(value)
+    assert FuseElementwisePass()(graph)
+    fused = graph.outputs.operands[0]
+    assert len(fused.get_program()) == step_count
+
+    library_cache = NativeLibraryCache(find_c_compiler(), str(tmp_path))
+    kernel = NativeFusedKernel(fused, library_cache, numpy_kernel_registry.create_kernel(fused))
+    assert len(kernel.source) < 200 * step_count
+    assert library_cache.build_count == 1
+
+    x_value, bias_value = numpy.random.randn(size).astype(numpy.float32), numpy.random.randn(size).astype(numpy.float32)
+    expected = x_value
+    for _ in range(step_count // 2):
+        expected = numpy.maximum(expected + bias_value, 0)
+    assert numpy.allclose(kernel(x_value, bias_value), expected)
+
+
+def test_native_runtime_without_compiler():
+    size = 8
+    graph = build_scaled_linear_graph(size)
+    FuseElementwisePass()(graph)
+    with pytest.warns(UserWarning):
+        native_runtime = NativeRuntime(compiler='/nonexistent/cc')
+    assert native_runtime.library_cache is None
+    input_tensors = [torch.randn(size, size), torch.randn(size)]
+    expected = scaled_linear_reference(input_tensors[0].numpy(), input_tensors[1].numpy())
+    assert numpy.allclose(native_runtime(graph, input_tensors)[0].numpy(), expected)
@@ -0,0 +1,107 @@
+import numpy
+import torch
+
+from plai.core.core_dialect import Placeholder, Output
+from plai.core.graph import Graph
+from plai.core.node import Node
+from plai.core.type_notation import TensorType, DType
+from plai.dialect import plai_dialect
+from plai.pipelines.fuse_linear import FuseLinearPass
+from plai.runtime import plai_numpy_backend_runtime
+from plai.runtime.plai_numpy_runtime import PlaiNumpyRuntime
+from plai.runtime.python_codegen_runtime import PythonCodegenRuntime
+from tests.module_pool.plai_graphs import build_scaled_linear_graph, scaled_linear_reference
+
+
+def build_transposed_linear_graph(rows: int, size: int):
+    """
+    0.5 * (x @ w, transpose_b) + 2 * bias without relu, the product has a second user.
+    """
+    graph = Graph('transposed_linear')
+    x = Placeholder(TensorType([rows, size], DType.float32))
+    weight = Placeholder(TensorType([size, size], DType.float32))
+    bias = Placeholder(TensorType([size], DType.float32))
+    for arg in [x, weight, bias]:
+        graph.add_argument(arg)
+    product = graph.add_node(plai_dialect.MatMul(x, weight, transpose_b=True))
+    scaled = graph.add_node(plai_dialect.Mul(graph.add_node(plai_dialect.Constant(0.5)), product))
+    scaled_bias = graph.add_node(plai_dialect.Mul(graph.add_node(plai_dialect.Constant(2.0)), bias))
+    graph.add_output(graph.add_node(plai_dialect.Add(scaled_bias, scaled)))
+    graph.add_output(graph.add_node(plai_dialect.Relu(graph.add_node(plai_dialect.MatMul(x, weight)))))
+    return graph
+
+
+def check_runtimes(graph: Graph, input_tensors: list, expected_list: list):
+    backend_runtime = plai_numpy_backend_runtime.PlaiNumpyBackendRuntime(plai_numpy_backend_runtime.Backend())
+    tiled_runtime = PlaiNumpyRuntime(intra_op_threads=2)
+    for runtime in [PlaiNumpyRuntime(), tiled_runtime, PythonCodegenRuntime(), backend_runtime]:
+        for result, expected in zip(runtime(graph, input_tensors), expected_list):
+            assert numpy.allclose(result.numpy(), expected, rtol=1e-5, atol=1e-4)
+    tiled_runtime.shutdown()
+    for result, expected in zip(PlaiNumpyRuntime().run_interpreted(graph, input_tensors), expected_list):
+        assert numpy.allclose(result.numpy(), expected, rtol=1e-5, atol=1e-4)
+
+
+def test_fuse_linear():
+    size = 8
+    graph = build_scaled_linear_graph(size)
+    input_tensors = [torch.randn(size, size), torch.randn(size)]
+
+    fuse_pass = FuseLinearPass()
+    assert fuse_pass(graph)
+    assert fuse_pass.fused_count == 1
+    assert [type(node) for node in graph] == [plai_dialect.FusedLinear, Output]
+    fused = graph.outputs.operands[0]
+    assert fused.get_bias() is graph.arguments[1]
+    assert (fused.get_alpha(), fused.get_beta(), fused.get_relu(), fused.get_transpose_b()) == (0.5, 1, True, False)
+    assert Node.get_type_notation(fused) == TensorType([size, size], DType.float32)
+    assert not fuse_pass(graph)
+
+    check_runtimes(graph, input_tensors, [scaled_linear_reference(*[tensor.numpy() for tensor in input_tensors])])
+
+
+def test_fuse_linear_transpose_b_and_beta():
+    # enough rows for the kernel to compute the result in several blocks.
+    rows, size = 4096, 16
+    graph = build_transposed_linear_graph(rows, size)
+    input_tensors = [torch.randn(rows, size), torch.randn(size, size), torch.randn(size)]
+    x, weight, bias = [tensor.numpy() for tensor in input_tensors]
+    expected_list = [0.5 * (x @ weight.T) + 2 * bias, numpy.maximum(x @ weight, 0)]
+
+    fuse_pass = FuseLinearPass()
+    assert fuse_pass(graph)
+    assert fuse_pass.fused_count == 2
+    assert not any(isinstance(node, (plai_dialect.MatMul, plai_dialect.Constant)) for node in graph)
+    fused_list = [node for node in graph if isinstance(node, plai_dialect.FusedLinear)]
+    assert [(node.get_alpha(), node.get_beta(), node.get_relu(), node.get_transpose_b()) for node in fused_list] == [
+        (0.5, 2.0, False, True), (1, 1, True, False)]
+    assert fused_list[0].get_bias() is graph.arguments[2]
+    assert fused_list[1].get_bias() is None
+
+    check_runtimes(graph, input_tensors, expected_list)
+
+
+def test_fuse_linear_erased_insert_point():
+    size = 8
+    graph = build_scaled_linear_graph(size)
+    matmul = next(node for node in graph if isinstance(node, plai_dialect.MatMul))
+    graph.set_insert_point_before(matmul)
+
+    assert FuseLinearPass()(graph)
+    fused = graph.outputs.operands[0]
+    assert graph.insert_point is fused
+    relu = graph.add_node(plai_dialect.Relu(graph.arguments[0]))
+    assert graph.nodes == [relu, fused, graph.outputs]
+
+
+def test_fuse_linear_keeps_shared_product():
+    size = 8
+    graph = Graph('shared_product')
+    x = Placeholder(TensorType([size, size], DType.float32))
+    graph.add_argument(x)
+    product = graph.add_node(plai_dialect.MatMul(x, x))
+    graph.add_output(graph.add_node(plai_dialect.Relu(product)))
+    graph.add_output(product)
+
+    assert not FuseLinearPass()(graph)
+    assert not any(isinstance(node, plai_dialect.FusedLinear) for node in graph)
@@ -0,0 +1,130 @@
+from plai.core.core_dialect import Placeholder
+from plai.core.graph import Graph
+from plai.core.type_notation import UnknownType
+from plai.dialect import plai_dialect
+
+
+def build_relu_chain(length: int):
+    graph = Graph('relu_chain')
+    arg = Placeholder(UnknownType())
+    graph.add_argument(arg)
+    last = arg
+    chain = []
+    for _ in range(length):
+        last = graph.add_node(plai_dialect.Relu(last))
+        chain.append(last)
+    graph.add_output(last)
+    return graph, chain
+
+
+def test_graph_insert_and_remove():
+    graph, chain = build_relu_chain(3)
+    assert graph.nodes == chain + [graph.outputs]
+    assert len(graph) == 4
+
+    graph.set_insert_point_after(chain[0])
+    new_node = graph.add_node(plai_dialect.Relu(chain[0]))
+    graph.set_insert_point_before(chain[0])
+    first_node = graph.add_node(plai_dialect.Relu(graph.arguments[0]))
+    assert graph.nodes == [first_node, chain[0], new_node, chain[1], chain[2], graph.outputs]
+
+    graph.replace_all_uses_with(new_node, chain[0])
+    graph.remove_node(new_node)
+    assert graph.nodes == [first_node, chain[0], chain[1], chain[2], graph.outputs]
+    assert len(graph) == 5
+
+
+def test_graph_iteration_while_changing():
+    graph, chain = build_relu_chain(4)
+    visited = []
+    for node in graph:
+        visited.append(node)
+        if node is chain[0]:
+            # replace the next node with a new one, the new one should be visited.
+            graph.set_insert_point_after(chain[1])
+            new_node = graph.add_node(plai_dialect.Relu(chain[0]))
+            graph.replace_all_uses_with(chain[1], new_node)
+            graph.remove_node(chain[1])
+        elif node is chain[2]:
+            # remove the current node.
+            graph.replace_all_uses_with(chain[2], chain[2].operands[0])
+            graph.remove_node(chain[2])
+
+    assert chain[1] not in visited
+    assert visited[-1] is graph.outputs
+    assert graph.nodes == [chain[0], visited[1], chain[3], graph.outputs]
+
+
+def test_graph_insert_point_follows_removed_node():
+    graph, chain = build_relu_chain(2)
+    graph.set_insert_point_before(chain[1])
+    graph.replace_all_uses_with(chain[1], chain[0])
+    graph.remove_node(chain[1])
+    new_node = graph.add_node(plai_dialect.Relu(chain[0]))
+    assert graph.nodes == [chain[0], new_node, graph.outputs]
+
+
+def test_graph_restore_removed_insert_point():
+    graph, chain = build_relu_chain(3)
+    insert_point = chain[1]
+    for node in [chain[2], chain[1]]:
+        graph.replace_all_uses_with(node, node.operands[0])
+        graph.erase_node(node)
+    graph.restore_insert_point(insert_point)
+    assert graph.insert_point is graph.outputs
+    new_node = graph.add_node(plai_dialect.Relu(chain[0]))
+    assert graph.nodes == [chain[0], new_node, graph.outputs]
+
+
+def test_node_set_attr():
+    graph, chain = build_relu_chain(2)
+    chain[0].set_attr('tag', 1)
+    assert dict(chain[0].attrs) == {'tag': 1}
+    # the attrs shared by nodes without attrs are left empty.
+    assert dict(chain[1].attrs) == {}
+    transpose = plai_dialect.Transpose(chain[1])
+    transpose.set_attr('permutation', [0, 1])
+    assert transpose.attrs['permutation'] == [0, 1]
+
+
+def test_graph_use_list():
+    graph, chain = build_relu_chain(2)
+    arg = graph.arguments[0]
+    graph.set_insert_point_before(graph.outputs)
+    add = graph.add_node(plai_dialect.Add(chain[0], chain[0]))
+    mul = graph.add_node(plai_dialect.Mul(add, chain[0]))
+    assert list(chain[0].uses) == [(chain[1], 0), (add, 0), (add, 1), (mul, 1)]
+    assert chain[0].users == [chain[1], add, mul]
+    assert chain[0].get_use_count() == 4
+    assert mul.get_use_count() == 0
+    assert chain[1].has_single_use()
+
+    graph.replace_all_uses_with(chain[0], arg)
+    assert chain[0].get_use_count() == 0
+    assert add.operands == (arg, arg)
+    assert mul.operands == (add, arg)
+    assert list(arg.uses) == [(chain[0], 0), (chain[1], 0), (add, 0), (add, 1), (mul, 1)]
+
+
+def test_graph_clone():
+    graph, chain = build_relu_chain(3)
+    graph.set_insert_point_before(graph.outputs)
+    add = graph.add_node(plai_dialect.Add(chain[0], chain[2]))
+    graph.outputs.set_operand(0, add)
+    node_mapping_dict = {}
+    cloned = graph.clone(node_mapping_dict)
+
+    assert len(cloned) == len(graph)
+    assert [type(node) for node in cloned] == [type(node) for node in graph]
+    assert all(node_mapping_dict[node] is not node for node in graph)
+    cloned_add = node_mapping_dict[add]
+    assert cloned_add.operands == (node_mapping_dict[chain[0]], node_mapping_dict[chain[2]])
+    assert cloned.outputs.operands == (cloned_add,)
+    assert node_mapping_dict[chain[0]].users == [node_mapping_dict[chain[1]], cloned_add]
+
+    # changing the clone leaves the original as it was.
+    cloned.replace_all_uses_with(cloned_add, node_mapping_dict[chain[2]])
+    cloned.remove_node(cloned_add)
+    assert graph.outputs.operands == (add,)
+    assert chain[0].users == [chain[1], add]
+    assert len(cloned) == len(graph) - 1
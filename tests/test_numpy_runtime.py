@@ -0,0 +1,323 @@
+import concurrent.futures
+
+import numpy
+import pytest
+import torch
+
+from plai.core.core_dialect import Placeholder
+from plai.core.graph import Graph
+from plai.core.pipeline import FnPass
+from plai.core.type_notation import TensorType, DType
+from plai.dialect import plai_dialect
+from plai.runtime import plai_numpy_backend_runtime
+from plai.runtime.kernel_registry import KernelRegistry, INPLACE
+from plai.runtime.numpy_kernels import relu_inplace, numpy_kernel_registry
+from plai.runtime.parallel_kernels import ThreadBudget, TileRunner, create_tiled_elementwise
+from plai.runtime.plai_numpy_runtime import PlaiNumpyRuntime
+from plai.runtime.python_codegen_runtime import PythonCodegenRuntime
+from plai.runtime.tiered_runtime import TieredRuntime, INTERPRETED, OPTIMIZED
+from tests.module_pool.plai_graphs import build_deep_mlp_graph, deep_mlp_reference, build_multi_branch_graph, \
+    multi_branch_reference, build_scaled_linear_graph, scaled_linear_reference
+
+
+def test_numpy_runtime_release_early():
+    layer_count, size = 20, 64
+    graph = build_deep_mlp_graph(layer_count, size)
+    input_tensors = [torch.randn(size, size), torch.randn(size, size) / size]
+    expected = deep_mlp_reference(layer_count, input_tensors[0].numpy(), input_tensors[1].numpy())
+    buffer_bytes = size * size * 4
+
+    numpy_runtime = PlaiNumpyRuntime(track_memory=True, plan_memory=False)
+    [result] = numpy_runtime(graph, input_tensors)
+    assert numpy.allclose(result.numpy(), expected)
+    assert numpy_runtime.memory_statistics.peak_bytes <= 2 * buffer_bytes
+    kernels = [kernel for kernel, *_ in numpy_runtime.get_plan(graph).instructions]
+    assert kernels.count(relu_inplace) == layer_count
+    assert numpy.allclose(numpy_runtime.run_interpreted(graph, input_tensors)[0].numpy(), expected)
+
+    backend = plai_numpy_backend_runtime.Backend()
+    backend_runtime = plai_numpy_backend_runtime.PlaiNumpyBackendRuntime(backend)
+    [result] = backend_runtime(graph, input_tensors)
+    assert numpy.allclose(result.numpy(), expected)
+    assert backend.memory_statistics.peak_bytes <= 2 * buffer_bytes
+
+
+def test_numpy_runtime_inplace_keeps_live_view():
+    # relu(m) is the last direct use of m, but the transpose of m is still read after it.
+    size = 3
+    graph = Graph('live_view')
+    x = Placeholder(TensorType([size, size], DType.float32))
+    graph.add_argument(x)
+    product = graph.add_node(plai_dialect.MatMul(x, x))
+    transposed = graph.add_node(plai_dialect.Transpose(product))
+    activated = graph.add_node(plai_dialect.Relu(product))
+    graph.add_output(graph.add_node(plai_dialect.Add(transposed, activated)))
+    input_tensors = [torch.randn(size, size)]
+    x_value = input_tensors[0].numpy()
+    expected = (x_value @ x_value).T + numpy.maximum(x_value @ x_value, 0)
+
+    numpy_runtime = PlaiNumpyRuntime(plan_memory=False)
+    assert numpy.allclose(numpy_runtime(graph, input_tensors)[0].numpy(), expected)
+    kernels = [kernel for kernel, *_ in numpy_runtime.get_plan(graph).instructions]
+    assert relu_inplace not in kernels
+    backend_runtime = plai_numpy_backend_runtime.PlaiNumpyBackendRuntime(plai_numpy_backend_runtime.Backend())
+    assert numpy.allclose(backend_runtime(graph, input_tensors)[0].numpy(), expected)
+
+
+def test_numpy_runtime_memory_plan():
+    layer_count, size = 20, 64
+    graph = build_deep_mlp_graph(layer_count, size)
+    buffer_bytes = size * size * 4
+
+    numpy_runtime = PlaiNumpyRuntime()
+    for _ in range(2):
+        input_tensors = [torch.randn(size, size), torch.randn(size, size) / size]
+        expected = deep_mlp_reference(layer_count, input_tensors[0].numpy(), input_tensors[1].numpy())
+        [result] = numpy_runtime(graph, input_tensors)
+        assert numpy.allclose(result.numpy(), expected)
+
+    memory_plan = graph.metadata['memory_plan']
+    # the output is not planned, the other matmul/relu results take turns in two buffers.
+    assert len(memory_plan.offset_dict) == 2 * layer_count - 1
+    assert memory_plan.arena_size == 2 * buffer_bytes
+    assert f'memory_plan: {memory_plan}' in str(graph)
+
+    # other shapes run without the arena.
+    input_tensors = [torch.randn(3, size), torch.randn(size, size) / size]
+    expected = deep_mlp_reference(layer_count, input_tensors[0].numpy(), input_tensors[1].numpy())
+    assert numpy.allclose(numpy_runtime(graph, input_tensors)[0].numpy(), expected)
+
+
+def test_kernel_registry_lookup():
+    class LeakyRelu(plai_dialect.Relu):
+        pass
+
+    arg = Placeholder(TensorType([2, 3], DType.float64))
+    registry = KernelRegistry()
+    registry.register(plai_dialect.Relu)(lambda node: 'any dtype')
+    registry.register(plai_dialect.Relu, dtype=DType.float32)(lambda node: 'float32')
+    assert registry.create_kernel(plai_dialect.Relu(arg)) == 'any dtype'
+    assert registry.create_kernel(LeakyRelu(arg)) == 'any dtype'
+    float32_arg = Placeholder(TensorType([2, 3], DType.float32))
+    assert registry.create_kernel(LeakyRelu(float32_arg)) == 'float32'
+    assert not registry.supports_inplace(plai_dialect.Relu(arg))
+    registry.register(LeakyRelu, INPLACE)(lambda node, idx: f'inplace {idx}')
+    assert registry.create_kernel(LeakyRelu(arg), 0) == 'inplace 0'
+
+
+def test_numpy_runtime_constant_and_mul():
+    size = 8
+    graph = build_scaled_linear_graph(size)
+    input_tensors = [torch.randn(size, size), torch.randn(size)]
+    expected = scaled_linear_reference(input_tensors[0].numpy(), input_tensors[1].numpy())
+
+    for numpy_runtime in [PlaiNumpyRuntime(), PlaiNumpyRuntime(plan_memory=False)]:
+        assert numpy.allclose(numpy_runtime(graph, input_tensors)[0].numpy(), expected)
+        assert numpy.allclose(numpy_runtime.run_interpreted(graph, input_tensors)[0].numpy(), expected)
+    backend_runtime = plai_numpy_backend_runtime.PlaiNumpyBackendRuntime(plai_numpy_backend_runtime.Backend())
+    assert backend_runtime.kernel_registry is numpy_kernel_registry
+    assert numpy.allclose(backend_runtime(graph, input_tensors)[0].numpy(), expected)
+
+
+def test_backend_resident_weights_and_pool():
+    layer_count, size = 4, 16
+    graph = build_deep_mlp_graph(layer_count, size)
+    weight = torch.nn.Parameter(torch.randn(size, size) / size)
+    backend = plai_numpy_backend_runtime.Backend()
+    backend_runtime = plai_numpy_backend_runtime.PlaiNumpyBackendRuntime(backend)
+    memory_manager = backend.memory_manager
+
+    for _ in range(3):
+        x = torch.randn(size, size)
+        [result] = backend_runtime(graph, [x, weight])
+        assert numpy.allclose(result.numpy(), deep_mlp_reference(layer_count, x.numpy(), weight.detach().numpy()))
+    assert backend_runtime.weight_load_count == 1
+    assert memory_manager.statistics.current_bytes == memory_manager.pinned_bytes == size * size * 4
+    assert memory_manager.hit_rate > 0.5
+    print(memory_manager)
+
+    with torch.no_grad():
+        weight.mul_(2)
+    x = torch.randn(size, size)
+    [result] = backend_runtime(graph, [x, weight])
+    assert numpy.allclose(result.numpy(), deep_mlp_reference(layer_count, x.numpy(), weight.detach().numpy()))
+    assert backend_runtime.weight_load_count == 2
+
+    # other shapes run without pooled results.
+    x = torch.randn(3, size)
+    [result] = backend_runtime(graph, [x, weight])
+    assert numpy.allclose(result.numpy(), deep_mlp_reference(layer_count, x.numpy(), weight.detach().numpy()))
+
+    backend_runtime.evict_weights(graph)
+    assert memory_manager.statistics.current_bytes == memory_manager.pinned_bytes == 0
+
+
+def test_numpy_runtime_parallel_workers():
+    branch_count, size = 6, 32
+    graph = build_multi_branch_graph(branch_count, size)
+    input_tensors = [torch.randn(size, size)] + [torch.randn(size, size) / size for _ in range(branch_count)]
+    expected = multi_branch_reference(*[v.numpy() for v in input_tensors])
+
+    numpy_runtime = PlaiNumpyRuntime(num_workers=4)
+    try:
+        for _ in range(3):
+            [result] = numpy_runtime(graph, input_tensors)
+            assert numpy.allclose(result.numpy(), expected, atol=1e-5)
+        schedule = numpy_runtime.get_plan(graph)
+        # the first matmul of every branch is ready at the start.
+        assert len(schedule.initial_ready) == branch_count
+    finally:
+        numpy_runtime.shutdown()
+
+
+def test_numpy_runtime_intra_op_threads():
+    tile_runner = TileRunner(None, num_threads=4, min_tile_cost=1000)
+    assert tile_runner.split_rows(10, 10) == [(0, 10)]
+    assert tile_runner.split_rows(100, 100) == [(0, 25), (25, 50), (50, 75), (75, 100)]
+
+    thread_budget = ThreadBudget(6)
+    first_runtime = PlaiNumpyRuntime(intra_op_threads=4, thread_budget=thread_budget)
+    second_runtime = PlaiNumpyRuntime(intra_op_threads=4, thread_budget=thread_budget, plan_memory=False)
+    try:
+        assert (first_runtime.intra_op_threads, second_runtime.intra_op_threads) == (4, 2)
+        layer_count, size = 3, 512
+        graph = build_deep_mlp_graph(layer_count, size)
+        input_tensors = [torch.randn(size, size), torch.randn(size, size) / size]
+        expected = deep_mlp_reference(layer_count, input_tensors[0].numpy(), input_tensors[1].numpy())
+        for numpy_runtime in [first_runtime, second_runtime]:
+            [result] = numpy_runtime(graph, input_tensors)
+            assert numpy.allclose(result.numpy(), expected, atol=1e-4)
+
+        add_kernel = create_tiled_elementwise(TileRunner(first_runtime.intra_op_executor, 4, 16), numpy.add)
+        lhs, rhs = numpy.random.randn(64, 4), numpy.random.randn(4)
+        assert numpy.allclose(add_kernel(lhs, rhs), lhs + rhs)
+        assert numpy.allclose(add_kernel(rhs, 1.0), rhs + 1.0)
+        # a transposed view of out is read while out is written, the rows are not split then.
+        value = numpy.random.randn(64, 64)
+        expected = value + value.T
+        assert numpy.allclose(add_kernel(value, value.T, out=value), expected)
+
+        # the budget is used up, a third runtime runs on the calling thread only and takes nothing.
+        third_runtime = PlaiNumpyRuntime(intra_op_threads=4, thread_budget=thread_budget)
+        assert (third_runtime.intra_op_threads, third_runtime.acquired_threads) == (1, 0)
+        third_runtime.shutdown()
+        assert thread_budget.available == 0
+    finally:
+        first_runtime.shutdown()
+        second_runtime.shutdown()
+    assert thread_budget.available == 6
+    single_runtime = PlaiNumpyRuntime(intra_op_threads=2, thread_budget=ThreadBudget(1))
+    assert single_runtime.intra_op_executor is None
+    single_runtime.shutdown()
+    assert single_runtime.thread_budget.available == 1
+
+
+def test_runtime_concurrent_calls():
+    layer_count, size = 4, 32
+    graph = build_deep_mlp_graph(layer_count, size)
+    weight = torch.nn.Parameter(torch.randn(size, size) / size)
+    inputs = [torch.randn(size, size) for _ in range(64)]
+    expected = [deep_mlp_reference(layer_count, x.numpy(), weight.detach().numpy()) for x in inputs]
+
+    numpy_runtime = PlaiNumpyRuntime()
+    backend = plai_numpy_backend_runtime.Backend()
+    backend_runtime = plai_numpy_backend_runtime.PlaiNumpyBackendRuntime(backend)
+    for runtime in [numpy_runtime, backend_runtime]:
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(lambda x: runtime(graph, [x, weight])[0], inputs))
+        for result, expected_result in zip(results, expected):
+            assert numpy.allclose(result.numpy(), expected_result, atol=1e-5)
+
+    # every concurrent call of the plan had its own arena, serial calls reuse them.
+    plan = numpy_runtime.get_plan(graph)
+    assert 1 <= plan.context_count <= 8
+    assert len(plan.context_pool) == plan.context_count
+    assert backend_runtime.weight_load_count == 1
+    assert backend.memory_manager.statistics.current_bytes == backend.memory_manager.pinned_bytes
+
+
+def test_python_codegen_runtime():
+    layer_count, size = 3, 16
+    graph = build_deep_mlp_graph(layer_count, size)
+    input_tensors = [torch.randn(size, size), torch.randn(size, size) / size]
+    codegen_runtime = PythonCodegenRuntime()
+    [result] = codegen_runtime(graph, input_tensors)
+    assert numpy.allclose(result.numpy(), deep_mlp_reference(layer_count, *[v.numpy() for v in input_tensors]))
+    source = codegen_runtime.get_source(graph)
+    print(source)
+    assert source.count('matmul(') == layer_count
+    assert codegen_runtime.get_function(graph) is codegen_runtime.get_function(graph)
+
+    graph = build_scaled_linear_graph(8)
+    input_tensors = [torch.randn(8, 8), torch.randn(8)]
+    [result] = codegen_runtime(graph, input_tensors)
+    assert numpy.allclose(result.numpy(), scaled_linear_reference(*[v.numpy() for v in input_tensors]))
+    source = codegen_runtime.get_source(graph)
+    print(source)
+    assert 'multiply(0.5, ' in source
+
+    graph = Graph('constant_array')
+    x = Placeholder(TensorType([3], DType.float32))
+    graph.add_argument(x)
+    constant = graph.add_node(plai_dialect.Constant(numpy.arange(3, dtype=numpy.float32)))
+    graph.add_output(graph.add_node(plai_dialect.Add(x, constant)))
+    [result] = codegen_runtime(graph, [torch.ones(3)])
+    assert numpy.allclose(result.numpy(), [1, 2, 3])
+    assert 'add(a0, c0)' in codegen_runtime.get_source(graph)
+
+    graph = Graph('non_finite_constants')
+    x = Placeholder(TensorType([3], DType.float32))
+    graph.add_argument(x)
+    graph.add_output(graph.add_node(plai_dialect.Add(x, graph.add_node(plai_dialect.Constant(float('-inf'))))))
+    graph.add_output(graph.add_node(plai_dialect.Mul(x, graph.add_node(plai_dialect.Constant(float('nan'))))))
+    results = codegen_runtime(graph, [torch.ones(3)])
+    assert numpy.array_equal(results[0].numpy(), numpy.full(3, -numpy.inf))
+    assert numpy.isnan(results[1].numpy()).all()
+
+    # graph names never replace kernels or break the source, nor do kernel names which are keywords.
+    def relu_kernel(value):
+        return numpy.maximum(value, 0)
+
+    relu_kernel.__name__ = 'lambda'
+    kernel_registry = KernelRegistry(numpy_kernel_registry)
+    kernel_registry.register(plai_dialect.Relu)(lambda node: relu_kernel)
+    keyword_runtime = PythonCodegenRuntime(kernel_registry)
+    for name in ['add', 'class']:
+        graph = Graph(name)
+        x = Placeholder(TensorType([3], DType.float32))
+        graph.add_argument(x)
+        graph.add_output(graph.add_node(plai_dialect.Relu(graph.add_node(plai_dialect.Add(x, x)))))
+        [result] = keyword_runtime(graph, [torch.tensor([-1.0, 0.0, 1.0])])
+        assert numpy.array_equal(result.numpy(), [0, 0, 2])
+        assert 'add(a0, a0)' in keyword_runtime.get_source(graph)
+
+
+def test_tiered_runtime():
+    size = 8
+    graph = build_scaled_linear_graph(size)
+    input_tensors = [torch.randn(size, size), torch.randn(size)]
+    expected = scaled_linear_reference(input_tensors[0].numpy(), input_tensors[1].numpy())
+
+    tiered_runtime = TieredRuntime(hot_threshold=3)
+    tiered_runtime.prepare(graph)
+    for _ in range(3):
+        assert tiered_runtime.get_tier(graph) == INTERPRETED
+        assert numpy.allclose(tiered_runtime(graph, input_tensors)[0].numpy(), expected)
+    assert tiered_runtime.wait_for_promotion(graph, timeout=60)
+    assert numpy.allclose(tiered_runtime(graph, input_tensors)[0].numpy(), expected)
+    statistics = tiered_runtime.get_state(graph).tier_statistics
+    assert statistics[INTERPRETED].call_count == 3
+    assert statistics[OPTIMIZED].call_count == 1
+    assert tiered_runtime.tier_statistics[OPTIMIZED].total_seconds > 0
+    # the original graph is left as it was, the optimized runtime runs a copy.
+    assert len(graph) == len(build_scaled_linear_graph(size))
+    tiered_runtime.shutdown()
+
+    failing_runtime = TieredRuntime(hot_threshold=0, optimize_pipeline=FnPass(lambda g: 1 / 0))
+    with pytest.warns(UserWarning):
+        failing_runtime.prepare(graph)
+    assert isinstance(failing_runtime.get_state(graph).promotion_error, ZeroDivisionError)
+    assert numpy.allclose(failing_runtime(graph, input_tensors)[0].numpy(), expected)
+    assert failing_runtime.get_tier(graph) == INTERPRETED
+    failing_runtime.shutdown()
+
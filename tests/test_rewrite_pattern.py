@@ -0,0 +1,47 @@
+from plai.core import rewrite_pattern
+from plai.core.graph import Graph
+from plai.core.node import Node
+from plai.dialect import plai_dialect
+from tests.test_graph import build_relu_chain
+
+
+class FoldDoubleRelu(rewrite_pattern.TypedRewritePattern):
+    def __init__(self):
+        super().__init__(plai_dialect.Relu)
+
+    def match_and_replace(self, graph: Graph, node: Node) -> bool:
+        assert isinstance(node, plai_dialect.Relu)
+        if not isinstance(node.operands[0], plai_dialect.Relu):
+            return False
+        graph.replace_all_uses_with(node, node.operands[0])
+        graph.remove_node(node)
+        return True
+
+
+def test_rewrite_pattern_greedy():
+    graph, chain = build_relu_chain(100)
+    pattern_list = rewrite_pattern.RewritePatternList([FoldDoubleRelu()])
+    statistics = rewrite_pattern.rewrite_pattern_greedy(graph, pattern_list)
+    assert statistics.converged
+    assert statistics.rewrite_count == 99
+    assert statistics.removed_count == 99
+    assert statistics.visited_count < 3 * 101
+    assert graph.nodes == [chain[0], graph.outputs]
+    assert graph.outputs.operands[0] is chain[0]
+
+
+def test_rewrite_pattern_budget():
+    graph, _ = build_relu_chain(10)
+    pattern_list = rewrite_pattern.RewritePatternList([FoldDoubleRelu()])
+    statistics = rewrite_pattern.rewrite_pattern_greedy(graph, pattern_list, max_rewrite_count=3)
+    # the fourth rewrite goes over the budget and stops the run.
+    assert not statistics.converged
+    assert statistics.rewrite_count == 4
+    assert len(graph) == 7
+
+    # a budget of exactly the rewrites needed converges.
+    graph, chain = build_relu_chain(10)
+    statistics = rewrite_pattern.rewrite_pattern_greedy(graph, pattern_list, max_rewrite_count=9)
+    assert statistics.converged
+    assert statistics.rewrite_count == 9
+    assert graph.nodes == [chain[0], graph.outputs]
@@ -0,0 +1,58 @@
+import numpy
+import torch
+
+from plai.core.core_dialect import Placeholder
+from plai.core.graph import Graph
+from plai.core.node import Node
+from plai.core.type_notation import TensorType, DType
+from plai.dialect import plai_dialect
+from plai.pipelines.transpose_elimination import TransposeEliminationPass
+from plai.runtime import plai_numpy_backend_runtime
+from plai.runtime.plai_numpy_runtime import PlaiNumpyRuntime
+from plai.runtime.python_codegen_runtime import PythonCodegenRuntime
+
+
+def build_transposed_graph(size: int):
+    """
+    (x @ w.T) @ (2 * c.T).T.T + x.T.T with a constant c.
+    """
+    graph = Graph('transposed')
+    x = Placeholder(TensorType([size, size], DType.float32))
+    weight = Placeholder(TensorType([size, size], DType.float32))
+    graph.add_argument(x)
+    graph.add_argument(weight)
+    constant = graph.add_node(plai_dialect.Constant(numpy.arange(size * size, dtype=numpy.float32).reshape(size, size)))
+    product = graph.add_node(plai_dialect.MatMul(x, graph.add_node(plai_dialect.Transpose(weight))))
+    scaled = graph.add_node(plai_dialect.Transpose(graph.add_node(
+        plai_dialect.Mul(graph.add_node(plai_dialect.Constant(2.0)), graph.add_node(plai_dialect.Transpose(constant))))))
+    product = graph.add_node(plai_dialect.MatMul(product, graph.add_node(plai_dialect.Transpose(scaled))))
+    x_t_t = graph.add_node(plai_dialect.Transpose(graph.add_node(plai_dialect.Transpose(x))))
+    graph.add_output(graph.add_node(plai_dialect.Add(product, x_t_t)))
+    return graph
+
+
+def test_transpose_elimination():
+    size = 8
+    graph = build_transposed_graph(size)
+    input_tensors = [torch.randn(size, size), torch.randn(size, size)]
+    expected = PlaiNumpyRuntime()(graph, input_tensors)[0].numpy()
+
+    assert TransposeEliminationPass()(graph)
+    assert not any(isinstance(node, plai_dialect.Transpose) for node in graph)
+    matmuls = [node for node in graph if isinstance(node, plai_dialect.MatMul)]
+    assert [matmul.get_transpose_b() for matmul in matmuls] == [True, False]
+    assert matmuls[0].operands[1] is graph.arguments[1]
+    # the transposes of the scaled constant cancel, the one left is folded into the constant.
+    assert isinstance(matmuls[1].operands[1], plai_dialect.Mul)
+    assert matmuls[1].operands[1].operands[1].get_value().flags.c_contiguous
+    assert graph.outputs.operands[0].operands[1] is graph.arguments[0]
+    assert Node.get_type_notation(graph.outputs.operands[0]) == TensorType([size, size], DType.float32)
+
+    backend_runtime = plai_numpy_backend_runtime.PlaiNumpyBackendRuntime(plai_numpy_backend_runtime.Backend())
+    tiled_runtime = PlaiNumpyRuntime(intra_op_threads=2)
+    for runtime in [PlaiNumpyRuntime(), tiled_runtime, PythonCodegenRuntime(), backend_runtime]:
+        assert numpy.allclose(runtime(graph, input_tensors)[0].numpy(), expected, rtol=1e-5, atol=1e-3)
+    tiled_runtime.shutdown()
+    numpy_runtime = PlaiNumpyRuntime()
+    assert numpy.allclose(numpy_runtime.run_interpreted(graph, input_tensors)[0].numpy(), expected,
+                          rtol=1e-5, atol=1e-3)
@@ -0,0 +1,71 @@
+import copy
+
+import pytest
+
+from plai.core.core_dialect import Placeholder
+from plai.core.graph import Graph
+from plai.core.node import Node
+from plai.core.type_notation import TensorType, ScalarType, UnknownType, DType, TupleType, NoneType
+from plai.dialect import plai_dialect
+
+
+def build_typed_relu_chain(length: int, shape):
+    graph = Graph('typed_relu_chain')
+    arg = Placeholder(TensorType(shape, DType.float32))
+    graph.add_argument(arg)
+    last = arg
+    chain = []
+    for _ in range(length):
+        last = graph.add_node(plai_dialect.Relu(last))
+        chain.append(last)
+    graph.add_output(last)
+    return graph, chain
+
+
+def test_type_notation_deep_graph():
+    graph, chain = build_typed_relu_chain(5000, [2, 3])
+    last_type = Node.get_type_notation(chain[-1])
+    assert isinstance(last_type, TensorType)
+    assert list(last_type.shape) == [2, 3]
+
+    graph, chain = build_typed_relu_chain(5000, [4])
+    graph.update_type_notation()
+    assert list(Node.get_type_notation(graph.outputs).shape) == [4]
+
+
+def test_type_notation_invalidation():
+    graph, chain = build_typed_relu_chain(10, [2, 3])
+    graph.update_type_notation()
+
+    new_arg = Placeholder(TensorType([5], DType.float32))
+    graph.add_argument(new_arg)
+    chain[5].set_operand(0, new_arg)
+    assert all(not isinstance(node._type_notation, UnknownType) for node in chain[:5])
+    assert all(isinstance(node._type_notation, UnknownType) for node in chain[5:])
+    assert isinstance(graph.outputs._type_notation, UnknownType)
+    assert list(Node.get_type_notation(graph.outputs).shape) == [5]
+
+
+def test_type_notation_interned():
+    assert TensorType([2, 3], DType.float32) is TensorType((2, 3), 'float32')
+    assert TensorType([2, 3], DType.float32) is not TensorType([3, 2], DType.float32)
+    assert ScalarType(DType.int64) is ScalarType(DType.int64)
+    assert UnknownType() is UnknownType()
+    assert NoneType() is NoneType()
+    tuple_type = TupleType([TensorType([2], DType.float32), ScalarType(DType.bool)])
+    assert tuple_type is TupleType((TensorType([2], DType.float32), ScalarType(DType.bool)))
+    assert copy.deepcopy(tuple_type) is tuple_type
+    assert {TensorType([2], DType.float32): 1}[TensorType([2], DType.float32)] == 1
+    with pytest.raises(AttributeError):
+        TensorType([2], DType.float32).shape = (3,)
+
+
+def test_type_notation_kept_on_same_type_rewrite():
+    graph, chain = build_typed_relu_chain(10, [2, 3])
+    graph.update_type_notation()
+
+    graph.set_insert_point_after(chain[4])
+    new_node = graph.add_node(plai_dialect.Relu(chain[3]))
+    graph.replace_all_uses_with(chain[4], new_node)
+    graph.remove_node(chain[4])
+    assert all(not isinstance(node._type_notation, UnknownType) for node in chain[5:])